@@ -3,16 +3,18 @@ import rospy
 from std_msgs.msg import Float64
 from horde.msg import StateRepresentation
 from TileCoder import *
+from SparseTrace import *
+from PublisherRegistry import *
 
 class ActorCritic:
-    def __init__(self):
+    def __init__(self, traceEpsilon = None):
         self.actions = [1,2]
         self.numberOfFeatures = TileCoder.numberOfTilings * TileCoder.numberOfTiles * TileCoder.numberOfTiles
 
         #Eligibility traces and weights
-        self.elibibilityTraceValue = numpy.zeros(self.numberOfFeatures)
+        self.elibibilityTraceValue = makeTrace(self.numberOfFeatures, traceEpsilon)
         self.valueWeights = numpy.zeros(self.numberOfFeatures)
-        self.elibibilityTracePolicy = numpy.zeros(self.numberOfFeatures * len(self.actions))
+        self.elibibilityTracePolicy = makeTrace(self.numberOfFeatures * len(self.actions), traceEpsilon)
         self.policyWeights = numpy.zeros(self.numberOfFeatures * len(self.actions))
 
         self.lambdaPolicy = 0.35
@@ -24,6 +26,9 @@ class ActorCritic:
 
     def policyFeatureVectorFromStateAction(self, state, action):
 
+        if isinstance(state.X, SparseVector):
+            return state.X.shifted((action - 1) * len(state.X), len(state.X) * len(self.actions))
+
         if (action == 1):
             #move left
             featureActionVector = numpy.append(state.X, numpy.zeros(len(state.X)))
@@ -45,10 +50,10 @@ class ActorCritic:
         for a in self.actions:
             #featureVector = TileCoder.getFeatureVectorFromValues([((self.motoEncoder- self.minEncoder)/(self.maxEncoder-self.minEncoder)) * TileCoder.numberOfTiles, ((self.speed + self.maxSpeed) / (self.maxSpeed - self.minSpeed)) * TileCoder.numberOfTiles])
             actionFeatureVector = self.policyFeatureVectorFromStateAction(state, a)
-            sumOfExponents = sumOfExponents + numpy.exp(numpy.inner(self.policyWeights, actionFeatureVector))
+            sumOfExponents = sumOfExponents + numpy.exp(dot(self.policyWeights, actionFeatureVector))
         print("sumOfExponents: " + str(sumOfExponents))
         actionFeatureVector = self.policyFeatureVectorFromStateAction(state, action)
-        probability = numpy.exp(numpy.inner(self.policyWeights, actionFeatureVector)) / sumOfExponents
+        probability = numpy.exp(dot(self.policyWeights, actionFeatureVector)) / sumOfExponents
         print("-Returned probability: " + str(probability))
         return probability
 
@@ -59,10 +64,10 @@ class ActorCritic:
         i = 0
         for action in self.actions:
             policyArray[i] = self.policy(state, action)
-            pubProbability = rospy.Publisher('horde_AC/ProbOfAction' + str(i), Float64, queue_size=10)
+            pubProbability = publishers.get('horde_AC/ProbOfAction' + str(i), Float64, queue_size=10)
             pubProbability.publish(policyArray[i])
             if ((state.encoder > 620) & (state.encoder < 700)):
-                pubProbabilitySpecial = rospy.Publisher('horde_AC/ProbOfActionInState' + str(i), Float64, queue_size=10)
+                pubProbabilitySpecial = publishers.get('horde_AC/ProbOfActionInState' + str(i), Float64, queue_size=10)
                 pubProbabilitySpecial.publish(policyArray[i])
 
             i = i + 1
@@ -78,7 +83,7 @@ class ActorCritic:
 
     #This should probably not be defined with the actor critic, but rather be sent to the actor critic in the learn step
     def reward(self, previousState, action, newState):
-        pubReward = rospy.Publisher('horde_AC/reward', Float64, queue_size=10)
+        pubReward = publishers.get('horde_AC/reward', Float64, queue_size=10)
 
         if ((action == 1) & (newState.encoder < 550.0) & (previousState.encoder > 550.0)):
             pubReward.publish(1.0)
@@ -90,7 +95,7 @@ class ActorCritic:
     def sumOfProbTimesFeatures(self, state):
         sumVector = numpy.zeros(self.numberOfFeatures * len(self.actions))
         for action in self.actions:
-            sumVector = sumVector + numpy.inner(self.policy(state, action), self.policyFeatureVectorFromStateAction(state, action))
+            addScaled(sumVector, self.policy(state, action), self.policyFeatureVectorFromStateAction(state, action))
 
         return sumVector
 
@@ -101,18 +106,22 @@ class ActorCritic:
         print("previous encoder: " + str(previousState.encoder) + ", speed: " + str(previousState.speed) + ", new encoder: " + str(newState.encoder) + " speed: " + str(newState.speed) +  ", action: " + str(action) + ", reward: " + str(reward))
 
         #Critic update
-        tdError = reward - self.averageReward + numpy.inner(newState.X, self.valueWeights) - numpy.inner(previousState.X, self.valueWeights)
+        tdError = reward - self.averageReward + dot(self.valueWeights, newState.X) - dot(self.valueWeights, previousState.X)
         print("tdError: " + str(tdError))
         self.averageReward = self.averageReward + self.rewardStep * tdError
         print("Average reward: " + str(self.averageReward))
-        self.elibibilityTraceValue = self.lambdaValue * self.elibibilityTraceValue + previousState.X
-        self.valueWeights = self.valueWeights + self.beta * tdError * self.elibibilityTraceValue
+        self.elibibilityTraceValue = decayTrace(self.elibibilityTraceValue, self.lambdaValue)
+        addScaled(self.elibibilityTraceValue, 1.0, previousState.X)
+        addScaled(self.valueWeights, self.beta * tdError, self.elibibilityTraceValue)
 
-        #Actor update
-        self.elibibilityTracePolicy = self.lambdaPolicy * self.elibibilityTracePolicy + self.policyFeatureVectorFromStateAction(previousState, action) - self.sumOfProbTimesFeatures(previousState)
-        self.policyWeights = self.policyWeights + self.alpha * tdError * self.elibibilityTracePolicy
+        #Actor update. Features of the action taken minus the policy weighted features of every action
+        self.elibibilityTracePolicy = decayTrace(self.elibibilityTracePolicy, self.lambdaPolicy)
+        addScaled(self.elibibilityTracePolicy, 1.0, self.policyFeatureVectorFromStateAction(previousState, action))
+        for a in self.actions:
+            addScaled(self.elibibilityTracePolicy, -self.policy(previousState, a), self.policyFeatureVectorFromStateAction(previousState, a))
+        addScaled(self.policyWeights, self.alpha * tdError, self.elibibilityTracePolicy)
 
-        pubAvgReward = rospy.Publisher('horde_AC/avgReward', Float64, queue_size=10)
+        pubAvgReward = publishers.get('horde_AC/avgReward', Float64, queue_size=10)
         pubAvgReward.publish(self.averageReward)
         print("============ End actor critic learn ============")
         print("-")
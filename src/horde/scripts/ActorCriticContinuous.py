@@ -3,24 +3,26 @@ import rospy
 from std_msgs.msg import Float64
 from horde.msg import StateRepresentation
 from TileCoder import *
+from SparseTrace import *
+from PublisherRegistry import *
 
 class ActorCriticContinuous():
-    def __init__(self):
+    def __init__(self, traceEpsilon = None):
         self.maxAction = 1023.0
         self.minAction = 510.0
         self.numberOfFeatures = TileCoder.numberOfTilings * TileCoder.numberOfTiles * TileCoder.numberOfTiles
 
         #Eligibility traces and weights
         #Value / Critic
-        self.elibibilityTraceValue = numpy.zeros(self.numberOfFeatures)
+        self.elibibilityTraceValue = makeTrace(self.numberOfFeatures, traceEpsilon)
         self.valueWeights = numpy.zeros(self.numberOfFeatures)
 
         #Mean
-        self.elibibilityTraceMean = numpy.zeros(self.numberOfFeatures)
+        self.elibibilityTraceMean = makeTrace(self.numberOfFeatures, traceEpsilon)
         self.policyWeightsMean = numpy.zeros(self.numberOfFeatures)
 
         #Deviation
-        self.elibibilityTraceVariance = numpy.zeros(self.numberOfFeatures)
+        self.elibibilityTraceVariance = makeTrace(self.numberOfFeatures, traceEpsilon)
         self.policyWeightsVariance = numpy.zeros(self.numberOfFeatures)
 
         self.lambdaPolicy = 0.35
@@ -56,7 +58,7 @@ class ActorCriticContinuous():
         self.i = 0
 
     def mean(self, state):
-        m = numpy.inner(self.policyWeightsMean, state.X)
+        m = dot(self.policyWeightsMean, state.X)
         if m > 10.0:
             m = 10
         if m < -10.0:
@@ -64,7 +66,7 @@ class ActorCriticContinuous():
         return m
 
     def variance(self, state):
-        v = numpy.exp(numpy.inner(self.policyWeightsVariance, state.X))
+        v = numpy.exp(dot(self.policyWeightsVariance, state.X))
         #on occasion, variance can be massive. so we bound it here
         if numpy.isinf(v):
             v = 5.0
@@ -77,19 +79,19 @@ class ActorCriticContinuous():
         print("******* pickActionForState ************")
         m = self.mean(state)
         v = self.variance(state) + 0.0000001 #to prevent against 0 variance
-        pubMean = rospy.Publisher('horde_AC/Continuous/Mean', Float64, queue_size=10)
+        pubMean = publishers.get('horde_AC/Continuous/Mean', Float64, queue_size=10)
         pubMean.publish(m)
 
-        pubVariance = rospy.Publisher('horde_AC/Continuous/Variance', Float64, queue_size=10)
+        pubVariance = publishers.get('horde_AC/Continuous/Variance', Float64, queue_size=10)
         pubVariance.publish(v)
 
         print("mean: " + str(m) + ", variance: " + str(v))
         action = numpy.random.normal(m, v)
         #generally between -10 and 10. If greater or less than these values can cause overflow and underflow
         if ((state.encoder > 620) & (state.encoder < 700) & (state.speed <=0)):
-            pubMeanSpecial = rospy.Publisher('horde_AC/Continuous/MeanInState', Float64, queue_size=10)
+            pubMeanSpecial = publishers.get('horde_AC/Continuous/MeanInState', Float64, queue_size=10)
             pubMeanSpecial.publish(m)
-            pubVarianceSpecial = rospy.Publisher('horde_AC/Continuous/VarianceInState', Float64, queue_size=10)
+            pubVarianceSpecial = publishers.get('horde_AC/Continuous/VarianceInState', Float64, queue_size=10)
             pubVarianceSpecial.publish(v)
 
         if action < -10.0:
@@ -100,7 +102,7 @@ class ActorCriticContinuous():
 
         print("action: " + str(action))
 
-        pubAction = rospy.Publisher('horde_AC/Continuous/Action', Float64, queue_size=10)
+        pubAction = publishers.get('horde_AC/Continuous/Action', Float64, queue_size=10)
         pubAction.publish(action)
 
         return action
@@ -143,24 +145,27 @@ class ActorCriticContinuous():
         print("previous encoder: " + str(previousState.encoder) + ", speed: " + str(previousState.speed) + ", new encoder: " + str(newState.encoder) + " speed: " + str(newState.speed) +  ", action: " + str(action) + ", reward: " + str(reward))
 
         #Critic update
-        tdError = reward - self.averageReward + numpy.inner(newState.X, self.valueWeights) - numpy.inner(previousState.X, self.valueWeights)
+        tdError = reward - self.averageReward + dot(self.valueWeights, newState.X) - dot(self.valueWeights, previousState.X)
         print("tdError: " + str(tdError))
         self.averageReward = self.averageReward + self.rewardStep * tdError
         print("Average reward: " + str(self.averageReward))
-        self.elibibilityTraceValue = self.lambdaValue * self.elibibilityTraceValue + previousState.X
-        self.valueWeights = self.valueWeights + self.stepSizeValue * tdError * self.elibibilityTraceValue
+        self.elibibilityTraceValue = decayTrace(self.elibibilityTraceValue, self.lambdaValue)
+        addScaled(self.elibibilityTraceValue, 1.0, previousState.X)
+        addScaled(self.valueWeights, self.stepSizeValue * tdError, self.elibibilityTraceValue)
 
         m = self.mean(previousState)
         v = self.variance(previousState)
 
         #Mean Update
-        self.elibibilityTraceMean = self.lambdaPolicy * self.elibibilityTraceMean + ((action - m) * previousState.X)
-        self.policyWeightsMean = self.policyWeightsMean + self.stepSizeMean * tdError * self.elibibilityTraceMean
+        self.elibibilityTraceMean = decayTrace(self.elibibilityTraceMean, self.lambdaPolicy)
+        addScaled(self.elibibilityTraceMean, action - m, previousState.X)
+        addScaled(self.policyWeightsMean, self.stepSizeMean * tdError, self.elibibilityTraceMean)
 
         #Variance Update
         logPie = (numpy.power(action - m, 2) - numpy.power(v, 2)) * previousState.X
-        self.elibibilityTraceVariance = self.lambdaPolicy * self.elibibilityTraceVariance + logPie
-        self.policyWeightsVariance = self.policyWeightsVariance + self.stepSizeVariance * tdError * self.elibibilityTraceVariance
+        self.elibibilityTraceVariance = decayTrace(self.elibibilityTraceVariance, self.lambdaPolicy)
+        addScaled(self.elibibilityTraceVariance, 1.0, logPie)
+        addScaled(self.policyWeightsVariance, self.stepSizeVariance * tdError, self.elibibilityTraceVariance)
 
         if reward == 1:
             print("logPie: " + str(logPie))
@@ -169,16 +174,16 @@ class ActorCriticContinuous():
             print("policyWeightsVariance: " )
             print(self.policyWeightsVariance)
 
-        pubReward = rospy.Publisher('horde_AC/Continuous/Reward', Float64, queue_size=10)
+        pubReward = publishers.get('horde_AC/Continuous/Reward', Float64, queue_size=10)
         pubReward.publish(reward)
 
-        pubTD = rospy.Publisher('horde_AC/Continuous/TDError', Float64, queue_size=10)
+        pubTD = publishers.get('horde_AC/Continuous/TDError', Float64, queue_size=10)
         pubTD.publish(tdError)
 
-        pubEncoder = rospy.Publisher('horde_AC/Continuous/Encoder', Float64, queue_size=10)
+        pubEncoder = publishers.get('horde_AC/Continuous/Encoder', Float64, queue_size=10)
         pubEncoder.publish(newState.encoder / 100.0)
 
-        pubAvgReward = rospy.Publisher('horde_AC/Continuous/AvgReward', Float64, queue_size=10)
+        pubAvgReward = publishers.get('horde_AC/Continuous/AvgReward', Float64, queue_size=10)
         pubAvgReward.publish(self.averageReward)
         print("============ End continuous actor critic learn ============")
         print("-")
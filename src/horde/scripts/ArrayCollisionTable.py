@@ -0,0 +1,173 @@
+"""
+Description:
+Collision table for hashed tile coding backed by a numpy array instead of a python list. Pass it as memctable to the
+fasttiles routines (tiles, batchtiles, ...) the same way a tiles.CollisionTable is passed.
+
+Compared to tiles.CollisionTable:
+    - the slots are one int32 each (the check hash is always below 2^31), so a 2^20 entry table takes 4 MB
+    - usage() is a counter kept up to date as slots are claimed, rather than a scan of the whole table
+    - a whole batch of coordinates is hashed and claims its home slots with array operations. Only the coordinate
+      lists that collide probe, one at a time in batch order, so indexes and counters are exactly what tiles.hash
+      gives when called on the same coordinates in order
+    - a full table is reported once per batch, and counted in outOfMemory, rather than once per coordinate list
+    - it pickles (with pickle or numpy.save) so it can be stored next to the learned weights it indexes
+
+'safe' and 'unsafe' are supported. 'super safe' keeps the whole coordinate list in each slot and has no compact form.
+"""
+
+import heapq
+import numpy
+from fasttiles import _maxLongint, _maxLongintBy4, batchhashUNH
+
+safetyValues = {'unsafe': 0, 'safe': 1}
+
+
+class ArrayCollisionTable:
+    "Structure to handle collisions"
+    def __init__(self, sizeval=2048, safetyval='safe'):
+        if sizeval <= 0 or sizeval & (sizeval - 1) != 0:
+            raise ValueError("Collision table size should be a power of 2, got " + str(sizeval))
+        if safetyval not in safetyValues:
+            raise ValueError("Unsupported collision table safety " + str(safetyval) + ", use one of " + str(sorted(safetyValues)))
+        self.size = sizeval
+        self.safety = safetyValues[safetyval]
+        self.data = numpy.empty(self.size, dtype=numpy.int32)
+        self.reset()
+
+    def __str__(self):
+        "Prepares a string for printing whenever this object is printed"
+        return "Collision table: " + \
+               " Safety : " + str(self.safety) + \
+               " Usage : " + str(self.usage()) + \
+               " Size :" + str(self.size) + \
+               " Calls : " + str(self.calls) + \
+               " Collisions : " + str(self.collisions)
+
+    def print_(self):
+        "Prints info about collision table"
+        print("usage " + str(self.usage()) + " size " + str(self.size) + " calls " + str(self.calls) +
+              " clearhits " + str(self.clearhits) + " collisions " + str(self.collisions) + " safety " + str(self.safety))
+
+    def reset(self):
+        "Reset Ctable values"
+        self.calls = 0
+        self.clearhits = 0
+        self.collisions = 0
+        self.used = 0
+        self.outOfMemory = 0
+        self.data.fill(-1)
+
+    def stats(self):
+        "Return some statistics of the usage of the collision table"
+        return self.calls, self.clearhits, self.collisions, self.usage()
+
+    def usage(self):
+        "How many entries in the collision table are used"
+        return self.used
+
+    def recount(self):
+        "Recompute usage from the table, for example after tiles.hash has written to data directly"
+        self.used = int(numpy.count_nonzero(self.data >= 0))
+        return self.used
+
+    def hashcoordinates(self, coordinates):
+        "Indexes for an (..., numcoord) array of coordinate lists, claimed in row major order"
+        coordinates = numpy.asarray(coordinates, dtype=numpy.int64)
+        shape = coordinates.shape[:-1]
+        coordinates = coordinates.reshape(-1, coordinates.shape[-1])
+        slots = batchhashUNH(coordinates, self.size)
+        checks = batchhashUNH(coordinates, _maxLongint, 457)
+        if self.safety == safetyValues['unsafe']:
+            indexes = self._claimUnsafe(slots, checks)
+        else:
+            indexes = self._claimSafe(coordinates, slots, checks)
+        return indexes.reshape(shape)
+
+    def _firstClaims(self, slots, checks, existing):
+        #For the slots that are empty, the check of the first coordinate list in the batch to land there
+        empty = existing < 0
+        emptyPositions = numpy.flatnonzero(empty)
+        unique, first, inverse = numpy.unique(slots[emptyPositions], return_index=True, return_inverse=True)
+        occupant = existing.copy()
+        occupant[emptyPositions] = checks[emptyPositions[first]][inverse]
+        return occupant, slots[emptyPositions[first]], checks[emptyPositions[first]]
+
+    def _claimUnsafe(self, slots, checks):
+        #Unsafe tables never probe, so the whole batch is resolved at once
+        occupant, newSlots, newChecks = self._firstClaims(slots, checks, self.data[slots].astype(numpy.int64))
+        collided = int(numpy.count_nonzero(occupant != checks))
+        self.data[newSlots] = newChecks
+        self.used += len(newSlots)
+        self.calls += len(slots)
+        self.collisions += collided
+        self.clearhits += len(slots) - collided
+        return slots
+
+    def _claimSafe(self, coordinates, slots, checks):
+        #Claim the home slots all at once as if nothing probes: an empty slot goes to the first coordinate list in the
+        #batch to land there, and every list whose home slot then holds another check has collided
+        count = len(slots)
+        homes, first, inverse = numpy.unique(slots, return_index=True, return_inverse=True)
+        homeChecks = self.data[homes].astype(numpy.int64)
+        emptyHomes = homeChecks < 0
+        homeChecks[emptyHomes] = checks[first[emptyHomes]]
+        collided = homeChecks[inverse.reshape(-1)] != checks
+        self.data[homes[emptyHomes]] = checks[first[emptyHomes]]
+        self.used += int(numpy.count_nonzero(emptyHomes))
+        self.calls += count
+        indexes = slots.copy()
+        if not collided.any():
+            self.clearhits += count
+            return indexes
+
+        #Then probe for the collided lists in batch order. A probe that claims a slot another list in the batch would
+        #only claim later takes it over, and the lists after it with that home slot are checked against the new claim
+        claimTimes = dict(zip(homes[emptyHomes].tolist(), first[emptyHomes].tolist()))
+        order = numpy.argsort(slots, kind='mergesort')
+        sortedSlots = slots[order]
+        pending = numpy.flatnonzero(collided).tolist()
+        steps = dict(zip(pending, (1 + 2 * batchhashUNH(coordinates[pending], _maxLongintBy4)).tolist()))
+        probed = numpy.zeros(count, dtype=bool)
+        outOfMemory = 0
+        while pending:
+            k = heapq.heappop(pending)
+            if probed[k] or not collided[k]:
+                continue
+            probed[k] = True
+            ccheck = int(checks[k])
+            j = int(slots[k])
+            if k not in steps:
+                steps[k] = 1 + 2 * int(batchhashUNH(coordinates[k], _maxLongintBy4))
+            h2 = steps[k]
+            i = 1
+            while True:
+                self.collisions += 1
+                j = (j + h2) % self.size
+                if i > self.size:
+                    outOfMemory += 1
+                    j = -1
+                    break
+                value = self.data[j]
+                if value >= 0 and claimTimes.get(j, -1) > k:
+                    value = -1
+                if value == ccheck:
+                    break
+                if value < 0:
+                    self.data[j] = ccheck
+                    if j in claimTimes:
+                        later = order[numpy.searchsorted(sortedSlots, j):numpy.searchsorted(sortedSlots, j, 'right')]
+                        later = later[later > k]
+                        collided[later] = checks[later] != ccheck
+                        for m in later[collided[later]].tolist():
+                            heapq.heappush(pending, m)
+                    else:
+                        self.used += 1
+                    claimTimes[j] = k
+                    break
+                i += 1
+            indexes[k] = j
+        self.clearhits += count - int(numpy.count_nonzero(probed))
+        if outOfMemory > 0:
+            self.outOfMemory += outOfMemory
+            print("Tiles: Collision table out of memory for " + str(outOfMemory) + " coordinate lists")
+        return indexes
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+
+"""
+Description:
+Micro benchmarks of the learning kernels and the tile coder. Runs without ROS (RosStandIn provides rospy and the
+message classes) on random tile coded states, so results are reproducible for a given --seed.
+
+Kernels are timed at horde sizes of 10, 100, 1000 and 10000 demons and feature vector lengths of 512 to 65536
+(numTilings * numTiles^2 for two inputs). Configurations whose arrays would not fit in --memoryLimit MB are recorded
+as skipped rather than run. Each kernel is called until it has run for --minTime seconds, three times over, and the
+fastest of the three gives seconds per call.
+
+Results are written as JSON (with the git commit, python and numpy versions) so runs on different commits can be
+compared: --compare an earlier results file prints the speedup of every configuration both ran.
+
+Usage:
+python Benchmark.py --output benchmark.json
+python Benchmark.py --quick --filter horde --compare benchmark.json
+"""
+
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import subprocess
+
+from RosStandIn import *
+install()
+
+import numpy
+import fasttiles as fasttilesModule
+try:
+    import tiles as tilesModule
+except SyntaxError:
+    #tiles.py is python 2 only. fasttiles.tiles is still timed, just not compared against it
+    tilesModule = None
+from horde.msg import StateRepresentation
+from TileCoder import *
+from SparseVector import *
+from GVF import *
+from Horde import *
+from ActorCritic import *
+from ActorCriticContinuous import *
+from Verifier import *
+from HordeVerifier import *
+from ReplayRunner import NullWriter
+from StageProfiler import clock
+from SyntheticHorde import *
+import LearningForeground
+
+demonCounts = [10, 100, 1000, 10000]
+featureSizes = [(8, 8), (8, 16), (8, 32), (16, 64)] #(numTilings, numTiles): 512, 2048, 8192 and 65536 features
+
+
+class StateCycle:
+    "Hands out consecutive (lastState, newState) pairs from a fixed list of states, forever"
+    def __init__(self, states):
+        self.states = states
+        self.i = 0
+
+    def next(self):
+        lastState = self.states[self.i % len(self.states)]
+        self.i += 1
+        return lastState, self.states[self.i % len(self.states)]
+
+
+"""
+Each benchmark is (name, demonCounts or [None], setup). setup(demons, numTilings, numTiles) returns the estimated bytes it
+needs and a function building the step to time, so configurations over the memory limit are never built.
+"""
+
+def tileCoderBenchmark(demons, numTilings, numTiles):
+    values = [[random.uniform(0, numTiles), random.uniform(0, numTiles)] for i in range(256)]
+    def build():
+        cycle = StateCycle(values)
+        return lambda: TileCoder.getFeatureVectorFromValues(cycle.next()[0], numTilings, numTiles)
+    return featureLength(numTilings, numTiles) * 8, build
+
+
+def tilesBenchmark(module):
+    def setup(demons, numTilings, numTiles):
+        values = [[random.uniform(0, numTiles), random.uniform(0, numTiles)] for i in range(256)]
+        def build():
+            cycle = StateCycle(values)
+            return lambda: module.tiles(numTilings, featureLength(numTilings, numTiles), cycle.next()[0])
+        return 0, build
+    return setup
+
+
+def gvfBenchmark(offPolicy):
+    def setup(demons, numTilings, numTiles):
+        vectorLength = featureLength(numTilings, numTiles)
+        def build():
+            gvfs = makeDemons(demons, vectorLength, offPolicy)
+            cycle = StateCycle(makeStates(numTilings, numTiles, 64))
+            def step():
+                lastState, newState = cycle.next()
+                for gvf in gvfs:
+                    if offPolicy:
+                        gvf.gtdLearn(lastState, 2, newState)
+                    else:
+                        gvf.tdLearn(lastState, 2, newState)
+            return step
+        return demons * vectorLength * 8 * 6, build
+    return setup
+
+
+def hordeBenchmark(demons, numTilings, numTiles):
+    vectorLength = featureLength(numTilings, numTiles)
+    def build():
+        horde = Horde(makeDemons(demons, vectorLength), LearningForeground.traceEpsilon)
+        cycle = StateCycle(makeStates(numTilings, numTiles, 64))
+        def step():
+            lastState, newState = cycle.next()
+            horde.learn(lastState, 2, newState)
+        return step
+    #The GVFs' own vectors and the horde's rows
+    return demons * vectorLength * 8 * 11, build
+
+
+def actorCriticSizes(numTilings, numTiles):
+    #The actor critics size themselves from TileCoder's class attributes
+    TileCoder.numberOfTilings = numTilings
+    TileCoder.numberOfTiles = numTiles
+
+
+def actorCriticBenchmark(actorCriticClass, method):
+    def setup(demons, numTilings, numTiles):
+        def build():
+            defaults = (TileCoder.numberOfTilings, TileCoder.numberOfTiles)
+            actorCriticSizes(numTilings, numTiles)
+            try:
+                actorCritic = actorCriticClass(LearningForeground.traceEpsilon)
+            finally:
+                actorCriticSizes(*defaults)
+            cycle = StateCycle(makeStates(numTilings, numTiles, 64))
+            def step():
+                lastState, newState = cycle.next()
+                if method == 'learn':
+                    actorCritic.learn(lastState, 1, newState)
+                else:
+                    actorCritic.pickActionForState(newState)
+            return step
+        return featureLength(numTilings, numTiles) * 8 * 12, build
+    return setup
+
+
+def verifierBenchmark(demons, numTilings, numTiles):
+    def build():
+        verifiers = [Verifier(100, "Demon" + str(i)) for i in range(demons)]
+        states = makeStates(numTilings, numTiles, 64)
+        cycle = StateCycle(states)
+        def step():
+            state = cycle.next()[1]
+            for verifier in verifiers:
+                verifier.append(0.9, state.load, 0.0, state)
+        return step
+    return demons * 100 * 8 * 6, build
+
+
+def hordeVerifierBenchmark(demons, numTilings, numTiles):
+    def build():
+        horde = Horde(makeDemons(demons, 8), None)
+        verifier = HordeVerifier(horde, 100)
+        gammas = numpy.full(demons, 0.9)
+        cumulants = numpy.random.randn(64, demons)
+        predictions = numpy.random.randn(64, demons)
+        cycle = StateCycle(range(64))
+        def step():
+            i = cycle.next()[1]
+            verifier.append(gammas, cumulants[i], predictions[i])
+        return step
+    return demons * 100 * 8 * 8, build
+
+
+def updateDemonsBenchmark(demons, numTilings, numTiles):
+    vectorLength = featureLength(numTilings, numTiles)
+    def build():
+        foreground = LearningForeground.LearningForeground()
+        foreground.profiler.dumpPath = None
+        foreground.latency.dumpPath = None
+        foreground.setDemons(makeDemons(demons, vectorLength))
+        cycle = StateCycle(makeStates(numTilings, numTiles, 64))
+        def step():
+            lastState, newState = cycle.next()
+            foreground.previousState = lastState
+            foreground.lastAction = 2
+            foreground.updateDemons(newState)
+        return step
+    return demons * vectorLength * 8 * 11 + demons * 100 * 8 * 8, build
+
+
+benchmarks = [
+    ('TileCoder.getFeatureVectorFromValues', [None], tileCoderBenchmark),
+    ('fasttiles.tiles', [None], tilesBenchmark(fasttilesModule)),
+    ('GVF.tdLearn', demonCounts, gvfBenchmark(False)),
+    ('GVF.gtdLearn', demonCounts, gvfBenchmark(True)),
+    ('Horde.learn', demonCounts, hordeBenchmark),
+    ('ActorCritic.learn', [None], actorCriticBenchmark(ActorCritic, 'learn')),
+    ('ActorCritic.pickActionForState', [None], actorCriticBenchmark(ActorCritic, 'pickActionForState')),
+    ('ActorCriticContinuous.learn', [None], actorCriticBenchmark(ActorCriticContinuous, 'learn')),
+    ('Verifier.append', demonCounts, verifierBenchmark),
+    ('HordeVerifier.append', demonCounts, hordeVerifierBenchmark),
+    ('LearningForeground.updateDemons', demonCounts, updateDemonsBenchmark),
+]
+if tilesModule is not None:
+    benchmarks.insert(1, ('tiles.tiles', [None], tilesBenchmark(tilesModule)))
+
+
+def timeStep(step, minTime, repeats = 3, maxCalls = 100000):
+    "Fastest seconds per call over repeats runs of at least minTime seconds each"
+    step()
+    best = None
+    totalCalls = 0
+    for repeat in range(repeats):
+        calls = 0
+        startTime = clock()
+        elapsed = 0.0
+        while elapsed < minTime and calls < maxCalls:
+            step()
+            calls += 1
+            elapsed = clock() - startTime
+        totalCalls += calls
+        perCall = elapsed / calls
+        if best is None or perCall < best:
+            best = perCall
+    return best, totalCalls
+
+
+def gitCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT).decode().strip()
+    except Exception:
+        return None
+
+
+def resultKey(result):
+    return (result['benchmark'], result['demons'], result['features'])
+
+
+def compare(results, path):
+    with open(path) as previousFile:
+        previous = dict((resultKey(result), result) for result in json.load(previousFile)['results'])
+    print("Speedup against " + path + " (previous / current seconds per call):")
+    for result in results:
+        old = previous.get(resultKey(result))
+        if old is None or result.get('secondsPerCall') is None or old.get('secondsPerCall') is None:
+            continue
+        print("  " + result['benchmark'].ljust(40) + " demons " + str(result['demons']).rjust(6) + " features " +
+              str(result['features']).rjust(6) + "  x" + ("%.2f" % (old['secondsPerCall'] / result['secondsPerCall'])))
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Benchmark the learning kernels and the tile coder without ROS")
+    parser.add_argument('--output', default='benchmark.json', help="JSON results file")
+    parser.add_argument('--filter', default=None, help="only run benchmarks whose name contains this")
+    parser.add_argument('--quick', action='store_true', help="only 10 and 100 demons and the two smallest feature sizes")
+    parser.add_argument('--minTime', type=float, default=0.2, help="seconds each timed run lasts at least")
+    parser.add_argument('--memoryLimit', type=float, default=2048, help="MB. Larger configurations are skipped")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--traceEpsilon', type=float, default=LearningForeground.traceEpsilon, help="drop trace entries below this in the horde and actor critics. Default keeps exact traces")
+    parser.add_argument('--compare', default=None, help="earlier results file to compare against")
+    options = parser.parse_args(arguments)
+    LearningForeground.traceEpsilon = options.traceEpsilon
+    if tilesModule is None:
+        sys.stderr.write("tiles.py does not import on python " + platform.python_version() + ", skipping tiles.tiles\n")
+
+    sizes = featureSizes[:2] if options.quick else featureSizes
+    results = []
+    stdout = sys.stdout
+    for name, counts, setup in benchmarks:
+        if options.filter and options.filter not in name:
+            continue
+        if options.quick:
+            counts = [count for count in counts if count is None or count <= 100]
+        for demons in counts:
+            for numTilings, numTiles in sizes:
+                random.seed(options.seed)
+                numpy.random.seed(options.seed)
+                result = {'benchmark': name, 'demons': demons, 'features': featureLength(numTilings, numTiles),
+                          'numTilings': numTilings, 'numTiles': numTiles}
+                estimatedBytes, build = setup(demons or 1, numTilings, numTiles)
+                result['estimatedMB'] = estimatedBytes / 1e6
+                if estimatedBytes / 1e6 > options.memoryLimit:
+                    result['skipped'] = "needs about " + str(int(estimatedBytes / 1e6)) + " MB"
+                    result['secondsPerCall'] = None
+                else:
+                    #The kernels print as they learn. Keep that out of the timings and the report
+                    sys.stdout = NullWriter()
+                    try:
+                        with numpy.errstate(all='ignore'):
+                            secondsPerCall, calls = timeStep(build(), options.minTime)
+                        result['secondsPerCall'] = secondsPerCall
+                        result['calls'] = calls
+                    except Exception as error:
+                        #e.g. a diverged actor critic. Recorded so the rest of the suite still runs
+                        result['skipped'] = "failed: " + repr(error)
+                        result['secondsPerCall'] = None
+                    finally:
+                        sys.stdout = stdout
+                results.append(result)
+                print(name.ljust(40) + " demons " + str(demons).rjust(6) + " features " + str(result['features']).rjust(6) + "  " +
+                      (result['skipped'] if 'skipped' in result else ("%.6f ms" % (result['secondsPerCall'] * 1000.0))))
+                sys.stdout.flush()
+
+    report = {'commit': gitCommit(), 'time': time.time(), 'python': platform.python_version(), 'numpy': numpy.__version__,
+              'platform': platform.platform(), 'seed': options.seed, 'minTime': options.minTime, 'traceEpsilon': options.traceEpsilon, 'results': results}
+    with open(options.output, 'w') as outputFile:
+        json.dump(report, outputFile, indent=2, sort_keys=True)
+    print("Wrote " + str(len(results)) + " results to " + options.output)
+    if options.compare:
+        compare(results, options.compare)
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,120 @@
+"""
+Description:
+Learns a horde within a time budget per step. Every step the horde advances (question functions, traces and TD errors
+for every demon, see Horde.advance) and then updates its demons in priority order, chunkSize demons at a time, until
+budget seconds have gone by. At least one chunk is updated every step, so an over tight budget still makes progress.
+A budget of None updates every demon every step, which is the same as Horde.learn (no priorities or freezing).
+
+A demon's priority is
+    priority * (rupeeWeight * RUPEE + udeWeight * UDE) + stalenessWeight * steps since it was last updated
+with priority an explicit per demon weight (setPriority, 1 by default). RUPEE and UDE are refreshed every
+priorityInterval steps. Staleness keeps low priority demons from being starved.
+
+Demons whose RUPEE (their expected learning progress) has changed by less than plateauTolerance (relative) over
+plateauChecks refreshes in a row, after at least minUpdates updates, are frozen: they are left out of the priority
+order and only updated every frozenInterval steps. Only a demon updated since the last refresh is checked, against its
+RUPEE when it was last checked, since a demon the budget skipped has not had a chance to change. A frozen demon is
+checked after each of its periodic updates and thawed if its RUPEE has moved.
+
+Each demon's RUPEE / UDE step sizes and variance follow its own update count (Horde.updateCounts), so a demon updated
+on fewer steps is not treated as if it had seen every step.
+"""
+
+import numpy
+
+from StageProfiler import clock
+
+
+class DemonScheduler:
+    def __init__(self, horde, budget = None, chunkSize = 64, priorityInterval = 10):
+        self.horde = horde
+        self.budget = budget
+        self.chunkSize = chunkSize
+        self.priorityInterval = priorityInterval
+
+        self.rupeeWeight = 1.0
+        self.udeWeight = 1.0
+        self.stalenessWeight = 0.01
+
+        self.plateauTolerance = 0.01
+        self.plateauChecks = 5
+        self.minUpdates = 100
+        self.frozenInterval = 100
+
+        numberOfDemons = horde.numberOfDemons
+        self.priorities = numpy.ones(numberOfDemons)
+        self.rupees = numpy.zeros(numberOfDemons)
+        self.checkedRupees = numpy.zeros(numberOfDemons) #RUPEE at each demon's last plateau check
+        self.udes = numpy.zeros(numberOfDemons)
+        self.lastUpdated = numpy.zeros(numberOfDemons, dtype=int)
+        self.flatChecks = numpy.zeros(numberOfDemons, dtype=int)
+        self.frozen = numpy.zeros(numberOfDemons, dtype=bool)
+        self.lastRefresh = 1 #Step of the last refresh. Demons updated on or after it are checked at the next one
+
+        self.steps = 0
+        self.lastUpdateCount = 0 #Demons updated on the last step
+        self.overBudget = 0 #Steps whose first chunk alone took longer than the budget
+
+    def setPriority(self, demon, priority):
+        self.priorities[self.horde.indexOf(demon)] = priority
+
+    def refreshPriorities(self):
+        rupees = self.horde.rupees()
+        updated = self.lastUpdated >= self.lastRefresh
+        change = numpy.absolute(rupees - self.checkedRupees)
+        flat = change <= self.plateauTolerance * numpy.maximum(numpy.absolute(self.checkedRupees), 1e-12)
+        self.flatChecks = numpy.where(updated, numpy.where(flat, self.flatChecks + 1, 0), self.flatChecks)
+        self.checkedRupees = numpy.where(updated, rupees, self.checkedRupees)
+        self.frozen = (self.flatChecks >= self.plateauChecks) & (self.horde.updateCounts >= self.minUpdates)
+        self.lastRefresh = self.steps
+        self.rupees = rupees
+        self.udes = self.horde.udes()
+
+    def order(self):
+        #Indexes of the demons to update this step, most urgent first. Frozen demons only when their interval is up
+        staleness = self.steps - self.lastUpdated
+        scores = self.priorities * (self.rupeeWeight * self.rupees + self.udeWeight * self.udes) + self.stalenessWeight * staleness
+        candidates = numpy.flatnonzero(~self.frozen | (staleness >= self.frozenInterval))
+        return candidates[numpy.argsort(-scores[candidates], kind='mergesort')]
+
+    def learn(self, lastState, action, newState):
+        horde = self.horde
+        if horde.numberOfDemons == 0:
+            return
+        self.steps += 1
+        if self.budget is None:
+            horde.learn(lastState, action, newState)
+            self.lastUpdated[:] = self.steps
+            self.lastUpdateCount = horde.numberOfDemons
+            return
+
+        startTime = clock()
+        if (self.steps - 1) % self.priorityInterval == 0:
+            self.refreshPriorities()
+        horde.advance(lastState, action, newState)
+        order = self.order()
+        updated = 0
+        while updated < len(order):
+            chunk = order[updated:updated + self.chunkSize]
+            horde.update(chunk)
+            self.lastUpdated[chunk] = self.steps
+            updated += len(chunk)
+            if clock() - startTime >= self.budget:
+                break
+        if updated == min(self.chunkSize, len(order)) and clock() - startTime > self.budget:
+            self.overBudget += 1
+        self.lastUpdateCount = updated
+
+    def stats(self):
+        return {'steps': self.steps, 'updated': self.lastUpdateCount, 'frozen': int(numpy.sum(self.frozen)),
+                'overBudget': self.overBudget, 'minUpdates': int(numpy.min(self.horde.updateCounts)) if self.horde.numberOfDemons else 0,
+                'maxUpdates': int(numpy.max(self.horde.updateCounts)) if self.horde.numberOfDemons else 0}
+
+    def __str__(self):
+        stats = self.stats()
+        return "Scheduler: " + \
+               " Steps : " + str(stats['steps']) + \
+               " Updated last step : " + str(stats['updated']) + \
+               " Frozen : " + str(stats['frozen']) + \
+               " Over budget : " + str(stats['overBudget']) + \
+               " Updates per demon : " + str(stats['minUpdates']) + " - " + str(stats['maxUpdates'])
@@ -2,6 +2,7 @@ import numpy
 import rospy
 from std_msgs.msg import Float64
 from TDLambda import *
+from PublisherRegistry import *
 
 class GTDLambda(TDLambda):
     def __init__(self, featureVectorLength, alpha):
@@ -69,9 +70,9 @@ class GTDLambda(TDLambda):
 
         self.gammaLast = gammaNext
         if (self.priorObservation > -1):
-            pubPrediction = rospy.Publisher('horde_verifier/GTDpredictedValue', Float64, queue_size=10)
+            pubPrediction = publishers.get('horde_verifier/GTDpredictedValue', Float64, queue_size=10)
             pubPrediction.publish(pred)
-            pubObs = rospy.Publisher('horde_verifier/NormalizedEncoderPosition', Float64, queue_size=10)
+            pubObs = publishers.get('horde_verifier/NormalizedEncoderPosition', Float64, queue_size=10)
             normalizedObs = 3.0 * (self.priorObservation['encoder'] - 510.0) / (1023.0-510.0)
             pubObs.publish(normalizedObs )
 
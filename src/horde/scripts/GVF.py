@@ -3,9 +3,10 @@ import rospy
 from std_msgs.msg import Float64
 from horde.msg import StateRepresentation
 from TileCoder import *
+from SparseTrace import *
 
 class GVF:
-    def __init__(self, featureVectorLength, alpha, isOffPolicy, name = "GVF name"):
+    def __init__(self, featureVectorLength, alpha, isOffPolicy, name = "GVF name", traceEpsilon = None):
         #set up lambda, gamma, etc.
         self.name = name
         self.isOffPolicy = isOffPolicy
@@ -15,7 +16,8 @@ class GVF:
         self.weights = numpy.zeros(self.numberOfFeatures)
         self.hWeights = numpy.zeros(featureVectorLength)
         self.hHatWeights = numpy.zeros(featureVectorLength)
-        self.eligibilityTrace = numpy.zeros(self.numberOfFeatures)
+        #Sparse trace that drops entries below traceEpsilon. None keeps a dense trace
+        self.eligibilityTrace = makeTrace(self.numberOfFeatures, traceEpsilon)
         self.gammaLast = 1
 
         self.alpha = (1.0 - 0.90) * alpha
@@ -26,7 +28,7 @@ class GVF:
         self.betaNotRUPEE = (1.0 - 0.90) * alpha * TileCoder.numberOfTilings / 30
         self.taoRUPEE = 0
         self.taoUDE = 0
-        self.movingtdEligErrorAverage = 0 #average of TD*elig*hHat
+        self.movingtdEligErrorAverage = numpy.zeros(self.numberOfFeatures) #average of TD*elig*hHat
         self.lastAction = 0
 
         self.tdVariance = 0
@@ -56,6 +58,13 @@ class GVF:
         else:
             return 0
 
+    def traceSignature(self):
+        #Demons with equal signatures (and equal traces so far) compute identical eligibility traces every step
+        signature = (self.isOffPolicy, questionFunctionKey(self.gamma), questionFunctionKey(self.lam), self.gammaLast)
+        if self.isOffPolicy:
+            signature = signature + (questionFunctionKey(self.rho), questionFunctionKey(self.policy))
+        return signature
+
     def learn(self, lastState, action, newState):
         if self.isOffPolicy:
             self.gtdLearn(lastState, action, newState)
@@ -83,24 +92,28 @@ class GVF:
         #print("lambda: " + str(lam))
         rho = self.rho(action, lastState)
         #print("rho: " + str(rho))
-        self.eligibilityTrace = rho * (self.gammaLast * lam * self.eligibilityTrace + lastState.X)
-        tdError = zNext + gammaNext * numpy.inner(newState.X, self.weights) - numpy.inner(lastState.X, self.weights)
+        self.eligibilityTrace = decayTrace(self.eligibilityTrace, self.gammaLast * lam)
+        addScaled(self.eligibilityTrace, 1.0, lastState.X)
+        self.eligibilityTrace = decayTrace(self.eligibilityTrace, rho)
+        tdError = zNext + gammaNext * dot(self.weights, newState.X) - dot(self.weights, lastState.X)
 
 
         #print("tdError: " + str(tdError))
 
-
-        self.hWeights = self.hWeights + self.alphaH  * (tdError * self.eligibilityTrace - (numpy.inner(self.hWeights, lastState.X)) * lastState.X)
+        hX = dot(self.hWeights, lastState.X)
+        addScaled(self.hWeights, self.alphaH * tdError, self.eligibilityTrace)
+        addScaled(self.hWeights, -self.alphaH * hX, lastState.X)
 
         #update Rupee
-        self.hHatWeights = self.hHatWeights + self.alphaRUPEE * (tdError * self.eligibilityTrace - (numpy.inner(self.hHatWeights, lastState.X)) * lastState.X)
+        self.updateHHatWeights(tdError, lastState)
         #print("tao before: " + str(self.tao))
         self.taoRUPEE = (1.0 - self.betaNotRUPEE) * self.taoRUPEE + self.betaNotRUPEE
         #print("tao after: " + str(self.tao))
 
         betaRUPEE = self.betaNotRUPEE / self.taoRUPEE
         #print("beta: " + str(beta))
-        self.movingtdEligErrorAverage = (1.0 - betaRUPEE) * self.movingtdEligErrorAverage + betaRUPEE * tdError * self.eligibilityTrace
+        self.movingtdEligErrorAverage = (1.0 - betaRUPEE) * self.movingtdEligErrorAverage
+        addScaled(self.movingtdEligErrorAverage, betaRUPEE * tdError, self.eligibilityTrace)
 
         #update UDE
         self.taoUDE = (1.0 - self.betaNotUDE) * self.taoUDE + self.betaNotUDE
@@ -117,7 +130,9 @@ class GVF:
         #print("td variance after: " + str(self.tdVariance))
         self.i = self.i + 1
 
-        self.weights = self.weights + self.alpha * (tdError * self.eligibilityTrace - gammaNext * (1-lam)  * (numpy.inner(self.eligibilityTrace, self.hWeights) * newState.X))
+        traceH = dot(self.hWeights, self.eligibilityTrace)
+        addScaled(self.weights, self.alpha * tdError, self.eligibilityTrace)
+        addScaled(self.weights, -self.alpha * gammaNext * (1-lam) * traceH, newState.X)
 
         pred = self.prediction(lastState)
         #print("Prediction for " + str(lastState.encoder) + ", " + str(lastState.speed)  + " after learning: " + str(pred))
@@ -151,21 +166,23 @@ class GVF:
         #print("gammaLast: " + str(self.gammaLast))
 
         #print("lambda: " + str(lam))
-        self.eligibilityTrace = self.gammaLast * lam * self.eligibilityTrace + lastState.X
+        self.eligibilityTrace = decayTrace(self.eligibilityTrace, self.gammaLast * lam)
+        addScaled(self.eligibilityTrace, 1.0, lastState.X)
 
-        tdError = zNext + gammaNext * numpy.inner(newState.X, self.weights) - numpy.inner(lastState.X, self.weights)
+        tdError = zNext + gammaNext * dot(self.weights, newState.X) - dot(self.weights, lastState.X)
 
         #print("tdError: " + str(tdError))
 
         #update Rupee
-        self.hHatWeights = self.hHatWeights + self.alphaRUPEE * (tdError * self.eligibilityTrace - (numpy.inner(self.hHatWeights, lastState.X)) * lastState.X)
+        self.updateHHatWeights(tdError, lastState)
         #print("tao before: " + str(self.tao))
         self.taoRUPEE = (1.0 - self.betaNotRUPEE) * self.taoRUPEE + self.betaNotRUPEE
         #print("tao after: " + str(self.taoRUPEE))
 
         betaRUPEE = self.betaNotRUPEE / self.taoRUPEE
         #print("beta: " + str(beta))
-        self.movingtdEligErrorAverage =(1.0 - betaRUPEE) * self.movingtdEligErrorAverage + betaRUPEE * tdError * self.eligibilityTrace
+        self.movingtdEligErrorAverage = (1.0 - betaRUPEE) * self.movingtdEligErrorAverage
+        addScaled(self.movingtdEligErrorAverage, betaRUPEE * tdError, self.eligibilityTrace)
 
 
         #update UDE
@@ -176,7 +193,7 @@ class GVF:
         self.tdVariance = ((self.i - 1) * self.tdVariance + (tdError - oldAverageTD) * (tdError - self.averageTD)) / self.i
         self.i = self.i + 1
 
-        self.weights = self.weights + self.alpha * tdError * self.eligibilityTrace
+        addScaled(self.weights, self.alpha * tdError, self.eligibilityTrace)
 
         pred = self.prediction(lastState)
         print("Prediction for " + str(lastState.encoder) + ", " + str(lastState.speed)  + " after learning: " + str(pred))
@@ -189,11 +206,40 @@ class GVF:
 
         self.gammaLast = gammaNext
 
+    def updateHHatWeights(self, tdError, lastState):
+        hHatX = dot(self.hHatWeights, lastState.X)
+        addScaled(self.hHatWeights, self.alphaRUPEE * tdError, self.eligibilityTrace)
+        addScaled(self.hHatWeights, -self.alphaRUPEE * hHatX, lastState.X)
+
     def prediction(self, stateRepresentation):
-        return numpy.inner(self.weights, stateRepresentation.X)
+        return dot(self.weights, stateRepresentation.X)
 
     def rupee(self):
         return numpy.sqrt(numpy.absolute(numpy.inner(self.hHatWeights, self.movingtdEligErrorAverage)))
 
     def ude(self):
-        return numpy.absolute(self.averageTD / (numpy.sqrt(self.tdVariance) + 0.000001))
\ No newline at end of file
+        return numpy.absolute(self.averageTD / (numpy.sqrt(self.tdVariance) + 0.000001))
+
+
+def questionFunctionKey(function):
+    """
+    Hashable key that is equal for question functions (gamma, lam, policy, ...) that always return the same value for
+    the same state. Closures such as makeGammaFunction(gamma) are compared by their code and captured values. Methods
+    are only shared between demons when they are the GVF defaults, since an override may depend on the instance.
+    """
+    method = getattr(function, '__func__', None)
+    if method is not None:
+        if GVF.__dict__.get(method.__name__) is method:
+            return method
+        return (method, function.__self__)
+
+    key = function
+    code = getattr(function, '__code__', None)
+    if code is not None:
+        closure = function.__closure__ or ()
+        try:
+            key = (code, tuple(cell.cell_contents for cell in closure), function.__defaults__)
+            hash(key)
+        except (TypeError, ValueError):
+            key = function
+    return key
@@ -0,0 +1,367 @@
+"""
+Description:
+Horde holds a collection of GVF demons and learns all of them together. Rather than each GVF owning its own weight,
+trace and RUPEE / UDE vectors, the horde keeps them as rows of contiguous 2-D arrays (one row per demon) so that the
+TD(lambda) and GTD(lambda) updates in GVF.tdLearn / GVF.gtdLearn run as a handful of matrix operations per step.
+
+The GVF objects are still used to describe each demon (gamma, cumulant, lam, policy), but their learned state lives
+here once they are added to a horde. Use prediction(i, state), rupee(i) and ude(i) for a single demon, or
+predictions(state), rupees() and udes() for all of them at once. States may carry either dense or SparseVector features.
+The horde keeps its on policy demons ahead of its off policy demons so each block is a contiguous slice; horde.demons
+gives the order that predictions(), rupees() and udes() follow.
+
+Demons whose traces always agree (same isOffPolicy, gamma, lam and target policy, see GVF.traceSignature) share one
+trace row that is computed once per step. traceGroups maps each demon to its trace row.
+
+With a traceEpsilon the horde only decays and reads the trace columns (features) that are non negligible for some
+demon, dropping a column once every demon's trace for it falls below traceEpsilon.
+
+learn() is advance() (question functions, traces and TD errors, shared by every demon) then update(demons) (the
+weight, RUPEE and UDE updates of each demon, all of them or any subset, see DemonScheduler).
+
+With a profiler, learn() records horde/questions, horde/traces and horde/updates. Setting profileGroups also times the
+updates of each trace group, as horde/group/<name of the group's first demon>.
+
+predictions(state) is computed once per state for the current weights: the result is cached against the state object
+and weightsVersion, which learn() bumps whenever it changes the weights. The TD error, verifiers, Pavlov control and
+publishing within (and across) a step then share the same prediction vector. A state's features must not change after
+it has been predicted, and anything else that writes to weights must call weightsChanged().
+"""
+
+import numpy
+from SparseVector import *
+from SparseTrace import *
+from StageProfiler import clock
+
+
+class Horde:
+    def __init__(self, demons, traceEpsilon = None):
+        demons = list(demons)
+        self.demons = [demon for demon in demons if not demon.isOffPolicy] + [demon for demon in demons if demon.isOffPolicy]
+        self.numberOfDemons = len(self.demons)
+        self.demonIndexes = {}
+        for i, demon in enumerate(self.demons):
+            self.demonIndexes[demon] = i
+
+        if self.numberOfDemons > 0:
+            self.numberOfFeatures = self.demons[0].numberOfFeatures
+        else:
+            self.numberOfFeatures = 0
+
+        for demon in self.demons:
+            if demon.numberOfFeatures != self.numberOfFeatures:
+                raise ValueError("All demons in a horde must share the same feature vector length. " + demon.name +
+                                 " has " + str(demon.numberOfFeatures) + ", expected " + str(self.numberOfFeatures))
+
+        self.isOffPolicy = numpy.array([demon.isOffPolicy for demon in self.demons], dtype=bool)
+        numberOnPolicy = self.numberOfDemons - int(numpy.sum(self.isOffPolicy))
+        self.onPolicy = slice(0, numberOnPolicy)
+        self.offPolicy = slice(numberOnPolicy, self.numberOfDemons)
+
+        #Learned vectors. One row per demon (traces are one row per trace group)
+        self.weights = self._stackRows([demon.weights for demon in self.demons])
+        self.hWeights = self._stackRows([demon.hWeights for demon in self.demons])
+        self.hHatWeights = self._stackRows([demon.hHatWeights for demon in self.demons])
+        self._groupTraces()
+        self.movingtdEligErrorAverage = self._stackRows([demon.movingtdEligErrorAverage * numpy.ones(self.numberOfFeatures) for demon in self.demons])
+
+        #Cumulants and gammas of every demon on the newState of the last learn(). See HordeVerifier
+        self.lastCumulants = numpy.zeros(self.numberOfDemons)
+        self.lastGammas = numpy.zeros(self.numberOfDemons)
+
+        self.weightsVersion = 0
+        self.predictionCache = {}
+        self.predictionCacheSize = 4
+        self.predictionHits = 0
+        self.predictionMisses = 0
+
+        #Optional StageProfiler. learn() records its question function, trace and weight update phases to it. With
+        #profileGroups the weight updates are also recorded per trace group, as horde/group/<the group's first demon>.
+        #Each group is then updated on its own, which is slower than updating the whole horde at once
+        self.profiler = False
+        self.profileGroups = False
+
+        self.traceEpsilon = traceEpsilon
+        #A column is kept while any demon needs it. ShardedHorde sets this to combine the decision across its shards
+        self.combineTraceKeep = False
+        self.activeTraceFeatures = numpy.flatnonzero(numpy.any(self.eligibilityTraces != 0, axis=0))
+
+        #Step sizes and scalar learning state. One entry per demon
+        self.alpha = self._stackValues([demon.alpha for demon in self.demons])
+        self.alphaH = self._stackValues([demon.alphaH for demon in self.demons])
+        self.alphaRUPEE = self._stackValues([demon.alphaRUPEE for demon in self.demons])
+        self.betaNotUDE = self._stackValues([demon.betaNotUDE for demon in self.demons])
+        self.betaNotRUPEE = self._stackValues([demon.betaNotRUPEE for demon in self.demons])
+        self.taoRUPEE = self._stackValues([demon.taoRUPEE for demon in self.demons])
+        self.taoUDE = self._stackValues([demon.taoUDE for demon in self.demons])
+        self.tdVariance = self._stackValues([demon.tdVariance for demon in self.demons])
+        self.averageTD = self._stackValues([demon.averageTD for demon in self.demons])
+        self.i = self._stackValues([demon.i for demon in self.demons])
+        self.updateCounts = numpy.array([getattr(demon, 'updateCount', 0) for demon in self.demons], dtype=int)
+        self.stepUpdate = None
+
+    def _stackRows(self, rows):
+        if len(rows) == 0:
+            return numpy.zeros((0, self.numberOfFeatures))
+        return numpy.array(numpy.vstack(rows), dtype=float)
+
+    def _stackValues(self, values):
+        return numpy.array(values, dtype=float)
+
+    def _denseRow(self, vector):
+        if isinstance(vector, SparseVector):
+            return vector.toDense()
+        return vector
+
+    def _groupTraces(self):
+        groupsBySignature = {}
+        representatives = []
+        traces = []
+        traceGroups = []
+        for demon in self.demons:
+            trace = self._denseRow(demon.eligibilityTrace)
+            candidates = groupsBySignature.setdefault(demon.traceSignature(), [])
+            group = None
+            for candidate in candidates:
+                if numpy.array_equal(traces[candidate], trace):
+                    group = candidate
+                    break
+            if group is None:
+                group = len(representatives)
+                candidates.append(group)
+                representatives.append(demon)
+                traces.append(trace)
+            traceGroups.append(group)
+
+        #One demon per group evaluates gamma, lam and rho for the whole group
+        self.traceRepresentatives = representatives
+        self.numberOfTraceGroups = len(representatives)
+        self.traceGroups = numpy.array(traceGroups, dtype=numpy.intp)
+        self.eligibilityTraces = self._stackRows(traces)
+        self.gammaLast = self._stackValues([demon.gammaLast for demon in representatives])
+
+    def _updateTraces(self, decay, lastX, rho):
+        #Returns the trace columns that the rest of the update has to read
+        if self.traceEpsilon is None:
+            self.eligibilityTraces = decay[:, None] * self.eligibilityTraces
+            addScaled(self.eligibilityTraces, 1.0, lastX)
+            self.eligibilityTraces = rho[:, None] * self.eligibilityTraces
+            return slice(None)
+
+        if isinstance(lastX, SparseVector):
+            activeX = lastX.indexes
+        else:
+            activeX = numpy.flatnonzero(lastX)
+        active = self.activeTraceFeatures
+        self.eligibilityTraces[:, active] *= decay[:, None]
+        addScaled(self.eligibilityTraces, 1.0, lastX)
+        active = numpy.union1d(active, activeX)
+        traces = rho[:, None] * self.eligibilityTraces[:, active]
+        keep = numpy.any(numpy.absolute(traces) >= self.traceEpsilon, axis=0)
+        if self.combineTraceKeep:
+            keep = self.combineTraceKeep(keep)
+        traces[:, ~keep] = 0.0
+        self.eligibilityTraces[:, active] = traces
+        self.activeTraceFeatures = active[keep]
+        return self.activeTraceFeatures
+
+    def indexOf(self, demon):
+        return self.demonIndexes[demon]
+
+    def learn(self, lastState, action, newState, demons = None):
+        #demons: indexes of the demons to update this step (all of them by default). See advance()
+        if self.numberOfDemons == 0:
+            return
+        self.advance(lastState, action, newState)
+        self.update(demons)
+
+    def advance(self, lastState, action, newState):
+        """
+        The part of a step every demon shares: evaluates the question functions, advances the traces and computes every
+        demon's TD error. update() then applies the step to any demons, in one call or several (e.g. DemonScheduler
+        updating in priority order until its time runs out). Demons that are not updated keep their weights, RUPEE and
+        UDE for the step. Their traces still advance, and update counts record how often each demon was updated
+        """
+        lastX = lastState.X
+        newX = newState.X
+        if self.profiler:
+            startTime = clock()
+
+        #Per demon question functions. These are arbitrary python callables so they are evaluated one demon at a time.
+        #gamma, lam and rho are the same within a trace group so they are evaluated once per group
+        zNext = self._stackValues([demon.cumulant(newState) for demon in self.demons])
+        groupGammaNext = self._stackValues([demon.gamma(newState) for demon in self.traceRepresentatives])
+        groupLam = self._stackValues([demon.lam(newState) for demon in self.traceRepresentatives])
+        groupRho = self._stackValues([demon.rho(action, lastState) if demon.isOffPolicy else 1 for demon in self.traceRepresentatives])
+        gammaNext = groupGammaNext[self.traceGroups]
+        lam = groupLam[self.traceGroups]
+        if self.profiler:
+            questionTime = clock()
+
+        columns = self._updateTraces(self.gammaLast * groupLam, lastX, groupRho)
+        groupTraces = self.eligibilityTraces[:, columns]
+        if self.profiler:
+            traceTime = clock()
+
+        #Each demon's update only reads its own row, so the TD errors stay valid while update() changes other rows
+        tdError = zNext + gammaNext * self.predictions(newState) - self.predictions(lastState)
+
+        self.gammaLast = groupGammaNext
+        self.lastCumulants = zNext
+        self.lastGammas = gammaNext
+        self.stepUpdate = (lastX, newX, columns, groupTraces, tdError, gammaNext, lam)
+
+        if self.profiler:
+            self.profiler.record('horde/questions', questionTime - startTime)
+            self.profiler.record('horde/traces', traceTime - questionTime)
+
+    def update(self, demons = None):
+        #Applies the last advance() to the demons at these indexes, all of them by default. Each demon at most once per step
+        if not self.profiler:
+            self._update(demons)
+            return
+        startTime = clock()
+        if self.profileGroups:
+            rows = numpy.arange(self.numberOfDemons) if demons is None else numpy.unique(numpy.asarray(demons, dtype=numpy.intp))
+            groups = self.traceGroups[rows]
+            for group in numpy.unique(groups):
+                groupStartTime = clock()
+                self._update(rows[groups == group])
+                self.profiler.record('horde/group/' + self.traceRepresentatives[group].name, clock() - groupStartTime)
+        else:
+            self._update(demons)
+        self.profiler.record('horde/updates', clock() - startTime)
+
+    def _update(self, demons):
+        lastX, newX, columns, groupTraces, tdError, gammaNext, lam = self.stepUpdate
+        if demons is None:
+            rows = slice(None)
+            off = self.offPolicy
+        else:
+            rows = numpy.unique(numpy.asarray(demons, dtype=numpy.intp))
+            if len(rows) == 0:
+                return
+            #Rows are sorted and off policy demons come last, so within rows they are a slice too
+            off = slice(int(numpy.searchsorted(rows, self.offPolicy.start)), len(rows))
+        #Views of the learned rows when updating every demon, copies (written back below) for a subset
+        weights = self.weights[rows]
+        hWeights = self.hWeights[rows]
+        hHatWeights = self.hHatWeights[rows]
+        movingtdEligErrorAverage = self.movingtdEligErrorAverage[rows]
+        traces = groupTraces[self.traceGroups[rows]]
+        tdError = tdError[rows]
+        gammaNext = gammaNext[rows]
+        lam = lam[rows]
+        alpha = self.alpha[rows]
+        alphaH = self.alphaH[rows]
+        alphaRUPEE = self.alphaRUPEE[rows]
+        betaNotRUPEE = self.betaNotRUPEE[rows]
+        betaNotUDE = self.betaNotUDE[rows]
+
+        #GTD secondary weights. Off policy demons only
+        offHWeights = hWeights[off]
+        hX = dot(offHWeights, lastX)
+        offHWeights[:, columns] += (alphaH[off] * tdError[off])[:, None] * traces[off]
+        addScaled(offHWeights, -(alphaH[off] * hX)[:, None], lastX)
+
+        #update Rupee
+        hHatX = dot(hHatWeights, lastX)
+        hHatWeights[:, columns] += (alphaRUPEE * tdError)[:, None] * traces
+        addScaled(hHatWeights, -(alphaRUPEE * hHatX)[:, None], lastX)
+        taoRUPEE = (1.0 - betaNotRUPEE) * self.taoRUPEE[rows] + betaNotRUPEE
+        betaRUPEE = betaNotRUPEE / taoRUPEE
+        movingtdEligErrorAverage *= (1.0 - betaRUPEE)[:, None]
+        movingtdEligErrorAverage[:, columns] += (betaRUPEE * tdError)[:, None] * traces
+
+        #update UDE. i counts each demon's own updates
+        taoUDE = (1.0 - betaNotUDE) * self.taoUDE[rows] + betaNotUDE
+        betaUDE = betaNotUDE / taoUDE
+        oldAverageTD = self.averageTD[rows]
+        averageTD = (1.0 - betaUDE) * oldAverageTD + betaUDE * tdError
+        i = self.i[rows]
+        tdVariance = ((i - 1) * self.tdVariance[rows] + (tdError - oldAverageTD) * (tdError - averageTD)) / i
+
+        #Weight update. TD(lambda) for on policy demons, GTD(lambda) for off policy demons
+        weights[:, columns] += (alpha * tdError)[:, None] * traces
+        traceH = numpy.sum(traces[off] * offHWeights[:, columns], axis=1)
+        addScaled(weights[off], -(alpha[off] * gammaNext[off] * (1 - lam[off]) * traceH)[:, None], newX)
+
+        self.taoRUPEE[rows] = taoRUPEE
+        self.taoUDE[rows] = taoUDE
+        self.averageTD[rows] = averageTD
+        self.tdVariance[rows] = tdVariance
+        self.i[rows] = i + 1
+        self.updateCounts[rows] += 1
+        if demons is not None:
+            self.weights[rows] = weights
+            self.hWeights[rows] = hWeights
+            self.hHatWeights[rows] = hHatWeights
+            self.movingtdEligErrorAverage[rows] = movingtdEligErrorAverage
+        self.weightsChanged()
+
+    def weightsChanged(self):
+        self.weightsVersion += 1
+        self.predictionCache = {}
+
+    def predictions(self, stateRepresentation, cache = True):
+        #Shared between callers, so treat the returned vector as read only. cache=False neither reads nor fills the
+        #cache, for callers on another thread than learn() (which may be part way through changing the weights)
+        if not cache:
+            return dot(self.weights, stateRepresentation.X)
+        entry = self.predictionCache.get(id(stateRepresentation))
+        if entry is not None and entry[0] is stateRepresentation:
+            self.predictionHits += 1
+            return entry[1]
+        self.predictionMisses += 1
+        values = dot(self.weights, stateRepresentation.X)
+        if len(self.predictionCache) >= self.predictionCacheSize:
+            self.predictionCache = {}
+        #Holding on to the state keeps its id from being reused while it is cached
+        self.predictionCache[id(stateRepresentation)] = (stateRepresentation, values)
+        return values
+
+    def rupees(self):
+        return numpy.sqrt(numpy.absolute(numpy.sum(self.hHatWeights * self.movingtdEligErrorAverage, axis=1)))
+
+    def udes(self):
+        return numpy.absolute(self.averageTD / (numpy.sqrt(self.tdVariance) + 0.000001))
+
+    def eligibilityTrace(self, index):
+        return self.eligibilityTraces[self.traceGroups[index]]
+
+    def demonTraces(self):
+        #Every demon's trace row and gammaLast, in horde.demons order
+        return self.eligibilityTraces[self.traceGroups], self.gammaLast[self.traceGroups]
+
+    def syncDemons(self):
+        #Writes what the horde has learned back to its GVFs, e.g. to build a new horde from them with more demons
+        traces, gammaLast = self.demonTraces()
+        for i, demon in enumerate(self.demons):
+            demon.weights = numpy.array(self.weights[i])
+            demon.hWeights = numpy.array(self.hWeights[i])
+            demon.hHatWeights = numpy.array(self.hHatWeights[i])
+            demon.movingtdEligErrorAverage = numpy.array(self.movingtdEligErrorAverage[i])
+            if isinstance(demon.eligibilityTrace, SparseTrace):
+                demon.eligibilityTrace = SparseTrace(self.numberOfFeatures, demon.eligibilityTrace.epsilon).accumulate(1.0, traces[i])
+            else:
+                demon.eligibilityTrace = numpy.array(traces[i])
+            demon.gammaLast = float(gammaLast[i])
+            demon.taoRUPEE = float(self.taoRUPEE[i])
+            demon.taoUDE = float(self.taoUDE[i])
+            demon.averageTD = float(self.averageTD[i])
+            demon.tdVariance = float(self.tdVariance[i])
+            demon.i = float(self.i[i])
+            demon.updateCount = int(self.updateCounts[i])
+
+    def stop(self):
+        #Nothing to release. See ShardedHorde
+        pass
+
+    def prediction(self, index, stateRepresentation):
+        return self.predictions(stateRepresentation)[index]
+
+    def rupee(self, index):
+        return numpy.sqrt(numpy.absolute(numpy.inner(self.hHatWeights[index], self.movingtdEligErrorAverage[index])))
+
+    def ude(self, index):
+        return numpy.absolute(self.averageTD[index] / (numpy.sqrt(self.tdVariance[index]) + 0.000001))
@@ -0,0 +1,35 @@
+"""
+Description:
+Records every demon's gamma, cumulant and prediction at each step of a run so the predictions can be evaluated
+offline against the returns that actually followed (see OfflineEvaluator). Steps are recorded after learning, like
+HordeVerifier, and saved as a numpy .npz with names, gammas, cumulants and predictions arrays of shape (steps, demons).
+"""
+
+import numpy
+
+
+class HordeRecorder:
+    def __init__(self, horde):
+        self.horde = horde
+        self.names = [demon.name for demon in horde.demons]
+        self.gammas = []
+        self.cumulants = []
+        self.predictions = []
+
+    def appendFromHorde(self, newState):
+        #After horde.learn(lastState, action, newState)
+        self.gammas.append(numpy.array(self.horde.lastGammas))
+        self.cumulants.append(numpy.array(self.horde.lastCumulants))
+        self.predictions.append(numpy.array(self.horde.predictions(newState)))
+
+    def steps(self):
+        return len(self.gammas)
+
+    def arrays(self):
+        numberOfDemons = len(self.names)
+        return (numpy.reshape(self.gammas, (-1, numberOfDemons)), numpy.reshape(self.cumulants, (-1, numberOfDemons)),
+                numpy.reshape(self.predictions, (-1, numberOfDemons)))
+
+    def save(self, path):
+        gammas, cumulants, predictions = self.arrays()
+        numpy.savez(path, names=numpy.array(self.names), gammas=gammas, cumulants=cumulants, predictions=predictions)
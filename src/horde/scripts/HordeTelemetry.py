@@ -0,0 +1,126 @@
+"""
+Description:
+Learning progress telemetry for a Horde. RUPEE and UDE are recomputed for every demon at once (Horde.rupees() and
+Horde.udes()) only every interval steps, and in between the last values are reused. Each tick a HordeSummary goes out
+on horde_verifier/Summary with the mean, a few percentiles and the topK demons with the worst RUPEE, along with the
+old horde_verifier/AverageRupee and AverageUDE topics.
+
+Per demon predictions, RUPEE and UDE (a HordePredictions on horde_verifier/Predictions) are only published on demand:
+call requestDetail(names), or publish a String on horde_verifier/RequestDetail holding a comma separated list of demon
+names (empty for every demon). The detail goes out once, on the next tick.
+"""
+
+import threading
+import numpy
+import rospy
+
+from std_msgs.msg import Float64
+from std_msgs.msg import String
+from horde.msg import HordePredictions
+from horde.msg import HordeSummary
+
+from PublisherRegistry import *
+
+
+class HordeTelemetry:
+    def __init__(self, horde, interval = 10, percentiles = (50.0, 90.0, 99.0), topK = 5):
+        self.interval = interval
+        self.percentiles = list(percentiles)
+        self.topK = topK
+        self.lock = threading.Lock()
+        self.setHorde(horde)
+
+    def setHorde(self, horde):
+        self.horde = horde
+        self.names = [demon.name for demon in horde.demons]
+        self.step = 0
+        self.refreshes = 0
+        self.rupees = numpy.zeros(horde.numberOfDemons)
+        self.udes = numpy.zeros(horde.numberOfDemons)
+        self.detailIndexes = None
+
+    def refresh(self):
+        self.rupees = self.horde.rupees()
+        self.udes = self.horde.udes()
+        self.refreshes += 1
+
+    def requestDetail(self, names = None):
+        #Demon names to publish in full on the next tick. None for every demon
+        if names is None:
+            indexes = numpy.arange(self.horde.numberOfDemons)
+        else:
+            lookup = dict((name, i) for i, name in enumerate(self.names))
+            unknown = [name for name in names if name not in lookup]
+            if len(unknown) > 0:
+                print("Telemetry detail requested for unknown demons: " + str(unknown))
+            indexes = numpy.array([lookup[name] for name in names if name in lookup], dtype=numpy.intp)
+        with self.lock:
+            self.detailIndexes = indexes
+
+    def requestDetailCallback(self, msg):
+        names = [name.strip() for name in msg.data.split(',') if name.strip()]
+        if len(names) == 0:
+            self.requestDetail()
+        else:
+            self.requestDetail(names)
+
+    def worstDemons(self):
+        #Indexes of the topK highest RUPEE demons, worst first
+        k = min(self.topK, len(self.rupees))
+        if k == 0:
+            return numpy.zeros(0, dtype=numpy.intp)
+        worst = numpy.argpartition(-self.rupees, k - 1)[:k]
+        return worst[numpy.argsort(-self.rupees[worst])]
+
+    def summary(self, state):
+        msg = HordeSummary()
+        msg.timestamp = state.timestamp
+        msg.step = self.step
+        msg.numberOfDemons = self.horde.numberOfDemons
+        msg.percentiles = self.percentiles
+        if self.horde.numberOfDemons > 0:
+            msg.averageRupee = numpy.mean(self.rupees)
+            msg.averageUDE = numpy.mean(self.udes)
+            msg.rupeePercentiles = numpy.percentile(self.rupees, self.percentiles)
+            msg.udePercentiles = numpy.percentile(self.udes, self.percentiles)
+        else:
+            msg.averageRupee = 0.0
+            msg.averageUDE = 0.0
+            msg.rupeePercentiles = numpy.zeros(len(self.percentiles))
+            msg.udePercentiles = numpy.zeros(len(self.percentiles))
+        worst = self.worstDemons()
+        msg.worstNames = [self.names[i] for i in worst]
+        msg.worstRupees = self.rupees[worst]
+        msg.worstUDEs = self.udes[worst]
+        return msg
+
+    def detail(self, state, indexes):
+        msg = HordePredictions()
+        msg.timestamp = state.timestamp
+        msg.names = [self.names[i] for i in indexes]
+        msg.predictions = self.horde.predictions(state)[indexes]
+        msg.rupees = self.rupees[indexes]
+        msg.udes = self.udes[indexes]
+        msg.averageRupee = numpy.mean(msg.rupees) if len(indexes) > 0 else 0.0
+        msg.averageUDE = numpy.mean(msg.udes) if len(indexes) > 0 else 0.0
+        return msg
+
+    def tick(self, state):
+        if self.step % self.interval == 0:
+            self.refresh()
+        self.step += 1
+
+        summary = self.summary(state)
+        publishers.get('horde_verifier/Summary', HordeSummary, queue_size=10).publish(summary)
+        publishers.get('horde_verifier/AverageRupee', Float64, queue_size=10).publish(summary.averageRupee)
+        publishers.get('horde_verifier/AverageUDE', Float64, queue_size=10).publish(summary.averageUDE)
+
+        with self.lock:
+            indexes = self.detailIndexes
+            self.detailIndexes = None
+        if indexes is not None:
+            publishers.get('horde_verifier/Predictions', HordePredictions, queue_size=10).publish(self.detail(state, indexes))
+        return summary
+
+    def start(self):
+        rospy.Subscriber('horde_verifier/RequestDetail', String, self.requestDetailCallback)
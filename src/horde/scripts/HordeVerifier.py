@@ -0,0 +1,81 @@
+"""
+Description:
+Verifies every demon in a horde at once. Where a Verifier follows one demon in its own buffers, HordeVerifier keeps
+gammas, cumulants and predictions for all demons as (bufferLength x demons) ring buffers, so each step updates every
+demon's true return (see ReturnWindow) and prediction error with a handful of array operations.
+
+Once bufferLength steps have been seen, each step verifies the prediction made bufferLength - 1 steps earlier against
+the return that followed it. The squared errors of the last rmseWindow verified steps are kept per demon, giving a
+sliding window RMSE for each demon (rmse()). horde_verifier/AverageRMSE and horde_verifier/MaxRMSE are published
+every step.
+"""
+
+import numpy
+import rospy
+
+from std_msgs.msg import Float64
+
+from ReturnWindow import *
+from PublisherRegistry import *
+
+
+class HordeVerifier:
+    def __init__(self, horde, bufferLength, rmseWindow = 100):
+        self.horde = horde
+        self.bufferLength = bufferLength
+        self.rmseWindow = rmseWindow
+        self.numberOfDemons = horde.numberOfDemons
+        self.names = [demon.name for demon in horde.demons]
+
+        self.returns = ReturnWindow(bufferLength, (self.numberOfDemons,))
+        self.predictions = numpy.zeros((bufferLength, self.numberOfDemons))
+
+        #Squared errors of the last rmseWindow verified steps and their running sum
+        self.squaredErrors = numpy.zeros((rmseWindow, self.numberOfDemons))
+        self.squaredErrorSum = numpy.zeros(self.numberOfDemons)
+        self.verified = 0
+        self.errors = numpy.zeros(self.numberOfDemons)
+        self.actuals = numpy.zeros(self.numberOfDemons)
+
+    def append(self, gammas, cumulants, predictions):
+        #gammas, cumulants and predictions of every demon for the newest state, in horde.demons order
+        p = self.returns.append(gammas, cumulants)
+        self.predictions[p] = predictions
+        if not self.returns.isFull():
+            return False
+
+        self.actuals = self.returns.oldestReturn()
+        self.errors = self.predictions[self.returns.start] - self.actuals
+
+        slot = self.verified % self.rmseWindow
+        squaredErrors = self.errors * self.errors
+        self.squaredErrorSum += squaredErrors - self.squaredErrors[slot]
+        self.squaredErrors[slot] = squaredErrors
+        self.verified += 1
+        if slot == self.rmseWindow - 1:
+            #Resum once per window so rounding in the running sum cannot build up
+            self.squaredErrorSum = numpy.sum(self.squaredErrors, axis=0)
+        return True
+
+    def appendFromHorde(self, newState):
+        #After horde.learn(lastState, action, newState): reuse the gammas and cumulants it evaluated on newState
+        return self.append(self.horde.lastGammas, self.horde.lastCumulants, self.horde.predictions(newState))
+
+    def rmse(self):
+        count = min(self.verified, self.rmseWindow)
+        if count == 0:
+            return numpy.zeros(self.numberOfDemons)
+        return numpy.sqrt(numpy.maximum(self.squaredErrorSum, 0.0) / count)
+
+    def publish(self):
+        if self.verified == 0 or self.numberOfDemons == 0:
+            return
+        rmse = self.rmse()
+        publishers.get('horde_verifier/AverageRMSE', Float64, queue_size=10).publish(numpy.mean(rmse))
+        publishers.get('horde_verifier/MaxRMSE', Float64, queue_size=10).publish(numpy.max(rmse))
+
+    def worstDemons(self, k = 5):
+        #Names and RMSE of the k demons with the highest RMSE
+        rmse = self.rmse()
+        worst = numpy.argsort(-rmse)[:k]
+        return [(self.names[i], rmse[i]) for i in worst]
@@ -31,10 +31,20 @@ from horde.msg import StateRepresentation
 from BehaviorPolicy import *
 from TileCoder import *
 from GVF import *
+from Horde import *
 from ActorCritic import *
 from ActorCriticContinuous import *
 from Verifier import *
 from PredictLoadDemon import *
+from PublisherRegistry import *
+from HordeTelemetry import *
+from HordeVerifier import *
+from HordeRecorder import *
+from StageProfiler import *
+from LearningWorker import *
+from DemonScheduler import *
+from ShardedHorde import *
+from StateTransport import *
 import time
 
 import numpy
@@ -43,6 +53,19 @@ import numpy
 sets up the subscribers and starts to broadcast the results in a thread every 0.1 seconds
 """
 alpha = 0.1
+#Eligibility trace entries below this are dropped, so the horde only decays and reads the trace columns still in use.
+#An approximation: learned weights drift from exact traces by around traceEpsilon (about 4e-5 with 0.0001 on the
+#predictLoad demons). None keeps exact traces, matching the per demon GVF learning
+traceEpsilon = None
+telemetryInterval = 10 #Steps between recomputing every demon's RUPEE and UDE
+verifierBufferLength = 100 #Steps of return every demon's predictions are verified against. 0 to not verify
+#Stage timings and sensor to actuation latencies are written to these files with each summary (None to not write).
+#Writing happens on the callback thread, adding to the latencies being measured, so it is off for live runs by default
+profileDumpPath = None
+latencyDumpPath = None
+hordeProcesses = 1 #Processes the demons are learned in. More than 1 shards them over worker processes (see ShardedHorde)
+demonBudget = None #Seconds per step for updating demons, in priority order (see DemonScheduler). None updates every demon
+profileDemonGroups = False #Also time the demon updates per trace group (horde/group/<demon> stages). Slower, for profiling only
 
 def directLeftPolicy(state):
     return 2
@@ -166,11 +189,11 @@ def createNextBitGVFs():
     return gvfs
 
 def createActorCritic():
-    ac = ActorCritic()
+    ac = ActorCritic(traceEpsilon)
     return ac
 
 def createActorCriticContinuous():
-    ac = ActorCriticContinuous()
+    ac = ActorCriticContinuous(traceEpsilon)
     return ac
 
 class LearningForeground:
@@ -198,10 +221,75 @@ class LearningForeground:
         #self.demons = createNextEncoderGVF()
         #self.pavlovDemon = self.demons[0]
 
+        #Per stage timings of each step, published on horde_profiler/summary
+        self.profiler = StageProfiler('horde_foreground', dumpPath = profileDumpPath)
+
+        #Wall clock latency of each hop from the servo reading to the command reacting to it. See recordLatencies
+        self.latency = StageProfiler('horde_latency', dumpPath = latencyDumpPath)
+        #Off when the servo timestamps are not from this run, e.g. a replayed log
+        self.traceSensorHops = True
+
+        #All demons are learned together as one horde, in hordeProcesses processes, within demonBudget seconds per step.
+        #A sharded horde updates every demon every step, so the two cannot be combined
+        self.horde = False
+        self.hordeProcesses = hordeProcesses
+        self.demonBudget = demonBudget
+        self.profileDemonGroups = profileDemonGroups
+        self.setDemons(self.demons)
+
+        #RUPEE and UDE are summarized on horde_verifier/Summary (see HordeTelemetry). Set this to also publish the
+        #old three Float64 topics per demon (horde_verifier/<name>Prediction, Rupee and UDE) every step
+        self.publishPerDemonTopics = False
+
         self.previousState = False
 
+        #Tile coded states only have a handful of active features so learn on their active indexes rather than the dense vector
+        self.useSparseFeatures = True
+
+        #Act before learning: pick and publish the action with the current weights first, then learn and publish
+        #telemetry, so actuation latency does not grow with the horde. learnInBackground moves the learning (and
+        #telemetry) to a LearningWorker thread. A tick that takes longer than tickDeadline seconds from receiving the
+        #state counts as a missed deadline (only the acting when learning in the background)
+        self.actBeforeLearn = False
+        self.learnInBackground = False
+        self.tickDeadline = None
+        self.missedDeadlines = 0
+        self.learningWorker = False
+        self.maxPendingLearning = 100 #Learning steps the worker queues before dropping the oldest
+        self.actorCriticLock = threading.Lock() #The worker updates the actor-critic weights in place while the callback acts
+
+        #How state updates arrive from the observation manager (see StateTransport). Shared memory transports hand
+        #over X and lastX as views of their ring, which the features stage copies out of
+        self.transport = makeStateTransport(stateTransport, TileCoder.numberOfTiles * TileCoder.numberOfTiles * TileCoder.numberOfTilings)
+
         #Initialize the sensory values of interest
 
+    def setDemons(self, demons):
+        if self.hordeProcesses > 1 and self.demonBudget is not None:
+            raise ValueError("A demon budget needs the horde in one process (hordeProcesses is " + str(self.hordeProcesses) + ")")
+        self.demons = demons
+        if self.horde:
+            self.horde.stop()
+        if self.hordeProcesses > 1:
+            self.horde = ShardedHorde(self.demons, traceEpsilon, self.hordeProcesses)
+        else:
+            self.horde = Horde(self.demons, traceEpsilon)
+        self.horde.profiler = self.profiler
+        self.horde.profileGroups = self.profileDemonGroups
+        self.scheduler = DemonScheduler(self.horde, self.demonBudget)
+        self.profiler.info['demons'] = self.horde.numberOfDemons
+        self.latency.info['demons'] = self.horde.numberOfDemons
+        self.telemetry = HordeTelemetry(self.horde, telemetryInterval)
+        self.recorder = False
+        self.hordeVerifier = False
+        if verifierBufferLength > 0:
+            self.hordeVerifier = HordeVerifier(self.horde, verifierBufferLength)
+
+    def addDemons(self, demons):
+        #Keeps what the current demons have learned. A sharded horde is split evenly over its processes again
+        self.horde.syncDemons()
+        self.setDemons(list(self.demons) + list(demons))
+
     def performPavlov(self):
         print("!!!Pavlov control!!!!")
         self.lastAction = 1
@@ -209,7 +297,7 @@ class LearningForeground:
         self.increasingRadians = False
         print("Switching direction")
         print("Going to radians: " + str(self.currentRadians))
-        pub = rospy.Publisher('tilt_controller/command', Float64, queue_size=10)
+        pub = publishers.get('tilt_controller/command', Float64, queue_size=10)
         pub.publish(self.currentRadians)
 
     def performSlowBackAndForth(self):
@@ -230,7 +318,7 @@ class LearningForeground:
                 self.increasingRadians = True
 
         print("Going to radians: " + str(self.currentRadians))
-        pub = rospy.Publisher('tilt_controller/command', Float64, queue_size=10)
+        pub = publishers.get('tilt_controller/command', Float64, queue_size=10)
         pub.publish(self.currentRadians)
 
     def performContinuousAction(self, action):
@@ -245,13 +333,13 @@ class LearningForeground:
             radians = 0.0
         elif radians > 3.0:
             radians = 3.0
-        pub = rospy.Publisher('tilt_controller/command', Float64, queue_size=10)
+        pub = publishers.get('tilt_controller/command', Float64, queue_size=10)
         pub.publish(radians)
 
     def performAction(self, action):
         print("Performing action: "  + str(action))
         #Take the action and issue the actual dynamixel command
-        pub = rospy.Publisher('tilt_controller/command', Float64, queue_size=10)
+        pub = publishers.get('tilt_controller/command', Float64, queue_size=10)
 
         if (action ==1):
             #Move left
@@ -265,116 +353,197 @@ class LearningForeground:
 
         self.lastAction = action
 
-    def updateActorCritic(self, newState):
+    def updateActorCritic(self, newState, previousState = None, action = None):
+        #Learns the transition from previousState by action, by default the last state and action of this foreground
+        if previousState is None:
+            previousState, action = self.previousState, self.lastAction
         encoderPosition = newState.encoder
         speed = newState.speed
         load = newState.load
 
-        if self.previousState:
+        if previousState:
             #Learning
             if self.actorCritic:
-                self.actorCritic.learn(self.previousState, self.lastAction, newState)
+                with self.profiler.stage('learnActorCritic'):
+                    with self.actorCriticLock:
+                        self.actorCritic.learn(previousState, action, newState)
 
-    def updateDemons(self, newState):
+    def updateDemons(self, newState, previousState = None, action = None):
         print("LearningForeground received stateRepresentation encoder: " + str(newState.encoder) + ", speed: " + str(newState.speed))
+        if previousState is None:
+            previousState, action = self.previousState, self.lastAction
 
         encoderPosition = newState.encoder
         speed = newState.speed
         load = newState.load
 
-        if self.previousState:
+        if previousState:
             #Learning
-            for demon in self.demons:
-                predBefore = demon.prediction(self.previousState)
-                demon.learn(self.previousState, self.lastAction, newState)
-                print("Demon prediction before: " + str(predBefore))
-                print("Demon prediction after: " + str(demon.prediction(self.previousState)))
-                if demon in self.verifiers:
-                    self.verifiers[demon].append(demon.gamma(newState), demon.cumulant(newState), demon.prediction(newState), newState)
+            with self.profiler.stage('learnDemons'):
+                self.scheduler.learn(previousState, action, newState)
+            if self.scheduler.budget is not None:
+                self.profiler.info['scheduler'] = self.scheduler.stats()
+            with self.profiler.stage('verification'):
+                if self.hordeVerifier:
+                    self.hordeVerifier.appendFromHorde(newState)
+                    self.hordeVerifier.publish()
+                if self.recorder:
+                    self.recorder.appendFromHorde(newState)
+                for demon in self.verifiers:
+                    i = self.horde.indexOf(demon)
+                    self.verifiers[demon].append(demon.gamma(newState), demon.cumulant(newState), self.horde.prediction(i, newState), newState)
 
 
     def publishPredictionsAndErrors(self, state):
-        averageRupee = 0
-        averageUDE = 0
-        i = 1
-        for demon in self.demons:
-            pred = demon.prediction(state)
-            rupee = demon.rupee()
-            averageRupee = averageRupee + (1.0 / i) * (rupee - averageRupee)
-
-            ude = demon.ude()
-            averageUDE = averageUDE + (1.0 / i) * (ude - averageUDE)
+        #Aggregate RUPEE / UDE every step (recomputed every telemetryInterval steps). Per demon detail on request
+        self.telemetry.tick(state)
 
-            i = i + 1
+        if self.publishPerDemonTopics:
+            #The per demon topics go out every step, so their RUPEE / UDE are this step's rather than the telemetry's
+            predictions = self.horde.predictions(state)
+            rupees = self.horde.rupees()
+            udes = self.horde.udes()
+            i = 0
+            for demon in self.horde.demons:
+                pubPrediction = publishers.get('horde_verifier/' + demon.name + 'Prediction', Float64, queue_size=10)
+                pubPrediction.publish(predictions[i])
 
-            pubPrediction = rospy.Publisher('horde_verifier/' + demon.name + 'Prediction', Float64, queue_size=10)
-            pubPrediction.publish(pred)
+                pubRupee = publishers.get('horde_verifier/' + demon.name + 'Rupee', Float64, queue_size=10)
+                pubRupee.publish(rupees[i])
+                pubUDE = publishers.get('horde_verifier/' + demon.name + 'UDE', Float64, queue_size=10)
+                pubUDE.publish(udes[i])
 
-            pubRupee = rospy.Publisher('horde_verifier/' + demon.name + 'Rupee', Float64, queue_size=10)
-            pubRupee.publish(rupee)
-            pubUDE = rospy.Publisher('horde_verifier/' + demon.name + 'UDE', Float64, queue_size=10)
-            pubUDE.publish(ude)
-
-        avgRupee = rospy.Publisher('horde_verifier/AverageRupee', Float64, queue_size=10)
-        avgRupee.publish(averageRupee)
-
-        avgUDE = rospy.Publisher('horde_verifier/AverageUDE', Float64, queue_size=10)
-        avgUDE.publish(averageUDE)
+                i = i + 1
 
 
 
     def receiveStateUpdateCallback(self, newState):
         #Staterepresentation callback
+        receiveTime = time.time()
+        tickStart = clock()
 
         #publish new state encoder
         #TODO Remove after testing magic 301
         #e = (newState.encoder - 510.0) / 5.0
         e = (newState.encoder)
         e = 100 * (e - 510.0) / (1023.0 - 510.0)
-        pubCumulant = rospy.Publisher('horde_verifier/EncoderPosition', Float64, queue_size=10)
+        pubCumulant = publishers.get('horde_verifier/EncoderPosition', Float64, queue_size=10)
         pubCumulant.publish(e)
-        #1. Learn
         #Convert the list of X's into an actual numpy array
-        newState.X = numpy.array(newState.X)
-        newState.lastX = numpy.array(newState.lastX)
-        startTime = time.time()
-        self.updateDemons(newState)
-        self.updateActorCritic(newState)
-        endTime = time.time()
-
-        #0.09 seconds on average. Clobbering CPU
-        #2. Take action
-        #TODO - place code for pavlov
-        pavlovSignal = False
-        if self.pavlovDemon:
-            pred = self.pavlovDemon.prediction(newState)
-            print("pavlov prediction:" + str(pred))
-            pavlovSignal = self.pavlovDemon.prediction(newState) > 900.0
-
-        if pavlovSignal == True:
-            self.performPavlov()
+        with self.profiler.stage('features'):
+            if self.useSparseFeatures:
+                newState.X = SparseVector.fromDense(newState.X)
+                newState.lastX = SparseVector.fromDense(newState.lastX)
+            else:
+                newState.X = numpy.array(newState.X)
+                newState.lastX = numpy.array(newState.lastX)
+
+        #The transition being learned is from the previous state by the action taken in it
+        previousState = self.previousState
+        lastAction = self.lastAction
+        if self.actBeforeLearn or self.learnInBackground:
+            #1. Take action with the current weights
+            decideTime, commandTime = self.act(newState)
+            self.recordLatencies(newState, receiveTime, decideTime, commandTime)
+            self.previousState = newState
+            #2. Learn and publish predictions and errors, here or on the worker
+            if self.learnInBackground:
+                if not (self.learningWorker and self.learningWorker.running):
+                    self.learningWorker = LearningWorker(self.learn, self.maxPendingLearning)
+                    self.learningWorker.start()
+                self.learningWorker.submit(previousState, lastAction, newState)
+            else:
+                self.learn(previousState, lastAction, newState)
         else:
-            #self.performSlowBackAndForth()
-            #action = self.behaviorPolicy()
-            if self.actorCritic:
-                action = self.actorCritic.pickActionForState(newState)
-                self.performContinuousAction(action)
+            #1. Learn
+            self.updateDemons(newState)
+            self.updateActorCritic(newState)
+            #2. Take action
+            decideTime, commandTime = self.act(newState)
+            self.recordLatencies(newState, receiveTime, decideTime, commandTime)
+            #3. Publish predictions and errors
+            self.publishStep(previousState)
+            self.previousState = newState
+
+        tickTime = clock() - tickStart
+        if self.tickDeadline is not None and tickTime > self.tickDeadline:
+            self.missedDeadlines += 1
+            self.profiler.info['missedDeadlines'] = self.missedDeadlines
+        self.profiler.record('step', tickTime)
+        self.profiler.tick()
+
+    def act(self, newState):
+        #Picks and publishes the action for newState. Returns when it was decided and when the command was published
+        with self.profiler.stage('action'):
+            pavlovSignal = False
+            if self.pavlovDemon:
+                #Not from the prediction cache when the worker may be changing the weights
+                pred = self.horde.predictions(newState, cache = not self.learnInBackground)[self.horde.indexOf(self.pavlovDemon)]
+                print("pavlov prediction:" + str(pred))
+                pavlovSignal = pred > 900.0
+
+            if pavlovSignal == True:
+                decideTime = time.time()
+                self.performPavlov()
             else:
-                action  = self.behaviorPolicy.policy(newState)
-                self.performAction(action)
-
-
-        #3. Publish predictions and errors
-        if self.previousState:
-            self.publishPredictionsAndErrors(self.previousState)
-
-        self.previousState = newState
+                #self.performSlowBackAndForth()
+                #action = self.behaviorPolicy()
+                if self.actorCritic:
+                    with self.actorCriticLock:
+                        action = self.actorCritic.pickActionForState(newState)
+                    decideTime = time.time()
+                    self.performContinuousAction(action)
+                else:
+                    action  = self.behaviorPolicy.policy(newState)
+                    decideTime = time.time()
+                    self.performAction(action)
+            commandTime = time.time()
+        return decideTime, commandTime
+
+    def learn(self, previousState, action, newState):
+        #Learning and telemetry for the transition from previousState by action to newState, after acting on newState
+        self.updateDemons(newState, previousState, action)
+        self.updateActorCritic(newState, previousState, action)
+        self.publishStep(previousState)
+
+    def publishStep(self, previousState):
+        with self.profiler.stage('publish'):
+            if previousState:
+                self.publishPredictionsAndErrors(previousState)
+
+    def stop(self):
+        #Lets the worker finish the learning already queued, then stops the horde's worker processes
+        if self.learningWorker:
+            self.learningWorker.stop()
+        self.transport.close()
+        self.horde.stop()
+
+    def recordLatencies(self, state, receiveTime, decideTime, commandTime):
+        #Hops: servo read -> observation manager received it -> its publish tick started featurizing it -> state published ->
+        #received here -> action decided -> command published. Hops whose timestamps were not set (0) are skipped
+        sensorHops = self.traceSensorHops and state.timestamp > 0
+        if sensorHops and state.readTime > 0:
+            self.latency.record('read', state.readTime - state.timestamp)
+        if state.featurizeTime > 0:
+            if state.readTime > 0:
+                #Mostly waiting for the next publish tick, not tile coding
+                self.latency.record('sampleWait', state.featurizeTime - state.readTime)
+            if state.publishTime > 0:
+                self.latency.record('featurize', state.publishTime - state.featurizeTime)
+        if state.publishTime > 0:
+            self.latency.record('transport', receiveTime - state.publishTime)
+        self.latency.record('decide', decideTime - receiveTime)
+        self.latency.record('command', commandTime - decideTime)
+        if sensorHops:
+            self.latency.record('total', commandTime - state.timestamp)
+        self.latency.tick()
 
     def start(self):
         print("In Horde foreground start")
         # Subscribe to all of the relevent sensor information. To start, we're only interested in motor_states, produced by the dynamixels
         #rospy.Subscriber("observation_manager/servo_position", Int16, self.receiveObservationCallback)
-        rospy.Subscriber("observation_manager/state_update", StateRepresentation, self.receiveStateUpdateCallback)
+        self.transport.subscribe(self.receiveStateUpdateCallback)
+        self.telemetry.start()
 
         rospy.spin()
 
@@ -382,7 +551,7 @@ if __name__ == '__main__':
     foreground = LearningForeground()
     #Set the mixels to 0
     rospy.init_node('horde_foreground', anonymous=True)
-    pub = rospy.Publisher('tilt_controller/command', Float64, queue_size=10)
+    pub = publishers.get('tilt_controller/command', Float64, queue_size=10)
     pub.publish(0.0)
 
     time.sleep(3)
@@ -0,0 +1,89 @@
+"""
+Description:
+Runs learning steps on a background thread so the thread receiving states only has to act. Steps are queued as
+argument tuples and run in order by one worker thread, one at a time, so the learner sees the transitions in order.
+At most maxPending steps wait: when the learner falls further behind the oldest step is dropped and counted in
+dropped, so a slow learner costs learning rather than an ever growing queue. A step that raises is logged with its
+traceback and counted in failed, and the worker carries on with the next one.
+"""
+
+import rospy
+import time
+import threading
+import traceback
+import collections
+
+
+class LearningWorker:
+    def __init__(self, step, maxPending = 100):
+        self.step = step
+        self.pending = collections.deque(maxlen = maxPending)
+        self.condition = threading.Condition()
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.running = False
+        self.busy = False
+        self.thread = None
+
+    def submit(self, *arguments):
+        with self.condition:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(arguments)
+            self.submitted += 1
+            self.condition.notify()
+
+    def backlog(self):
+        #Steps waiting, plus the one running
+        return len(self.pending) + (1 if self.busy else 0)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait(0.1)
+                if not self.pending:
+                    return
+                arguments = self.pending.popleft()
+                self.busy = True
+            failed = False
+            try:
+                self.step(*arguments)
+            except Exception:
+                failed = True
+                rospy.logerr("Learning step failed:\n" + traceback.format_exc())
+            with self.condition:
+                self.busy = False
+                self.completed += 1
+                if failed:
+                    self.failed += 1
+                self.condition.notify_all()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target = self.run, name = 'LearningWorker')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def wait(self, timeout = None):
+        #Blocks until every submitted step has run (or been dropped). False if timeout ran out first
+        with self.condition:
+            if timeout is not None:
+                endTime = time.time() + timeout
+            while self.pending or self.busy:
+                remaining = None if timeout is None else endTime - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining if remaining is not None else 0.1)
+        return True
+
+    def stop(self):
+        #Runs what is already queued before the thread ends
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
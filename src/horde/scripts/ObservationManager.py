@@ -37,8 +37,13 @@ from dynamixel_msgs.msg import MotorState
 from dynamixel_msgs.msg import MotorStateList
 
 from TileCoder import *
+from TileCodingCache import *
+from PublisherRegistry import *
+from StateTransport import *
+from PeriodicScheduler import *
 
 import json
+import time
 
 """
 sets up the subscribers and starts to broadcast the results in a thread every 0.1 seconds
@@ -60,10 +65,24 @@ class ObservationManager:
 
         self.load = 0
         self.timestamp = 0
+        self.readTime = 0 #When the latest motor state was received. timestamp is when the servo was read
 
         self.lastX = [0.0] * TileCoder.numberOfTiles * TileCoder.numberOfTilings * TileCoder.numberOfTilings
 
-        self.file = open('jsonData.json', 'w')
+        #Motor states are logged to logPath once started (None to not log). ReplayRunner can stream the log back through the learner
+        self.logPath = 'jsonData.json'
+        self.file = False
+
+        #Publishes every publishingFrequency seconds once started, on absolute deadlines. See PeriodicScheduler
+        self.publishing = False
+        self.publishScheduler = False
+
+        #Encoder and speed readings are integers that repeat constantly, so their tile codings are cached
+        self.tileCodingCache = TileCodingCache()
+        self.precomputeTileCoding = True
+
+        #How state updates reach the learner (see StateTransport). ROS unless stateTransport says otherwise
+        self.transport = makeStateTransport(stateTransport, len(self.lastX))
 
     """
     motorStatesCallback(self, data)
@@ -98,45 +117,87 @@ class ObservationManager:
     def motorStatesCallback(self, data):
         print("In observation_manager callback")
 
-        self.motoEncoder = data.motor_states[0].position
-        self.speed = data.motor_states[0].speed
-        self.load = data.motor_states[0].load
-        self.timestamp = data.motor_states[0].timestamp
+        self.updateSensors(data.motor_states[0].position, data.motor_states[0].speed, data.motor_states[0].load, data.motor_states[0].timestamp)
 
         # print this to a file
         jsonData = {"speed": data.motor_states[0].speed, "position": data.motor_states[0].position, "load":data.motor_states[0].load, "voltage":data.motor_states[0].voltage, "temperature": data.motor_states[0].temperature, "timestamp": data.motor_states[0].timestamp}
-        json.dump(jsonData, self.file)
-        self.file.write('\n')
-
-    def publishObservation(self):
-        print("In publish observation")
-        pubObservation = rospy.Publisher('observation_manager/state_update', StateRepresentation, queue_size = 10)
+        if self.file:
+            json.dump(jsonData, self.file)
+            self.file.write('\n')
+
+    def updateSensors(self, encoder, speed, load, timestamp, readTime = None):
+        self.motoEncoder = encoder
+        self.speed = speed
+        self.load = load
+        self.timestamp = timestamp
+        if readTime is None:
+            readTime = time.time()
+        self.readTime = readTime
+
+    def scaledValues(self, encoder, speed):
+        #Tile coder inputs for an encoder position and speed
+        return [((encoder - self.minEncoder)/(self.maxEncoder-self.minEncoder)) * TileCoder.numberOfTiles, ((speed + self.maxSpeed) / (self.maxSpeed - self.minSpeed)) * TileCoder.numberOfTiles]
+
+    def precomputeFeatureVectors(self):
+        encoders, speeds = numpy.meshgrid(numpy.arange(self.minEncoder, self.maxEncoder + 1), numpy.arange(self.minSpeed, self.maxSpeed + 1))
+        values = numpy.column_stack(self.scaledValues(encoders.ravel(), speeds.ravel()))
+        numberOfCodings = self.tileCodingCache.precompute(values)
+        print("Precomputed " + str(numberOfCodings) + " tile codings")
+
+    def createObservation(self):
+        #State representation of the most recent sensor values. Advances lastX
         msg = StateRepresentation()
+        msg.featurizeTime = time.time()
         msg.speed = self.speed
         msg.encoder = self.motoEncoder
         msg.load = self.load
         msg.timestamp = self.timestamp
+        msg.readTime = self.readTime
 
         #Create the feature vector
-        featureVector = TileCoder.getFeatureVectorFromValues([((self.motoEncoder- self.minEncoder)/(self.maxEncoder-self.minEncoder)) * TileCoder.numberOfTiles, ((self.speed + self.maxSpeed) / (self.maxSpeed - self.minSpeed)) * TileCoder.numberOfTiles])
+        featureVector = self.tileCodingCache.getFeatureVectorFromValues(self.scaledValues(self.motoEncoder, self.speed))
         msg.lastX = self.lastX
         msg.X = featureVector
 
         self.lastX = featureVector
+        msg.publishTime = time.time()
+        return msg
 
-        pubObservation.publish(msg)
-
-        threading.Timer(self.publishingFrequency, self.publishObservation).start()
+    def publishObservation(self):
+        if not self.publishing:
+            return
+        print("In publish observation")
+        self.transport.publish(self.createObservation())
 
     def start(self):
         rospy.init_node('observation_manager', anonymous=True)
+        if self.logPath:
+            self.file = open(self.logPath, 'w')
         # Subscribe to all of the relevent sensor information. To start, we're only interested in motor_states, produced by the dynamixels
         rospy.Subscriber("motor_states/pan_tilt_port", MotorStateList, self.motorStatesCallback)
 
-        self.publishObservation()
+        if self.precomputeTileCoding:
+            self.precomputeFeatureVectors()
+
+        self.publishing = True
+        self.publishScheduler = PeriodicScheduler(self.publishingFrequency, self.publishObservation, 'ObservationPublisher')
+        self.publishScheduler.start()
+
+    def stop(self):
+        #Waits for a publish in progress, so nothing is published once this returns
+        self.publishing = False
+        if self.publishScheduler:
+            self.publishScheduler.stop()
+        if self.file:
+            self.file.close()
+            self.file = False
+        self.transport.close()
 
 if __name__ == '__main__':
     manager = ObservationManager()
     manager.start()
+    rospy.spin()
+    manager.stop()
+    print(str(manager.publishScheduler))
 
 
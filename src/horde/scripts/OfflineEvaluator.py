@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+"""
+Description:
+Post hoc evaluation of a whole run. Given the per step gammas, cumulants and predictions of any number of demons
+(steps x demons arrays, e.g. saved by HordeRecorder), computes the exact discounted return that followed every step
+with one reverse scan over the run, vectorized across demons:
+    G_T-1 = c_T-1
+    G_t = c_t + g_t+1 * G_t+1
+(the same return a Verifier measures, without its buffer cutting it short), in O(steps) per demon.
+
+The returns of the last steps of a run are cut short by the end of the log. tail drops that many steps from the
+summary RMSE (a few multiples of 1 / (1 - gamma) is plenty).
+
+Writes two CSV files: <output>_steps.csv with one row per step and prediction, return, error and rolling RMSE
+columns per demon, and <output>_summary.csv with one row per demon.
+
+Usage:
+python OfflineEvaluator.py run.npz --output run --tail 100
+python OfflineEvaluator.py ../../../1.json --gamma 0.9 --output 1
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy
+
+
+def discountedReturns(gammas, cumulants):
+    "Returns G (steps x demons) with G_t = c_t + g_t+1 * G_t+1 and the last step's return its cumulant"
+    gammas = numpy.asarray(gammas, dtype=float)
+    cumulants = numpy.asarray(cumulants, dtype=float)
+    returns = numpy.empty(cumulants.shape)
+    if len(cumulants) == 0:
+        return returns
+    returns[-1] = cumulants[-1]
+    for t in range(len(cumulants) - 2, -1, -1):
+        returns[t] = cumulants[t] + gammas[t + 1] * returns[t + 1]
+    return returns
+
+
+def rollingRMSE(errors, window):
+    "RMSE of the last window errors at each step (fewer at the start of the run)"
+    squared = numpy.cumsum(numpy.asarray(errors, dtype=float) ** 2, axis=0)
+    totals = squared.copy()
+    totals[window:] -= squared[:-window]
+    counts = numpy.minimum(numpy.arange(1, len(errors) + 1), window).reshape((-1,) + (1,) * (squared.ndim - 1))
+    return numpy.sqrt(numpy.maximum(totals, 0.0) / counts)
+
+
+class OfflineEvaluator:
+    def __init__(self, names, gammas, cumulants, predictions):
+        self.names = [str(name) for name in names]
+        self.gammas = numpy.asarray(gammas, dtype=float).reshape((-1, len(self.names)))
+        self.cumulants = numpy.asarray(cumulants, dtype=float).reshape((-1, len(self.names)))
+        self.predictions = numpy.asarray(predictions, dtype=float).reshape((-1, len(self.names)))
+        if not (len(self.gammas) == len(self.cumulants) == len(self.predictions)):
+            raise ValueError("gammas, cumulants and predictions must have the same number of steps")
+        self.returns = discountedReturns(self.gammas, self.cumulants)
+        self.errors = self.predictions - self.returns
+
+    def rmse(self, tail = 0):
+        errors = self.errors[:max(len(self.errors) - tail, 0)]
+        if len(errors) == 0:
+            return numpy.zeros(len(self.names))
+        return numpy.sqrt(numpy.mean(errors * errors, axis=0))
+
+    def meanError(self, tail = 0):
+        errors = self.errors[:max(len(self.errors) - tail, 0)]
+        if len(errors) == 0:
+            return numpy.zeros(len(self.names))
+        return numpy.mean(errors, axis=0)
+
+    def writeSteps(self, path, window = 100):
+        columns = [numpy.arange(len(self.errors))]
+        header = ['step']
+        rolling = rollingRMSE(self.errors, window)
+        for i, name in enumerate(self.names):
+            columns.extend([self.predictions[:, i], self.returns[:, i], self.errors[:, i], rolling[:, i]])
+            header.extend([name + '_prediction', name + '_return', name + '_error', name + '_rmse'])
+        numpy.savetxt(path, numpy.column_stack(columns), fmt='%.10g', delimiter=',', header=','.join(header), comments='')
+
+    def writeSummary(self, path, tail = 0):
+        rmse = self.rmse(tail)
+        meanError = self.meanError(tail)
+        with open(path, 'w') as summaryFile:
+            summaryFile.write('name,steps,rmse,meanError\n')
+            for i, name in enumerate(self.names):
+                summaryFile.write(name + ',' + str(max(len(self.errors) - tail, 0)) + ',' + repr(float(rmse[i])) + ',' + repr(float(meanError[i])) + '\n')
+
+
+def loadRecording(path):
+    "A HordeRecorder .npz"
+    data = numpy.load(path)
+    return OfflineEvaluator(data['names'], data['gammas'], data['cumulants'], data['predictions'])
+
+
+def loadVerifierDump(path, gamma):
+    "A single demon dump like 1.json (cumulants and predictions lists). Its gamma was not recorded so it is given"
+    with open(path) as dumpFile:
+        data = json.load(dumpFile)
+    cumulants = numpy.asarray(data['cumulants'], dtype=float)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return OfflineEvaluator([name], numpy.full(len(cumulants), gamma), cumulants, data['predictions'])
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Exact returns, errors and RMSE of recorded demon predictions")
+    parser.add_argument('recording', help="HordeRecorder .npz, or a .json dump of cumulants and predictions")
+    parser.add_argument('--output', default=None, help="prefix of the CSV files written. Defaults to the recording's name")
+    parser.add_argument('--gamma', type=float, default=None, help="gamma of a .json dump, which does not record it")
+    parser.add_argument('--tail', type=int, default=0, help="steps at the end of the run left out of the summary RMSE")
+    parser.add_argument('--window', type=int, default=100, help="steps in the rolling RMSE curve")
+    options = parser.parse_args(arguments)
+
+    if options.recording.endswith('.json'):
+        if options.gamma is None:
+            parser.error("--gamma is needed for a .json dump")
+        evaluator = loadVerifierDump(options.recording, options.gamma)
+    else:
+        evaluator = loadRecording(options.recording)
+
+    output = options.output or os.path.splitext(options.recording)[0]
+    evaluator.writeSteps(output + '_steps.csv', options.window)
+    evaluator.writeSummary(output + '_summary.csv', options.tail)
+
+    rmse = evaluator.rmse(options.tail)
+    print("Evaluated " + str(len(evaluator.names)) + " demons over " + str(len(evaluator.errors)) + " steps")
+    for i in numpy.argsort(-rmse)[:10]:
+        print(evaluator.names[i] + " RMSE: " + str(rmse[i]))
+    return evaluator
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
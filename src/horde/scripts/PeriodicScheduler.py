@@ -0,0 +1,94 @@
+"""
+Description:
+Runs a task every period seconds on one thread of its own. Ticks are kept to absolute deadlines (start + k * period),
+so a slow task or a late wake up delays that tick only and the rate does not drift. A task that runs past the next
+deadline is an overrun, and when it runs past whole periods those ticks are skipped (and counted) rather than run
+back to back to catch up. A task that raises is logged with its traceback and counted in errors, and the ticks go on
+on the same grid.
+
+Every tick's jitter (how late it started after its deadline) and task duration go to a StageProfiler, so stats()
+(and str()) give their p50 / p95 / p99 / max along with the tick, overrun and skipped counts. stop() wakes the thread
+straight away, lets a running task finish and joins the thread.
+
+    scheduler = PeriodicScheduler(0.01, manager.publishObservation, 'ObservationPublisher')
+    scheduler.start()
+    ...
+    scheduler.stop()
+"""
+
+import rospy
+import threading
+import traceback
+
+from StageProfiler import *
+
+
+class PeriodicScheduler:
+    def __init__(self, period, task, name = 'PeriodicScheduler'):
+        self.period = period
+        self.task = task
+        self.name = name
+        self.timings = StageProfiler(name, dumpPath = None)
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.errors = 0
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def run(self):
+        deadline = clock()
+        while not self.stopping.is_set():
+            startTime = clock()
+            self.timings.record('jitter', startTime - deadline)
+            try:
+                self.task()
+            except Exception:
+                self.errors += 1
+                rospy.logerr(self.name + " task failed:\n" + traceback.format_exc())
+            endTime = clock()
+            self.timings.record('task', endTime - startTime)
+            self.ticks += 1
+
+            deadline += self.period
+            if endTime > deadline:
+                self.overruns += 1
+                #Ticks whose deadline has passed as well are dropped, keeping to the same grid of deadlines
+                missed = int((endTime - deadline) / self.period)
+                self.skipped += missed
+                deadline += missed * self.period
+            delay = deadline - clock()
+            if delay > 0:
+                self.stopping.wait(delay)
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target = self.run, name = self.name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def isRunning(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stats(self):
+        #Durations in milliseconds, see StageTimer.summary
+        timings = self.timings.summary()
+        return {'period': self.period, 'ticks': self.ticks, 'overruns': self.overruns, 'skipped': self.skipped,
+                'errors': self.errors, 'jitter': timings.get('jitter'), 'task': timings.get('task')}
+
+    def __str__(self):
+        stats = self.stats()
+        jitter = stats['jitter'] or {'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+        return self.name + ": " + \
+               " Hz : " + str(round(1.0 / self.period, 1)) + \
+               " Ticks : " + str(stats['ticks']) + \
+               " Overruns : " + str(stats['overruns']) + \
+               " Skipped : " + str(stats['skipped']) + \
+               " Errors : " + str(stats['errors']) + \
+               " Jitter ms p50 / p99 / max : " + ("%.3f / %.3f / %.3f" % (jitter['p50'], jitter['p99'], jitter['max']))
@@ -0,0 +1,40 @@
+"""
+Description:
+Long lived rospy publishers, one per topic. Creating a rospy.Publisher registers it with the master and subscribers
+have to connect to it before anything it publishes is delivered, so a publisher created just to send one message is
+slow and often drops that message. Use publishers.get(topic, dataClass) wherever a publisher is needed instead of
+constructing one: the first call creates it and later calls return the same publisher.
+"""
+
+import threading
+import rospy
+
+
+class PublisherRegistry:
+    def __init__(self):
+        self.publishers = {}
+        self.lock = threading.Lock()
+
+    def get(self, topic, dataClass, queue_size=10):
+        publisher = self.publishers.get(topic)
+        if publisher is None:
+            with self.lock:
+                publisher = self.publishers.get(topic)
+                if publisher is None:
+                    publisher = rospy.Publisher(topic, dataClass, queue_size=queue_size)
+                    self.publishers[topic] = publisher
+        elif publisher.data_class is not dataClass:
+            raise ValueError("Topic " + topic + " is already published with " + str(publisher.data_class) + ", not " + str(dataClass))
+        return publisher
+
+    def publish(self, topic, dataClass, message, queue_size=10):
+        self.get(topic, dataClass, queue_size).publish(message)
+
+    def clear(self):
+        with self.lock:
+            for publisher in self.publishers.values():
+                publisher.unregister()
+            self.publishers = {}
+
+
+publishers = PublisherRegistry()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+"""
+Description:
+Replays a motor state log (the jsonData.json written by ObservationManager.motorStatesCallback, one JSON object per
+line, e.g. OscilateSensors.json) through the same tile coding and LearningForeground callback as a live run, as fast
+as the CPU allows and without roscore. rospy and the message packages are replaced by RosStandIn when they are not
+installed, so everything the foreground publishes goes to the in process bus.
+
+Each replayed step builds the StateRepresentation with ObservationManager.createObservation and hands it to
+LearningForeground.receiveStateUpdateCallback, which learns (updateDemons / updateActorCritic), acts and publishes.
+By default every logged motor state is a step. With --period the log is resampled to one step per period seconds of
+log time (the last motor state before each tick), the way ObservationManager samples it live. With --transport
+inProcess the states go through an InProcessStateTransport ring instead (see StateTransport), so the learner reads
+its features as views of the ring, as it would from a co-located observation manager over shared memory.
+
+Usage:
+python ReplayRunner.py ../../../OscilateSensors.json --demons predictLoad
+"""
+
+import sys
+import time
+import json
+import argparse
+
+from RosStandIn import *
+install()
+
+import rospy
+
+from ObservationManager import *
+from LearningForeground import *
+
+
+demonSets = {
+    'none': lambda: [],
+    'nextEncoder': createNextEncoderGVF,
+    'predictLoad': createPredictLoadGVFs,
+    'howLongLeft': createHowLongUntilLeftGVFs,
+    'nextBit': createNextBitGVFs,
+}
+
+actorCritics = {
+    'none': lambda: False,
+    'discrete': createActorCritic,
+    'continuous': createActorCriticContinuous,
+}
+
+
+class NullWriter:
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+def readMotorStates(path):
+    "Yields the motor state records in a log. Lines that are not valid JSON (e.g. a truncated last line) are skipped"
+    skipped = 0
+    with open(path) as logFile:
+        for line in logFile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            yield record
+    if skipped > 0:
+        sys.stderr.write("Skipped " + str(skipped) + " unreadable lines in " + path + "\n")
+
+
+def resample(records, period):
+    "The last record before each tick of period seconds of log time"
+    nextTick = None
+    last = None
+    for record in records:
+        if nextTick is None:
+            nextTick = record['timestamp'] + period
+        while record['timestamp'] >= nextTick:
+            if last is not None:
+                yield last
+            nextTick += period
+        last = record
+    if last is not None:
+        yield last
+
+
+class ReplayRunner:
+    def __init__(self, foreground, observationManager, quiet = True):
+        self.foreground = foreground
+        self.observationManager = observationManager
+        self.quiet = quiet
+        self.steps = 0
+        self.elapsed = 0.0
+        self.transport = None
+        self.reader = None
+
+    def useTransport(self, transport):
+        #Hands the states over through transport (delivering synchronously, e.g. InProcessStateTransport)
+        self.transport = transport
+        self.observationManager.transport = transport
+        self.foreground.transport = transport
+        self.reader = transport.subscribe(self.foreground.receiveStateUpdateCallback)
+
+    def step(self, record):
+        self.observationManager.updateSensors(record['position'], record['speed'], record['load'], record['timestamp'])
+        state = self.observationManager.createObservation()
+        if self.transport:
+            self.transport.publish(state)
+        else:
+            self.foreground.receiveStateUpdateCallback(state)
+        self.steps += 1
+
+    def run(self, records, limit = None, reportEvery = 1000):
+        stdout = sys.stdout
+        if self.quiet:
+            sys.stdout = NullWriter()
+        startTime = time.time()
+        try:
+            for record in records:
+                if limit is not None and self.steps >= limit:
+                    break
+                self.step(record)
+                if reportEvery and self.steps % reportEvery == 0:
+                    sys.stderr.write(str(self.steps) + " steps, " + str(round(self.steps / (time.time() - startTime), 1)) + " steps/sec\n")
+            if self.foreground.learningWorker:
+                #Learning in the background is part of the run
+                self.foreground.learningWorker.wait()
+        finally:
+            self.elapsed += time.time() - startTime
+            sys.stdout = stdout
+        return self.steps
+
+    def stepsPerSecond(self):
+        if self.elapsed == 0:
+            return 0.0
+        return self.steps / self.elapsed
+
+    def __str__(self):
+        return "Replay: " + \
+               " Steps : " + str(self.steps) + \
+               " Seconds : " + str(round(self.elapsed, 3)) + \
+               " Steps/sec : " + str(round(self.stepsPerSecond(), 1))
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Replay a motor state log through LearningForeground without ROS")
+    parser.add_argument('log', help="motor state log written by ObservationManager (JSON per line)")
+    parser.add_argument('--demons', choices=sorted(demonSets), default='predictLoad')
+    parser.add_argument('--actorCritic', choices=sorted(actorCritics), default='none')
+    parser.add_argument('--period', type=float, default=0.0, help="seconds of log time per step. 0 replays every motor state")
+    parser.add_argument('--limit', type=int, default=None, help="stop after this many steps")
+    parser.add_argument('--passes', type=int, default=1, help="replay the log this many times")
+    parser.add_argument('--record', default=None, help="save every demon's gammas, cumulants and predictions here (.npz) for OfflineEvaluator")
+    parser.add_argument('--profile', default=None, help="write the per stage timings here (JSON) and print them")
+    parser.add_argument('--profileGroups', action='store_true', help="also time the demon updates of each trace group (slower)")
+    parser.add_argument('--actBeforeLearn', action='store_true', help="act on each state before learning from it")
+    parser.add_argument('--learnInBackground', action='store_true', help="learn on a background worker thread (implies acting first)")
+    parser.add_argument('--deadline', type=float, default=None, help="seconds per tick. Longer ticks are counted as missed deadlines")
+    parser.add_argument('--processes', type=int, default=1, help="learn the demons in this many processes (see ShardedHorde)")
+    parser.add_argument('--demonBudget', type=float, default=None, help="seconds per step for updating demons in priority order. Default updates every demon")
+    parser.add_argument('--transport', choices=['direct', 'inProcess'], default='direct', help="hand states to the learner directly or through an in process shared memory ring")
+    parser.add_argument('--verbose', action='store_true', help="keep the foreground's per step printing")
+    options = parser.parse_args(arguments)
+    if options.processes > 1 and options.demonBudget is not None:
+        parser.error("--demonBudget updates demons in priority order in one process and cannot be combined with --processes")
+
+    observationManager = ObservationManager()
+    observationManager.precomputeFeatureVectors()
+    foreground = LearningForeground()
+    foreground.hordeProcesses = options.processes
+    foreground.demonBudget = options.demonBudget
+    foreground.profileDemonGroups = options.profileGroups
+    foreground.setDemons(demonSets[options.demons]())
+    foreground.actorCritic = actorCritics[options.actorCritic]()
+    foreground.profiler.dumpPath = options.profile
+    foreground.latency.dumpPath = None
+    foreground.traceSensorHops = False
+    foreground.actBeforeLearn = options.actBeforeLearn
+    foreground.learnInBackground = options.learnInBackground
+    foreground.tickDeadline = options.deadline
+    if options.record:
+        foreground.recorder = HordeRecorder(foreground.horde)
+
+    runner = ReplayRunner(foreground, observationManager, quiet = not options.verbose)
+    if options.transport == 'inProcess':
+        runner.useTransport(InProcessStateTransport(len(observationManager.lastX)))
+    for replayPass in range(options.passes):
+        records = readMotorStates(options.log)
+        if options.period > 0:
+            records = resample(records, options.period)
+        runner.run(records, options.limit)
+    foreground.stop()
+    if options.record:
+        foreground.recorder.save(options.record)
+    print(str(runner))
+    if options.profile:
+        foreground.profiler.dump()
+        print(str(foreground.profiler))
+        print(str(foreground.latency))
+    print("Demons : " + str(foreground.horde.numberOfDemons))
+    if options.demonBudget is not None:
+        print(str(foreground.scheduler))
+    if options.deadline is not None:
+        print("Missed deadlines : " + str(foreground.missedDeadlines))
+    if options.learnInBackground:
+        print("Learning steps dropped : " + str(foreground.learningWorker.dropped if foreground.learningWorker else 0) +
+              " Failed : " + str(foreground.learningWorker.failed if foreground.learningWorker else 0))
+    if runner.reader:
+        print("States through the ring : " + str(runner.reader.delivered) + " Dropped : " + str(runner.reader.dropped) + " Overwritten : " + str(runner.reader.overwritten))
+    if hasattr(rospy, 'bus'):
+        print("Messages published : " + str(sum(rospy.bus.publishCounts.values())))
+    return runner
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,99 @@
+"""
+Description:
+The discounted return over a sliding window of the most recent (gamma, cumulant) pairs, maintained in amortized O(1)
+per step however long the window is.
+
+For a window holding steps a..b the return of its oldest step is
+    c_a + g_a+1 * c_a+1 + g_a+1 * g_a+2 * c_a+2 + ... + (g_a+1 * ... * g_b) * c_b
+which is what Verifier used to recompute from scratch on every append (the oldest step's own gamma is not used).
+
+A run of steps is summarized by (P, S), the product of its gammas and the sum of each cumulant times the gammas up to
+and including its step. Two runs combine as (P1, S1) + (P2, S2) = (P1 * P2, S1 + P1 * S2), which is associative, so
+the window is kept as two stacks: a back stack that is only summarized as a whole as steps are appended, and a front
+stack holding the oldest steps with the summary of each step and every newer step in the front. When the front runs
+out the back is folded into it in one pass. A gamma of 0 zeroes every later term, so nothing past it is ever summed
+again.
+
+gammas and cumulants may be scalars or arrays of any fixed shape (e.g. one entry per demon), all updated together.
+"""
+
+import numpy
+
+
+class ReturnWindow:
+    def __init__(self, length, shape = ()):
+        if length < 1:
+            raise ValueError("ReturnWindow length must be at least 1, got " + str(length))
+        self.length = length
+        self.shape = tuple(shape)
+        self.gammas = numpy.zeros((length,) + self.shape)
+        self.cumulants = numpy.zeros((length,) + self.shape)
+        #Summary of each front step and every newer front step, by ring position
+        self.frontProducts = numpy.zeros((length,) + self.shape)
+        self.frontSums = numpy.zeros((length,) + self.shape)
+        self.clear()
+
+    def clear(self):
+        self.start = 0          #Ring position of the oldest step
+        self.count = 0          #Steps in the window
+        self.frontCount = 0     #The oldest frontCount steps are in the front stack
+        self.backProduct = numpy.ones(self.shape)
+        self.backSum = numpy.zeros(self.shape)
+
+    def __len__(self):
+        return self.count
+
+    def isFull(self):
+        return self.count == self.length
+
+    def position(self, offset):
+        #Ring position of the step offset steps after the oldest
+        return (self.start + offset) % self.length
+
+    def _flip(self):
+        #Move every back step to the front, summarizing from the newest back to the oldest
+        product = numpy.ones(self.shape)
+        total = numpy.zeros(self.shape)
+        for offset in range(self.count - 1, self.frontCount - 1, -1):
+            p = self.position(offset)
+            total = self.gammas[p] * (self.cumulants[p] + total)
+            product = self.gammas[p] * product
+            self.frontProducts[p] = product
+            self.frontSums[p] = total
+        self.frontCount = self.count
+        self.backProduct = numpy.ones(self.shape)
+        self.backSum = numpy.zeros(self.shape)
+
+    def popOldest(self):
+        if self.count == 0:
+            raise IndexError("pop from an empty ReturnWindow")
+        if self.frontCount == 0:
+            self._flip()
+        self.start = self.position(1)
+        self.count -= 1
+        self.frontCount -= 1
+
+    def append(self, gamma, cumulant):
+        #Returns the ring position the step was stored at. The oldest step is dropped when the window is full
+        if self.count == self.length:
+            self.popOldest()
+        p = self.position(self.count)
+        self.gammas[p] = gamma
+        self.cumulants[p] = cumulant
+        self.count += 1
+        self.backSum = self.backSum + self.backProduct * self.gammas[p] * self.cumulants[p]
+        self.backProduct = self.backProduct * self.gammas[p]
+        return p
+
+    def oldestReturn(self):
+        "Discounted return of the oldest step over the rest of the window"
+        if self.count == 0:
+            raise IndexError("return of an empty ReturnWindow")
+        if self.frontCount == 0:
+            self._flip()
+        oldest = self.start
+        rest = self.backSum
+        if self.frontCount >= 2:
+            second = self.position(1)
+            rest = self.frontSums[second] + self.frontProducts[second] * self.backSum
+        return self.cumulants[oldest] + rest
@@ -0,0 +1,175 @@
+"""
+Description:
+Stand ins for rospy and the ROS message packages used by the horde scripts, so that ObservationManager,
+LearningForeground and friends can be imported and driven offline (see ReplayRunner) on a machine without ROS.
+
+install() registers the stand in modules under their ROS names (rospy, std_msgs.msg, horde.msg, ...) for every one
+that cannot be imported, so an installed ROS is always preferred. It must be called before the horde modules are
+imported.
+
+The rospy stand in is an in process topic bus. Publisher.publish calls the callbacks of every Subscriber on the same
+topic synchronously and counts what was published on each topic, which is all the offline tools need. Nothing is
+serialized, so a publisher can be handed plain python values in place of messages just as rospy allows.
+"""
+
+import sys
+import time
+import types
+
+
+class TopicBus:
+    def __init__(self):
+        self.subscribers = {}
+        self.publishCounts = {}
+        self.lastMessages = {}
+
+    def subscribe(self, name, callback):
+        self.subscribers.setdefault(name, []).append(callback)
+
+    def unsubscribe(self, name, callback):
+        callbacks = self.subscribers.get(name, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def publish(self, name, message):
+        self.publishCounts[name] = self.publishCounts.get(name, 0) + 1
+        self.lastMessages[name] = message
+        for callback in list(self.subscribers.get(name, [])):
+            callback(message)
+
+    def reset(self):
+        self.subscribers = {}
+        self.publishCounts = {}
+        self.lastMessages = {}
+
+
+bus = TopicBus()
+
+
+class Publisher:
+    def __init__(self, name, data_class, queue_size=None, latch=False):
+        self.name = name
+        self.data_class = data_class
+        self.queue_size = queue_size
+
+    def publish(self, message):
+        bus.publish(self.name, message)
+
+    def get_num_connections(self):
+        return len(bus.subscribers.get(self.name, []))
+
+    def unregister(self):
+        pass
+
+
+class Subscriber:
+    def __init__(self, name, data_class, callback=None, queue_size=None):
+        self.name = name
+        self.data_class = data_class
+        self.callback = callback
+        if callback is not None:
+            bus.subscribe(name, callback)
+
+    def unregister(self):
+        if self.callback is not None:
+            bus.unsubscribe(self.name, self.callback)
+
+
+def makeMessageClass(name, fields):
+    "A message class with the given (field, default) pairs. Defaults are copied so lists are not shared"
+    def __init__(self, *args, **kwargs):
+        for (field, default), value in zip(fields, args):
+            kwargs.setdefault(field, value)
+        for field, default in fields:
+            if field in kwargs:
+                setattr(self, field, kwargs[field])
+            elif isinstance(default, list):
+                setattr(self, field, list(default))
+            else:
+                setattr(self, field, default)
+
+    def __repr__(self):
+        return name + "(" + ", ".join(field + "=" + repr(getattr(self, field)) for field, default in fields) + ")"
+
+    return type(name, (object,), {'__init__': __init__, '__repr__': __repr__, '__slots__': [field for field, default in fields]})
+
+
+def makeRospy():
+    rospy = types.ModuleType('rospy')
+    rospy.Publisher = Publisher
+    rospy.Subscriber = Subscriber
+    rospy.bus = bus
+    rospy.standIn = True
+    rospy.init_node = lambda name, anonymous=False, **kwargs: None
+    rospy.spin = lambda: None
+    rospy.is_shutdown = lambda: False
+    rospy.sleep = time.sleep
+    rospy.get_time = time.time
+    rospy.loginfo = lambda message, *args: None
+    rospy.logwarn = lambda message, *args: None
+    rospy.logerr = lambda message, *args: None
+    return rospy
+
+
+def makeMessageModules():
+    Prediction = makeMessageClass('Prediction', [('id', 0), ('gamma', 0.0), ('Z', 0.0), ('value', 0.0)])
+    StateRepresentation = makeMessageClass('StateRepresentation', [('timestamp', 0.0), ('readTime', 0.0), ('featurizeTime', 0.0), ('publishTime', 0.0), ('lastAction', 0), ('lastX', []), ('X', []),
+                                                                   ('speed', 0.0), ('load', 0.0), ('encoder', 0.0), ('lastPredictions', [])])
+    HordePredictions = makeMessageClass('HordePredictions', [('timestamp', 0.0), ('names', []), ('predictions', []), ('rupees', []), ('udes', []),
+                                                             ('averageRupee', 0.0), ('averageUDE', 0.0)])
+    HordeSummary = makeMessageClass('HordeSummary', [('timestamp', 0.0), ('step', 0), ('numberOfDemons', 0), ('averageRupee', 0.0), ('averageUDE', 0.0),
+                                                     ('percentiles', []), ('rupeePercentiles', []), ('udePercentiles', []),
+                                                     ('worstNames', []), ('worstRupees', []), ('worstUDEs', [])])
+    MotorState = makeMessageClass('MotorState', [('timestamp', 0.0), ('id', 0), ('goal', 0), ('position', 0), ('error', 0), ('speed', 0),
+                                                 ('load', 0.0), ('voltage', 0.0), ('temperature', 0), ('moving', False)])
+    MotorStateList = makeMessageClass('MotorStateList', [('motor_states', [])])
+    KeyValue = makeMessageClass('KeyValue', [('key', ''), ('value', '')])
+    DiagnosticStatus = makeMessageClass('DiagnosticStatus', [('level', 0), ('name', ''), ('message', ''), ('hardware_id', ''), ('values', [])])
+    DiagnosticArray = makeMessageClass('DiagnosticArray', [('header', None), ('status', [])])
+
+    return {
+        'std_msgs.msg': {'String': makeMessageClass('String', [('data', '')]),
+                         'Int16': makeMessageClass('Int16', [('data', 0)]),
+                         'Float64': makeMessageClass('Float64', [('data', 0.0)])},
+        'horde.msg': {'Prediction': Prediction, 'StateRepresentation': StateRepresentation, 'HordePredictions': HordePredictions,
+                      'HordeSummary': HordeSummary},
+        'dynamixel_msgs.msg': {'MotorState': MotorState, 'MotorStateList': MotorStateList},
+        'diagnostic_msgs.msg': {'KeyValue': KeyValue, 'DiagnosticStatus': DiagnosticStatus, 'DiagnosticArray': DiagnosticArray},
+        'dynamixel_driver.dynamixel_const': {},
+    }
+
+
+def _importable(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+def _register(name, module):
+    sys.modules[name] = module
+    if '.' in name:
+        packageName, attribute = name.rsplit('.', 1)
+        package = sys.modules.get(packageName)
+        if package is None:
+            package = types.ModuleType(packageName)
+            package.__path__ = []
+            sys.modules[packageName] = package
+        setattr(package, attribute, module)
+
+
+def install():
+    "Registers stand ins for the ROS modules that cannot be imported. Returns the names that were replaced"
+    installed = []
+    if not _importable('rospy'):
+        _register('rospy', makeRospy())
+        installed.append('rospy')
+    for name, classes in makeMessageModules().items():
+        if not _importable(name):
+            module = types.ModuleType(name)
+            for className, messageClass in classes.items():
+                setattr(module, className, messageClass)
+            _register(name, module)
+            installed.append(name)
+    return installed
@@ -0,0 +1,310 @@
+"""
+Description:
+A Horde learned by a pool of worker processes. The demons (in horde.demons order) are split into processes
+contiguous shards of near equal size, and each worker learns its shard with an ordinary Horde.
+
+The learned arrays (weights, hWeights, hHatWeights, movingtdEligErrorAverage and the per demon RUPEE / UDE state) are
+allocated in shared memory before the workers are forked, and each worker's Horde works directly on its shard's rows.
+The learner process sees every update as soon as the workers are done, so predictions(), rupees(), udes() and
+prediction(i, state) are the ordinary Horde ones. Nothing is pickled per step: learn() writes both states' features
+(active indexes and values for SparseVector features) and scalar fields and the action to shared buffers, the workers
+rebuild the states from them, and their cumulants and gammas are gathered back into shared arrays.
+
+Every demon's update only reads its own row and the state, and the shards agree each step on the trace columns the
+whole horde keeps (see traceEpsilon in Horde), so the result does not depend on timing and matches a single process
+Horde up to floating point rounding in the matrix products. Traces live in the workers. syncDemons() collects them (over a pipe,
+pickled), and addDemons() stops the workers, rebuilds the horde with the new demons and splits it evenly again.
+Workers are always forked (whatever multiprocessing's default start method is), so this needs a platform with fork
+(linux, macOS) and raises a ValueError elsewhere.
+A worker that raises fails the step with a RuntimeError, and so does one that dies outright (killed by a signal or the
+OOM killer): while waiting the learner checks every checkInterval seconds that the workers are alive, and if one is
+not it stops the rest.
+"""
+
+import os
+import ctypes
+import traceback
+import multiprocessing
+import numpy
+
+from horde.msg import StateRepresentation
+
+from Horde import *
+from SparseVector import *
+
+#Scalar fields of a StateRepresentation that question functions may read
+stateFields = ['timestamp', 'readTime', 'featurizeTime', 'publishTime', 'lastAction', 'speed', 'load', 'encoder']
+
+#Learned arrays, one row (or entry) per demon, kept in shared memory
+sharedArrayNames = ['weights', 'hWeights', 'hHatWeights', 'movingtdEligErrorAverage', 'taoRUPEE', 'taoUDE', 'averageTD',
+                    'tdVariance', 'i', 'updateCounts']
+
+def forkContext():
+    "multiprocessing, forking its processes. The workers inherit the shared arrays and the horde rather than pickling them"
+    if not hasattr(multiprocessing, 'get_context'):
+        #python 2 forks on every platform that has fork
+        if not hasattr(os, 'fork'):
+            raise ValueError("A sharded horde forks its workers, which this platform cannot do")
+        return multiprocessing
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        raise ValueError("A sharded horde forks its workers, which this platform cannot do")
+
+
+LEARN = 1
+KEEP = 2
+TRACES = 3
+STOP = 4
+
+
+def sharedArray(shape, dtype = float):
+    "A zeroed numpy array in shared memory that processes forked afterwards also see"
+    size = int(numpy.prod(shape))
+    context = forkContext()
+    if dtype == float:
+        raw = context.RawArray(ctypes.c_double, max(size, 1))
+        array = numpy.frombuffer(raw, dtype=numpy.float64)
+    else:
+        raw = context.RawArray(ctypes.c_long, max(size, 1))
+        array = numpy.frombuffer(raw, dtype=numpy.int_)
+    return array[:size].reshape(shape)
+
+
+class SharedFeatures:
+    "A feature vector (SparseVector or dense) written by the learner process and read by the workers"
+    def __init__(self, length):
+        self.length = length
+        self.header = sharedArray(2, int) #Dense (0 or 1) and number of active features
+        self.indexes = sharedArray(length, int)
+        self.values = sharedArray(length)
+
+    def write(self, features):
+        if isinstance(features, SparseVector):
+            active = len(features.indexes)
+            self.indexes[:active] = features.indexes
+            self.values[:active] = features.values
+            self.header[:] = (0, active)
+        else:
+            self.values[:] = features
+            self.header[:] = (1, self.length)
+
+    def read(self):
+        if self.header[0] == 1:
+            return numpy.array(self.values)
+        active = self.header[1]
+        return SparseVector(numpy.array(self.indexes[:active], dtype=numpy.intp), numpy.array(self.values[:active]), self.length)
+
+
+class SharedState:
+    "The scalar fields and features of a StateRepresentation, in shared memory"
+    def __init__(self, length):
+        self.scalars = sharedArray(len(stateFields))
+        self.X = SharedFeatures(length)
+        self.lastX = SharedFeatures(length)
+
+    def write(self, state):
+        self.scalars[:] = [getattr(state, field, 0) or 0 for field in stateFields]
+        self.X.write(state.X)
+        lastX = getattr(state, 'lastX', None)
+        self.lastX.write(lastX if lastX is not None and len(lastX) == self.X.length else SparseVector([], [], self.X.length))
+
+    def read(self):
+        state = StateRepresentation()
+        for field, value in zip(stateFields, self.scalars):
+            setattr(state, field, float(value))
+        state.lastAction = int(state.lastAction)
+        state.X = self.X.read()
+        state.lastX = self.lastX.read()
+        return state
+
+
+class ShardedHorde(Horde):
+    def __init__(self, demons, traceEpsilon = None, processes = 2):
+        self.context = forkContext()
+        Horde.__init__(self, demons, traceEpsilon)
+        self.requestedProcesses = processes
+        self.checkInterval = 1.0 #Seconds between checks that the workers are alive while waiting for them
+        self.processes = max(1, min(processes, self.numberOfDemons))
+        self.stopped = True
+
+        #Learned state in shared memory, replacing the arrays the Horde was built with
+        for name in sharedArrayNames:
+            array = getattr(self, name)
+            shared = sharedArray(array.shape, float if array.dtype == numpy.float64 else int)
+            shared[...] = array
+            setattr(self, name, shared)
+        self.sharedCumulants = sharedArray(self.numberOfDemons)
+        self.sharedGammas = sharedArray(self.numberOfDemons)
+
+        #Per step broadcast: both states, the action and the command for the workers
+        self.sharedLastState = SharedState(self.numberOfFeatures)
+        self.sharedNewState = SharedState(self.numberOfFeatures)
+        self.sharedAction = sharedArray(1)
+        self.command = sharedArray(1, int)
+        self.errors = sharedArray(max(self.processes, 1), int)
+        #Each shard's trace columns to keep on this step. See _serve
+        self.traceKeeps = sharedArray((self.processes, self.numberOfFeatures), int)
+
+        #Contiguous, near equal shards of horde.demons
+        bounds = numpy.linspace(0, self.numberOfDemons, self.processes + 1).round().astype(int)
+        self.shards = [(int(bounds[k]), int(bounds[k + 1])) for k in range(self.processes)]
+        self.startSemaphores = [self.context.Semaphore(0) for shard in self.shards]
+        self.doneSemaphore = self.context.Semaphore(0)
+        self.connections = []
+        self.workers = []
+        if self.numberOfDemons > 0:
+            self.start()
+
+    def start(self):
+        for k in range(len(self.shards)):
+            parentConnection, childConnection = self.context.Pipe()
+            worker = self.context.Process(target=self._serve, args=(k, childConnection), name='HordeShard' + str(k))
+            worker.daemon = True
+            worker.start()
+            self.connections.append(parentConnection)
+            self.workers.append(worker)
+        self.stopped = False
+
+    def _serve(self, k, connection):
+        #Runs in the forked worker
+        first, last = self.shards[k]
+        horde = Horde(self.demons[first:last], self.traceEpsilon)
+        for name in sharedArrayNames:
+            setattr(horde, name, getattr(self, name)[first:last])
+
+        #Which trace columns a horde keeps depends on all of its demons, so the shards agree on it half way through
+        #learning: each posts the columns it would keep and waits for the learner process's KEEP before reading
+        #everyone's. Every shard then tracks the same columns as the whole horde would
+        horde.activeTraceFeatures = numpy.array(self.activeTraceFeatures)
+        def combineTraceKeep(keep):
+            self.traceKeeps[k, :len(keep)] = keep
+            self.doneSemaphore.release()
+            self.startSemaphores[k].acquire()
+            return numpy.any(self.traceKeeps[:, :len(keep)], axis=0)
+        horde.combineTraceKeep = combineTraceKeep
+
+        while True:
+            self.startSemaphores[k].acquire()
+            command = int(self.command[0])
+            if command == STOP:
+                self.doneSemaphore.release()
+                return
+            if command == KEEP:
+                #Only reached by a shard that failed before combining (its error stands)
+                self.doneSemaphore.release()
+                continue
+            self.errors[k] = 0
+            try:
+                if command == LEARN:
+                    action = float(self.sharedAction[0])
+                    if action == int(action):
+                        action = int(action)
+                    horde.learn(self.sharedLastState.read(), action, self.sharedNewState.read())
+                    self.sharedCumulants[first:last] = horde.lastCumulants
+                    self.sharedGammas[first:last] = horde.lastGammas
+                elif command == TRACES:
+                    traces, gammaLast = horde.demonTraces()
+                    connection.send((numpy.array(traces), numpy.array(gammaLast)))
+            except Exception:
+                traceback.print_exc()
+                self.errors[k] = 1
+                if command == TRACES:
+                    #The learner process is waiting to receive
+                    connection.send((numpy.zeros((0, self.numberOfFeatures)), numpy.zeros(0)))
+            self.doneSemaphore.release()
+
+    def _run(self, command, receive = False, check = True):
+        #Has every worker run command and waits for all of them. With receive, returns what each worker sent back,
+        #read before waiting since a worker blocks sending more than the pipe holds
+        if self.stopped:
+            raise ValueError("The sharded horde has been stopped")
+        self.command[0] = command
+        for semaphore in self.startSemaphores:
+            semaphore.release()
+        received = []
+        if receive:
+            for connection in self.connections:
+                while not connection.poll(self.checkInterval):
+                    self._checkWorkers()
+                received.append(connection.recv())
+        for semaphore in self.startSemaphores:
+            while not self.doneSemaphore.acquire(True, self.checkInterval):
+                self._checkWorkers()
+        if check and numpy.any(self.errors):
+            raise RuntimeError("A horde shard failed. See its traceback above")
+        return received
+
+    def _checkWorkers(self):
+        #A worker killed by a signal (or the OOM killer) never answers. Stops the rest rather than waiting forever
+        dead = [worker for worker in self.workers if not worker.is_alive()]
+        if not dead:
+            return
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        for connection in self.connections:
+            connection.close()
+        self.workers = []
+        self.connections = []
+        self.stopped = True
+        raise RuntimeError("Horde shard " + ", ".join(worker.name + " (exit code " + str(worker.exitcode) + ")" for worker in dead) +
+                           " died. The sharded horde has been stopped")
+
+    def learn(self, lastState, action, newState, demons = None):
+        if demons is not None:
+            raise ValueError("A sharded horde updates every demon every step")
+        if self.numberOfDemons == 0:
+            return
+        if self.profiler:
+            startTime = clock()
+        self.sharedLastState.write(lastState)
+        self.sharedNewState.write(newState)
+        self.sharedAction[0] = action
+        if self.traceEpsilon is None:
+            self._run(LEARN)
+        else:
+            #Two rounds: up to the trace columns to keep, then the rest of the step
+            self._run(LEARN, check = False)
+            self._run(KEEP)
+        self.weightsChanged()
+        self.lastCumulants = numpy.array(self.sharedCumulants)
+        self.lastGammas = numpy.array(self.sharedGammas)
+        if self.profiler:
+            self.profiler.record('horde/shards', clock() - startTime)
+
+    def advance(self, lastState, action, newState):
+        raise ValueError("A sharded horde cannot be learned in parts. Use learn() (and no DemonScheduler budget)")
+
+    def update(self, demons = None):
+        raise ValueError("A sharded horde cannot be learned in parts. Use learn() (and no DemonScheduler budget)")
+
+    def demonTraces(self):
+        if self.numberOfDemons == 0:
+            return Horde.demonTraces(self)
+        shards = self._run(TRACES, receive = True)
+        return numpy.vstack([traces for traces, gammaLast in shards]), numpy.concatenate([gammaLast for traces, gammaLast in shards])
+
+    def eligibilityTrace(self, index):
+        return self.demonTraces()[0][index]
+
+    def addDemons(self, demons):
+        #Keeps what the current demons have learned and splits the larger horde evenly over the processes again
+        self.syncDemons()
+        self.stop()
+        profiler = self.profiler
+        self.__init__(self.demons + list(demons), self.traceEpsilon, self.requestedProcesses)
+        self.profiler = profiler
+
+    def stop(self):
+        if self.stopped:
+            return
+        self._run(STOP)
+        for worker in self.workers:
+            worker.join()
+        for connection in self.connections:
+            connection.close()
+        self.workers = []
+        self.connections = []
+        self.stopped = True
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+
+"""
+Description:
+Soak test of the live pipeline without ROS or a servo. A load generator publishes synthetic MotorStateList messages
+(a sine sweep of the encoder) on motor_states/pan_tilt_port at --rate Hz through the RosStandIn topic bus, where
+ObservationManager.motorStatesCallback receives them exactly as it would the dynamixel driver's. The observation
+manager publishes its state updates every --publishPeriod seconds with its PeriodicScheduler, and LearningForeground
+learns and acts on them in a thread of its own.
+
+Between the two sits a subscriber queue of --queueSize states that, like a rospy subscriber, drops the oldest state
+when the learner falls behind. Every --reportEvery seconds the harness prints (and at the end writes to --output as
+JSON):
+    generated / published / learned   motor states sent, state updates published and states learned, per second
+    overwritten                       motor states replaced by a newer one before the observation manager published them
+    dropped                           state updates dropped from the full queue
+    repeated                          state updates with the same servo timestamp as the one before (no new reading)
+    stale                             state updates older than --staleAfter seconds by the time they were learned
+    queue depth                       current and maximum number of states waiting for the learner
+    late                              generator ticks that fired more than one period late
+    jitter, overruns                  p99 lateness of the observation manager's publish ticks, and publishes that ran past
+                                      the next tick (see PeriodicScheduler)
+    missed                            foreground ticks over --deadline seconds
+    threads, rss                      live threads and resident memory, with growth since the first report
+
+Usage:
+python SoakTest.py --rate 100 --publishPeriod 0.01 --duration 3600 --demons predictLoad --output soak.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+import collections
+
+from RosStandIn import *
+install()
+
+import rospy
+
+from dynamixel_msgs.msg import MotorState
+from dynamixel_msgs.msg import MotorStateList
+
+from ObservationManager import *
+from LearningForeground import *
+from ReplayRunner import NullWriter, demonSets, actorCritics
+
+
+def residentMemory():
+    "Resident set size in bytes, 0 where it cannot be read"
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        #Peak rather than current, in kilobytes on linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return 0
+
+
+class MotorStateGenerator:
+    "Publishes a MotorStateList every 1 / rate seconds, keeping to absolute deadlines so a late tick does not shift the rest"
+    def __init__(self, rate, topic = 'motor_states/pan_tilt_port', sweepPeriod = 4.0):
+        self.period = 1.0 / rate
+        self.sweepPeriod = sweepPeriod
+        self.publisher = rospy.Publisher(topic, MotorStateList, queue_size = 10)
+        self.generated = 0
+        self.late = 0
+        self.running = False
+        self.thread = None
+
+    def motorStates(self, now):
+        phase = 2.0 * math.pi * now / self.sweepPeriod
+        position = int(766.5 + 256.5 * math.sin(phase))
+        speed = int(200.0 * math.cos(phase))
+        state = MotorState(timestamp = now, id = 2, goal = position, position = position, speed = speed,
+                           load = random.uniform(-0.5, 0.5), voltage = 12.3, temperature = 32, moving = True)
+        return MotorStateList(motor_states = [state])
+
+    def run(self):
+        deadline = time.time()
+        while self.running:
+            now = time.time()
+            if now > deadline + self.period:
+                self.late += 1
+            self.publisher.publish(self.motorStates(now))
+            self.generated += 1
+            deadline += self.period
+            delay = deadline - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target = self.run, name = 'MotorStateGenerator')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+
+class LearnerQueue:
+    """
+    Hands state updates to the foreground on a thread of its own through a queue of queueSize states. A full queue
+    drops its oldest state, as a rospy subscriber with that queue_size does
+    """
+    def __init__(self, foreground, queueSize, staleAfter):
+        self.foreground = foreground
+        self.staleAfter = staleAfter
+        self.queue = collections.deque(maxlen = queueSize)
+        self.condition = threading.Condition()
+        self.received = 0
+        self.dropped = 0
+        self.learned = 0
+        self.repeated = 0
+        self.stale = 0
+        self.maxDepth = 0
+        self.lastTimestamp = None
+        self.running = False
+        self.thread = None
+
+    def receive(self, state):
+        #observation_manager/state_update callback
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(state)
+            self.received += 1
+            self.maxDepth = max(self.maxDepth, len(self.queue))
+            self.condition.notify()
+
+    def depth(self):
+        return len(self.queue)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait(0.1)
+                if not self.queue:
+                    return
+                state = self.queue.popleft()
+            if state.timestamp == self.lastTimestamp:
+                self.repeated += 1
+            self.lastTimestamp = state.timestamp
+            if time.time() - state.readTime > self.staleAfter:
+                self.stale += 1
+            self.foreground.receiveStateUpdateCallback(state)
+            self.learned += 1
+
+    def start(self):
+        self.running = True
+        rospy.Subscriber('observation_manager/state_update', StateRepresentation, self.receive)
+        self.thread = threading.Thread(target = self.run, name = 'LearnerQueue')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        #Learns what is left in the queue first
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+
+class SoakTest:
+    def __init__(self, observationManager, foreground, rate, queueSize = 10, staleAfter = 1.0):
+        self.observationManager = observationManager
+        self.foreground = foreground
+        self.generator = MotorStateGenerator(rate)
+        self.learner = LearnerQueue(foreground, queueSize, staleAfter)
+        self.startTime = None
+        self.reports = []
+        self.firstRss = None
+        self.firstThreads = None
+        self.publishedReadings = 0
+        self.lastPublishedTimestamp = None
+
+    def countPublished(self, state):
+        #Distinct servo readings that made it into a state update. The generator's timestamps only increase, so a
+        #reading is new when it differs from the last one published
+        if state.timestamp != self.lastPublishedTimestamp:
+            self.publishedReadings += 1
+            self.lastPublishedTimestamp = state.timestamp
+
+    def start(self):
+        rospy.Subscriber('observation_manager/state_update', StateRepresentation, self.countPublished)
+        self.learner.start()
+        self.observationManager.start()
+        self.startTime = time.time()
+        self.generator.start()
+
+    def stop(self):
+        self.generator.stop()
+        self.observationManager.stop()
+        self.learner.stop()
+        self.foreground.stop()
+
+    def report(self):
+        elapsed = time.time() - self.startTime
+        rss = residentMemory()
+        threads = threading.active_count()
+        if self.firstRss is None:
+            self.firstRss = rss
+            self.firstThreads = threads
+        published = self.learner.received
+        publishing = self.observationManager.publishScheduler.stats()
+        report = {
+            'elapsed': elapsed,
+            'generated': self.generator.generated,
+            'published': published,
+            'learned': self.learner.learned,
+            'generatedPerSecond': self.generator.generated / elapsed,
+            'publishedPerSecond': published / elapsed,
+            'learnedPerSecond': self.learner.learned / elapsed,
+            'overwritten': max(self.generator.generated - self.publishedReadings, 0),
+            'dropped': self.learner.dropped,
+            'repeated': self.learner.repeated,
+            'stale': self.learner.stale,
+            'queueDepth': self.learner.depth(),
+            'maxQueueDepth': self.learner.maxDepth,
+            'late': self.generator.late,
+            'publishJitterP99': publishing['jitter']['p99'] if publishing['jitter'] else 0.0,
+            'publishOverruns': publishing['overruns'],
+            'publishSkipped': publishing['skipped'],
+            'publishErrors': publishing['errors'],
+            'missedDeadlines': self.foreground.missedDeadlines,
+            'learningBacklog': self.foreground.learningWorker.backlog() if self.foreground.learningWorker else 0,
+            'learningFailed': self.foreground.learningWorker.failed if self.foreground.learningWorker else 0,
+            'threads': threads,
+            'threadGrowth': threads - self.firstThreads,
+            'rss': rss,
+            'rssGrowth': rss - self.firstRss,
+        }
+        self.reports.append(report)
+        return report
+
+    def run(self, duration, reportEvery = 10.0, output = sys.stderr):
+        self.start()
+        try:
+            endTime = self.startTime + duration
+            while time.time() < endTime:
+                time.sleep(max(min(reportEvery, endTime - time.time()), 0.0))
+                output.write(reportLine(self.report()) + "\n")
+                output.flush()
+        finally:
+            self.stop()
+        return self.report()
+
+    def results(self):
+        return {'reports': self.reports, 'latency': self.foreground.latency.summary(), 'stages': self.foreground.profiler.summary(),
+                'demons': self.foreground.horde.numberOfDemons, 'rate': 1.0 / self.generator.period,
+                'publishPeriod': self.observationManager.publishingFrequency, 'queueSize': self.learner.queue.maxlen}
+
+
+def reportLine(report):
+    return ("%7.1fs" % report['elapsed']) + \
+           " generated/s " + ("%7.1f" % report['generatedPerSecond']) + \
+           " published/s " + ("%7.1f" % report['publishedPerSecond']) + \
+           " learned/s " + ("%7.1f" % report['learnedPerSecond']) + \
+           " overwritten " + str(report['overwritten']) + \
+           " dropped " + str(report['dropped']) + \
+           " repeated " + str(report['repeated']) + \
+           " stale " + str(report['stale']) + \
+           " queue " + str(report['queueDepth']) + "/" + str(report['maxQueueDepth']) + \
+           " late " + str(report['late']) + \
+           " jitter p99 " + ("%.2f" % report['publishJitterP99']) + "ms" + \
+           " overruns " + str(report['publishOverruns']) + \
+           " errors " + str(report['publishErrors']) + \
+           " missed " + str(report['missedDeadlines']) + \
+           " threads " + str(report['threads']) + \
+           " rss " + ("%.1f" % (report['rss'] / 1e6)) + "MB (" + ("%+.1f" % (report['rssGrowth'] / 1e6)) + ")"
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Soak the ObservationManager -> LearningForeground pipeline with synthetic motor states")
+    parser.add_argument('--rate', type=float, default=100.0, help="motor states generated per second")
+    parser.add_argument('--publishPeriod', type=float, default=None, help="seconds between state updates. Defaults to 1 / rate")
+    parser.add_argument('--duration', type=float, default=60.0, help="seconds to run")
+    parser.add_argument('--reportEvery', type=float, default=10.0, help="seconds between reports")
+    parser.add_argument('--queueSize', type=int, default=10, help="state updates the learner's subscriber queue holds")
+    parser.add_argument('--staleAfter', type=float, default=None, help="seconds after which a learned state is stale. Defaults to 2 publish periods")
+    parser.add_argument('--demons', choices=sorted(demonSets), default='predictLoad')
+    parser.add_argument('--actorCritic', choices=sorted(actorCritics), default='none')
+    parser.add_argument('--actBeforeLearn', action='store_true', help="act on each state before learning from it")
+    parser.add_argument('--learnInBackground', action='store_true', help="learn on a background worker thread (implies acting first)")
+    parser.add_argument('--deadline', type=float, default=None, help="seconds per tick. Longer ticks are counted as missed deadlines")
+    parser.add_argument('--noPrecompute', action='store_true', help="tile code on demand rather than precomputing every reading")
+    parser.add_argument('--output', default=None, help="write every report and the latency and stage profiles here (JSON)")
+    parser.add_argument('--profile', default=None, help="also write the stage profile here (JSON) with each summary during the run")
+    parser.add_argument('--profileGroups', action='store_true', help="also time the demon updates of each trace group (slower)")
+    parser.add_argument('--latency', default=None, help="also write the latency profile here (JSON) with each summary during the run")
+    parser.add_argument('--verbose', action='store_true', help="keep the per step printing")
+    options = parser.parse_args(arguments)
+
+    publishPeriod = options.publishPeriod or 1.0 / options.rate
+    observationManager = ObservationManager()
+    observationManager.publishingFrequency = publishPeriod
+    observationManager.logPath = None
+    observationManager.precomputeTileCoding = not options.noPrecompute
+    foreground = LearningForeground()
+    foreground.profileDemonGroups = options.profileGroups
+    foreground.setDemons(demonSets[options.demons]())
+    foreground.actorCritic = actorCritics[options.actorCritic]()
+    foreground.profiler.dumpPath = options.profile
+    foreground.latency.dumpPath = options.latency
+    foreground.actBeforeLearn = options.actBeforeLearn
+    foreground.learnInBackground = options.learnInBackground
+    foreground.tickDeadline = options.deadline
+
+    soakTest = SoakTest(observationManager, foreground, options.rate, options.queueSize, options.staleAfter or 2.0 * publishPeriod)
+    stdout = sys.stdout
+    if not options.verbose:
+        sys.stdout = NullWriter()
+    try:
+        final = soakTest.run(options.duration, options.reportEvery)
+    finally:
+        sys.stdout = stdout
+
+    print("Final: " + reportLine(final))
+    print(str(foreground.latency))
+    if options.output:
+        with open(options.output, 'w') as outputFile:
+            json.dump(soakTest.results(), outputFile, indent=2, sort_keys=True)
+    return soakTest
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,75 @@
+"""
+Description:
+Eligibility traces only have non negligible values on the features that were active in the last few steps. SparseTrace
+keeps a dense backing vector but only decays, accumulates and reads the entries that are currently non zero, dropping
+an entry once its magnitude falls below epsilon. Per step cost is then proportional to the recently active features
+rather than the full vector length.
+
+A SparseTrace can be used anywhere a SparseVector is read (dot, addScaled(..., trace)). Use decayTrace(trace, factor)
+and addScaled(trace, scale, features) to update it, which also work for plain dense numpy traces.
+"""
+
+import numpy
+from SparseVector import *
+
+
+class SparseTrace(SparseVector):
+    def __init__(self, length, epsilon):
+        self.length = int(length)
+        self.epsilon = epsilon
+        self.trace = numpy.zeros(self.length)
+        self.activeIndexes = numpy.zeros(0, dtype=numpy.intp)
+
+    @property
+    def indexes(self):
+        return self.activeIndexes
+
+    @property
+    def values(self):
+        return self.trace[self.activeIndexes]
+
+    def clear(self):
+        self.trace[self.activeIndexes] = 0.0
+        self.activeIndexes = numpy.zeros(0, dtype=numpy.intp)
+
+    def decay(self, factor):
+        if factor == 0:
+            self.clear()
+            return
+        values = self.trace[self.activeIndexes] * factor
+        keep = numpy.absolute(values) >= self.epsilon
+        self.trace[self.activeIndexes] = numpy.where(keep, values, 0.0)
+        self.activeIndexes = self.activeIndexes[keep]
+
+    def accumulate(self, scale, features):
+        #In place self += scale * features
+        if isinstance(features, SparseVector):
+            indexes = features.indexes
+            values = features.values
+        else:
+            features = numpy.asarray(features)
+            indexes = numpy.flatnonzero(features)
+            values = features[indexes]
+        self.trace[indexes] += scale * values
+        self.activeIndexes = numpy.union1d(self.activeIndexes, indexes)
+        return self
+
+    def toDense(self):
+        return self.trace.copy()
+
+    def __repr__(self):
+        return "SparseTrace(length=" + str(self.length) + ", epsilon=" + str(self.epsilon) + ", active=" + str(len(self.activeIndexes)) + ")"
+
+
+def makeTrace(length, epsilon = None):
+    #Dense numpy trace when no epsilon is given so existing behaviour is unchanged
+    if epsilon is None:
+        return numpy.zeros(length)
+    return SparseTrace(length, epsilon)
+
+
+def decayTrace(trace, factor):
+    if isinstance(trace, SparseTrace):
+        trace.decay(factor)
+        return trace
+    return factor * trace
@@ -0,0 +1,104 @@
+"""
+Description:
+A tile coded state only has numberOfTilings active features out of the full feature vector. SparseVector carries just
+the active indexes (and their values, 1 for tile coded states) so that predictions and weight updates cost
+O(active features) rather than O(vector length).
+
+dot(vector, features) and addScaled(vector, scale, features) accept either a dense numpy array or a SparseVector as
+the features argument, so the learners can use the same code for both.
+"""
+
+import numpy
+
+
+class SparseVector(object):
+    #Stop numpy from converting a SparseVector to a dense array in expressions like numpy.float64 * SparseVector
+    __array_ufunc__ = None
+    __array_priority__ = 100
+
+    def __init__(self, indexes, values, length):
+        self.indexes = numpy.asarray(indexes, dtype=numpy.intp)
+        self.values = numpy.asarray(values, dtype=float)
+        self.length = int(length)
+
+    @staticmethod
+    def fromIndexes(indexes, length):
+        #Hashed tilings can land on the same index more than once. A dense vector would just set that bit to 1
+        indexes = numpy.unique(numpy.asarray(indexes, dtype=numpy.intp))
+        return SparseVector(indexes, numpy.ones(len(indexes)), length)
+
+    @staticmethod
+    def fromDense(vector):
+        vector = numpy.asarray(vector)
+        indexes = numpy.flatnonzero(vector)
+        return SparseVector(indexes, vector[indexes], len(vector))
+
+    def toDense(self):
+        vector = numpy.zeros(self.length)
+        vector[self.indexes] = self.values
+        return vector
+
+    def dot(self, vector):
+        #vector may also be a 2-D array of weights (one row per demon)
+        return numpy.dot(numpy.take(vector, self.indexes, axis=-1), self.values)
+
+    def addTo(self, vector, scale=1.0):
+        #In place vector += scale * self. scale may be a column of per row scales when vector is 2-D
+        vector[..., self.indexes] += scale * self.values
+        return vector
+
+    def shifted(self, offset, length):
+        #The same active features placed at offset within a longer vector
+        return SparseVector(self.indexes + offset, self.values, length)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        position = numpy.searchsorted(self.indexes, index)
+        if position < len(self.indexes) and self.indexes[position] == index:
+            return self.values[position]
+        return 0.0
+
+    def __mul__(self, scale):
+        return SparseVector(self.indexes, self.values * scale, self.length)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return SparseVector(self.indexes, -self.values, self.length)
+
+    def __add__(self, other):
+        if isinstance(other, SparseVector):
+            indexes, inverse = numpy.unique(numpy.concatenate((self.indexes, other.indexes)), return_inverse=True)
+            values = numpy.zeros(len(indexes))
+            numpy.add.at(values, inverse, numpy.concatenate((self.values, other.values)))
+            return SparseVector(indexes, values, self.length)
+        return self.addTo(numpy.array(other, dtype=float))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __repr__(self):
+        return "SparseVector(length=" + str(self.length) + ", indexes=" + str(self.indexes) + ", values=" + str(self.values) + ")"
+
+
+def dot(vector, features):
+    if isinstance(features, SparseVector):
+        return features.dot(vector)
+    return numpy.dot(vector, features)
+
+
+def addScaled(vector, scale, features):
+    #In place vector += scale * features. vector may be a dense numpy array or a sparse trace (see SparseTrace)
+    if isinstance(vector, SparseVector):
+        return vector.accumulate(scale, features)
+    if isinstance(features, SparseVector):
+        return features.addTo(vector, scale)
+    vector += scale * features
+    return vector
@@ -0,0 +1,131 @@
+"""
+Description:
+Times the stages of a step (feature conversion, learning, verification, acting, publishing, ...) and keeps the last
+window durations of each in a ring buffer, so p50 / p95 / p99 / max reflect recent behaviour rather than the whole run.
+
+    with profiler.stage('learnDemons'):
+        ...
+
+Every summaryInterval ticks (calls to tick()) the summary is published as a DiagnosticArray on
+horde_profiler/summary, one DiagnosticStatus per stage with count, p50, p95, p99 and max in milliseconds, and written
+as JSON to dumpPath if one is set. A disabled profiler's stages cost one attribute lookup.
+"""
+
+import json
+import time
+import numpy
+
+from diagnostic_msgs.msg import DiagnosticArray
+from diagnostic_msgs.msg import DiagnosticStatus
+from diagnostic_msgs.msg import KeyValue
+
+from PublisherRegistry import *
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class StageTimer:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.durations = numpy.zeros(profiler.window)
+        self.count = 0
+        self.maximum = 0.0
+        self.startTime = 0.0
+
+    def __enter__(self):
+        self.startTime = clock()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.record(clock() - self.startTime)
+        return False
+
+    def record(self, duration):
+        self.durations[self.count % len(self.durations)] = duration
+        self.count += 1
+        if duration > self.maximum:
+            self.maximum = duration
+
+    def recent(self):
+        return self.durations[:min(self.count, len(self.durations))]
+
+    def summary(self):
+        #Milliseconds. max is over the whole run, the percentiles over the last window
+        recent = self.recent() * 1000.0
+        if len(recent) == 0:
+            return {'count': 0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+        p50, p95, p99 = numpy.percentile(recent, [50, 95, 99])
+        return {'count': self.count, 'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': self.maximum * 1000.0}
+
+
+class NullStageTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+
+class StageProfiler:
+    def __init__(self, name = 'horde', window = 1000, summaryInterval = 10, dumpPath = None, enabled = True):
+        self.name = name
+        self.window = window
+        self.summaryInterval = summaryInterval
+        self.dumpPath = dumpPath
+        self.enabled = enabled
+        self.stages = {}
+        self.stageOrder = []
+        self.ticks = 0
+        self.info = {} #Extra context written with the dump, e.g. the number of demons
+        self.nullTimer = NullStageTimer()
+
+    def stage(self, name):
+        if not self.enabled:
+            return self.nullTimer
+        timer = self.stages.get(name)
+        if timer is None:
+            timer = StageTimer(self, name)
+            self.stages[name] = timer
+            self.stageOrder.append(name)
+        return timer
+
+    def record(self, name, duration):
+        if self.enabled:
+            self.stage(name).record(duration)
+
+    def summary(self):
+        return dict((name, self.stages[name].summary()) for name in self.stageOrder)
+
+    def diagnostics(self):
+        msg = DiagnosticArray()
+        for name in self.stageOrder:
+            summary = self.stages[name].summary()
+            status = DiagnosticStatus()
+            status.name = self.name + '/' + name
+            status.message = "p50 " + ("%.3f" % summary['p50']) + " ms, p99 " + ("%.3f" % summary['p99']) + " ms"
+            status.values = [KeyValue(key, str(summary[key])) for key in ['count', 'p50', 'p95', 'p99', 'max']]
+            msg.status.append(status)
+        return msg
+
+    def dump(self, path = None):
+        path = path or self.dumpPath
+        with open(path, 'w') as dumpFile:
+            json.dump({'name': self.name, 'ticks': self.ticks, 'window': self.window, 'unit': 'ms', 'info': self.info, 'stages': self.summary()}, dumpFile, indent=2, sort_keys=True)
+
+    def tick(self):
+        #Call once per step. Publishes (and dumps) the summary every summaryInterval ticks
+        if not self.enabled:
+            return
+        self.ticks += 1
+        if self.ticks % self.summaryInterval == 0:
+            publishers.get('horde_profiler/summary', DiagnosticArray, queue_size=10).publish(self.diagnostics())
+            if self.dumpPath:
+                self.dump()
+
+    def __str__(self):
+        lines = [self.name + " stage profile (ms, last " + str(self.window) + " steps):"]
+        for name, summary in sorted(self.summary().items(), key=lambda item: -item[1]['p50']):
+            lines.append("  " + name.ljust(20) + " p50 " + ("%8.3f" % summary['p50']) + " p95 " + ("%8.3f" % summary['p95']) +
+                         " p99 " + ("%8.3f" % summary['p99']) + " max " + ("%8.3f" % summary['max']) + " n " + str(summary['count']))
+        return "\n".join(lines)
@@ -0,0 +1,343 @@
+"""
+Description:
+How ObservationManager hands its StateRepresentations to LearningForeground. Every transport has publish(state),
+subscribe(callback) and close().
+
+    RosStateTransport           observation_manager/state_update, as before. Every state is serialized, X and lastX
+                                included, and the learner copies them again into numpy arrays
+    SharedMemoryStateTransport  a StateRing in a file under /dev/shm that both nodes map. The observation manager writes
+                                the sensor values and features into the next slot and the learner, polling on a thread,
+                                reads them as numpy views of the ring. Nothing is serialized or copied. Either node
+                                may start first, and either may restart
+    InProcessStateTransport     the same ring in anonymous memory, read synchronously on publish. A stand in for
+                                testing and offline tools (ReplayRunner --transport inProcess)
+    AutoStateTransport          the shared memory ring when both nodes are on one machine, ROS otherwise. The observation
+                                manager always writes the ring and also publishes on ROS while anything subscribes to
+                                the topic. The learner reads the ring if a fresh one exists when it subscribes, and
+                                otherwise subscribes on ROS
+
+makeStateTransport(kind, featureLength) builds one from its name ('ros', 'sharedMemory', 'inProcess' or 'auto').
+
+The ring has slots slots. State n (counting from 1) goes to slot n % slots, whose sequence number is -1 while the state
+is written and n once it is complete, and the ring's write count is n once it is published. A reader that falls more
+than slots - 1 states behind skips to the oldest complete state and counts the rest as dropped. The X and lastX a
+reader hands out are views of the ring, valid until slots - 1 more states have been written, so a reader that keeps
+them for longer must copy them (LearningForeground does, unless it converts them to SparseVectors straight away).
+"""
+
+import os
+import mmap
+import time
+import threading
+import numpy
+import rospy
+
+from horde.msg import StateRepresentation
+
+from PublisherRegistry import *
+
+#Scalar fields of a StateRepresentation carried in the ring
+stateFields = ['timestamp', 'readTime', 'featurizeTime', 'publishTime', 'lastAction', 'speed', 'load', 'encoder']
+
+#The transport ObservationManager and LearningForeground make. 'ros', 'sharedMemory' or 'auto' (the same for both
+#nodes), or 'inProcess' with both handed the same transport object (see ReplayRunner --transport)
+stateTransport = 'ros'
+
+ringMagic = 0x48524452 #'HRDR'
+defaultTopic = 'observation_manager/state_update'
+defaultPath = '/dev/shm/horde_state_ring'
+
+
+class StateRing:
+    def __init__(self, buffer, slots, featureLength):
+        self.buffer = buffer
+        self.slots = slots
+        self.featureLength = featureLength
+        offset = 0
+        self.header, offset = self._array(offset, 4, numpy.int64) #magic, slots, featureLength, write count
+        self.writeTime, offset = self._array(offset, 1, numpy.float64)
+        self.sequences, offset = self._array(offset, slots, numpy.int64)
+        self.scalars, offset = self._array(offset, (slots, len(stateFields)), numpy.float64)
+        self.X, offset = self._array(offset, (slots, featureLength), numpy.float64)
+        self.lastX, offset = self._array(offset, (slots, featureLength), numpy.float64)
+
+    @staticmethod
+    def size(slots, featureLength):
+        return 8 * (4 + 1 + slots + slots * len(stateFields) + 2 * slots * featureLength)
+
+    def _array(self, offset, shape, dtype):
+        array = numpy.ndarray(shape, dtype=dtype, buffer=self.buffer, offset=offset)
+        return array, offset + array.nbytes
+
+    def initialize(self):
+        self.sequences[:] = 0
+        self.header[1] = self.slots
+        self.header[2] = self.featureLength
+        self.header[3] = 0
+        self.header[0] = ringMagic
+
+    def isValid(self):
+        return self.header[0] == ringMagic and self.header[1] == self.slots and self.header[2] == self.featureLength
+
+    def writeCount(self):
+        return int(self.header[3])
+
+    def write(self, state):
+        n = self.writeCount() + 1
+        slot = n % self.slots
+        self.sequences[slot] = -1
+        self.scalars[slot] = [getattr(state, field, 0) or 0 for field in stateFields]
+        self.X[slot] = state.X
+        lastX = getattr(state, 'lastX', None)
+        if lastX is not None and len(lastX) == self.featureLength:
+            self.lastX[slot] = lastX
+        else:
+            self.lastX[slot] = 0.0
+        self.sequences[slot] = n
+        self.writeTime[0] = time.time()
+        self.header[3] = n
+        return n
+
+    def read(self, n):
+        #State n with X and lastX viewing the ring, or None if it has been (or is being) overwritten
+        slot = n % self.slots
+        if self.sequences[slot] != n:
+            return None
+        state = StateRepresentation()
+        for field, value in zip(stateFields, self.scalars[slot]):
+            setattr(state, field, float(value))
+        state.lastAction = int(state.lastAction)
+        state.X = self.X[slot]
+        state.lastX = self.lastX[slot]
+        if self.sequences[slot] != n:
+            return None
+        return state
+
+    def isCurrent(self, n):
+        return self.sequences[n % self.slots] == n
+
+
+class StateRingReader:
+    "Hands every new state in a ring to callback, in order, skipping (and counting) those overwritten before being read"
+    def __init__(self, ring, callback):
+        self.callback = callback
+        self.delivered = 0
+        self.dropped = 0
+        self.overwritten = 0 #States overwritten while the callback still had them
+        self.resets = 0 #Times the ring's write count went back, i.e. it was initialized again
+        self.attach(ring)
+
+    def attach(self, ring, fromStart = False):
+        #Reads ring from its next state, or from the oldest state it still holds. None to read nothing for now
+        self.ring = ring
+        self.lastRead = 0
+        if ring is not None and not fromStart:
+            self.lastRead = ring.writeCount()
+
+    def poll(self):
+        if self.ring is None:
+            return 0
+        latest = self.ring.writeCount()
+        if latest < self.lastRead:
+            self.resets += 1
+            self.lastRead = 0
+        if latest <= self.lastRead:
+            return 0
+        #The writer may already be writing over the oldest of the slots
+        first = max(self.lastRead + 1, latest - self.ring.slots + 2)
+        self.dropped += first - (self.lastRead + 1)
+        delivered = 0
+        for n in range(first, latest + 1):
+            self.lastRead = n
+            state = self.ring.read(n)
+            if state is None:
+                self.dropped += 1
+                continue
+            self.callback(state)
+            if not self.ring.isCurrent(n):
+                self.overwritten += 1
+            delivered += 1
+        self.delivered += delivered
+        return delivered
+
+
+class RosStateTransport:
+    def __init__(self, topic = defaultTopic):
+        self.topic = topic
+        self.subscriber = None
+
+    def publish(self, state):
+        publishers.get(self.topic, StateRepresentation, queue_size = 10).publish(state)
+
+    def subscribe(self, callback):
+        self.subscriber = rospy.Subscriber(self.topic, StateRepresentation, callback)
+
+    def close(self):
+        if self.subscriber is not None:
+            self.subscriber.unregister()
+            self.subscriber = None
+
+
+class InProcessStateTransport:
+    def __init__(self, featureLength, slots = 16):
+        self.ring = StateRing(mmap.mmap(-1, StateRing.size(slots, featureLength)), slots, featureLength)
+        self.ring.initialize()
+        self.readers = []
+
+    def publish(self, state):
+        self.ring.write(state)
+        for reader in self.readers:
+            reader.poll()
+
+    def subscribe(self, callback):
+        reader = StateRingReader(self.ring, callback)
+        self.readers.append(reader)
+        return reader
+
+    def close(self):
+        self.readers = []
+
+
+class SharedMemoryStateTransport:
+    """
+    The writer maps an existing ring of the right size and carries on its write count, so a restarted observation
+    manager resumes where it left off. Anything else at path is replaced by a new file (renamed into place, never
+    truncated under a reader that has it mapped). The reader waits for the ring to appear, and moves to the new file
+    when the one it maps has been replaced, reading it from the start
+    """
+    def __init__(self, featureLength, path = defaultPath, slots = 16, pollInterval = 0.0005, checkInterval = 1.0):
+        self.featureLength = featureLength
+        self.path = path
+        self.slots = slots
+        self.pollInterval = pollInterval
+        self.checkInterval = checkInterval #Seconds between checks for a missing or replaced ring while idle
+        self.file = None
+        self.ring = None
+        self.inode = None
+        self.reader = None
+        self.thread = None
+        self.running = False
+
+    @staticmethod
+    def isFresh(path, featureLength, slots = 16, staleAfter = 5.0):
+        #Whether a ring at path is being written, i.e. its observation manager runs on this machine
+        transport = SharedMemoryStateTransport(featureLength, path, slots)
+        try:
+            return transport._attach() and time.time() - transport.ring.writeTime[0] < staleAfter
+        finally:
+            transport.close()
+
+    def _attach(self):
+        #Maps the ring at path. False if there is none (yet)
+        self._detach()
+        size = StateRing.size(self.slots, self.featureLength)
+        try:
+            if os.path.getsize(self.path) != size:
+                return False
+            self.file = open(self.path, 'r+b')
+            self.ring = StateRing(mmap.mmap(self.file.fileno(), size), self.slots, self.featureLength)
+        except (IOError, OSError, ValueError):
+            self._detach()
+            return False
+        if not self.ring.isValid():
+            self._detach()
+            return False
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        return True
+
+    def _detach(self):
+        self.ring = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _create(self):
+        size = StateRing.size(self.slots, self.featureLength)
+        temporaryPath = self.path + '.' + str(os.getpid())
+        with open(temporaryPath, 'w+b') as newFile:
+            newFile.truncate(size)
+            ring = StateRing(mmap.mmap(newFile.fileno(), size), self.slots, self.featureLength)
+            ring.initialize()
+            ring.buffer.close()
+        os.rename(temporaryPath, self.path)
+
+    def _isReplaced(self):
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except OSError:
+            return False
+
+    def publish(self, state):
+        if self.ring is None and not self._attach():
+            self._create()
+            self._attach()
+        self.ring.write(state)
+
+    def subscribe(self, callback):
+        self.reader = StateRingReader(None, callback)
+        if self._attach():
+            self.reader.attach(self.ring)
+        self.running = True
+        self.thread = threading.Thread(target = self._poll, name = 'StateRingReader')
+        self.thread.daemon = True
+        self.thread.start()
+        return self.reader
+
+    def _poll(self):
+        lastCheck = time.time()
+        while self.running:
+            if self.reader.poll() > 0:
+                continue
+            time.sleep(self.pollInterval)
+            if time.time() - lastCheck < self.checkInterval:
+                continue
+            lastCheck = time.time()
+            if self.ring is None or self._isReplaced():
+                #Either way every state in the new ring is one this reader has not seen
+                self.reader.attach(self.ring if self._attach() else None, fromStart = True)
+
+    def close(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+        self._detach()
+
+
+class AutoStateTransport:
+    def __init__(self, featureLength, topic = defaultTopic, path = defaultPath, slots = 16):
+        self.sharedMemory = SharedMemoryStateTransport(featureLength, path, slots)
+        self.ros = RosStateTransport(topic)
+        self.featureLength = featureLength
+        self.path = path
+        self.slots = slots
+        self.subscribed = None #The transport the learner ended up on
+
+    def publish(self, state):
+        self.sharedMemory.publish(state)
+        publisher = publishers.get(self.ros.topic, StateRepresentation, queue_size = 10)
+        if publisher.get_num_connections() > 0:
+            publisher.publish(state)
+
+    def subscribe(self, callback):
+        if SharedMemoryStateTransport.isFresh(self.path, self.featureLength, self.slots):
+            self.subscribed = self.sharedMemory
+        else:
+            self.subscribed = self.ros
+        return self.subscribed.subscribe(callback)
+
+    def close(self):
+        self.sharedMemory.close()
+        self.ros.close()
+
+
+def makeStateTransport(kind, featureLength, topic = defaultTopic, path = defaultPath):
+    if kind == 'ros':
+        return RosStateTransport(topic)
+    if kind == 'sharedMemory':
+        return SharedMemoryStateTransport(featureLength, path)
+    if kind == 'inProcess':
+        return InProcessStateTransport(featureLength)
+    if kind == 'auto':
+        return AutoStateTransport(featureLength, topic, path)
+    raise ValueError("Unknown state transport " + str(kind) + ". Use ros, sharedMemory, inProcess or auto")
@@ -0,0 +1,65 @@
+"""
+Description:
+Random tile coded states and load predicting demons, for the benchmarks and tests that learn a horde without a robot.
+The horde.msg messages must be importable first (RosStandIn.install() without ROS).
+"""
+
+import random
+import numpy
+
+from horde.msg import StateRepresentation
+
+from TileCoder import *
+from SparseVector import *
+from GVF import *
+
+
+def featureLength(numTilings, numTiles):
+    return numTilings * numTiles * numTiles
+
+
+def makeStates(numTilings, numTiles, count, sparse = True, rng = random):
+    "count random tile coded StateRepresentations, each with the previous one's features as lastX"
+    states = []
+    vectorLength = featureLength(numTilings, numTiles)
+    lastX = numpy.zeros(vectorLength)
+    for i in range(count):
+        encoder = rng.uniform(510.0, 1023.0)
+        speed = rng.uniform(-200.0, 200.0)
+        values = [(encoder - 510.0) / 513.0 * numTiles, (speed + 200.0) / 400.0 * numTiles]
+        X = TileCoder.getFeatureVectorFromValues(values, numTilings, numTiles)
+        state = StateRepresentation(timestamp = float(i), encoder = encoder, speed = speed, load = rng.uniform(-1.0, 1.0))
+        if sparse:
+            state.X = SparseVector.fromDense(X)
+            state.lastX = SparseVector.fromDense(lastX)
+        else:
+            state.X = X
+            state.lastX = lastX
+        lastX = X
+        states.append(state)
+    return states
+
+
+def constantFunction(value):
+    def function(state):
+        return value
+    return function
+
+
+def loadCumulant(state):
+    return state.load
+
+
+def makeDemons(count, vectorLength, offPolicy = None, gammas = 10):
+    """count demons predicting load at gammas spread over [0, 1). offPolicy None alternates on and off policy.
+    Demons with the same gamma and policy share a trace in a Horde"""
+    demons = []
+    for i in range(count):
+        isOffPolicy = (i % 2 == 1) if offPolicy is None else offPolicy
+        demon = GVF(vectorLength, 0.1 / 8, isOffPolicy = isOffPolicy, name = "Demon" + str(i))
+        demon.gamma = constantFunction((i % gammas) / float(gammas))
+        demon.cumulant = loadCumulant
+        if isOffPolicy:
+            demon.policy = constantFunction(2)
+        demons.append(demon)
+    return demons
@@ -1,7 +1,8 @@
 import numpy
 import random
 random.seed(0)
-from tiles import *
+from fasttiles import *
+from SparseVector import *
 
 def tileCode(numTilings, vectorLength, value):
     indexes = tiles(numTilings, vectorLength, value)
@@ -17,9 +18,23 @@ class TileCoder(object):
     numberOfTilings = 8
     numberOfActions = 2
 
+    #'hash' hashes every tile into the vector (tiles.py behaviour). 'grid' indexes each tiling's grid cell directly,
+    #which is collision free for our low dimensional inputs. Both produce vectors of the same length
+    indexingMode = 'hash'
+
+    @staticmethod
+    def tilesPerDimension(numTilings, vectorLength, dimensions):
+        numTiles = int(round(numpy.power(vectorLength / float(numTilings), 1.0 / dimensions)))
+        if numTilings * numpy.power(numTiles, dimensions) != vectorLength:
+            raise ValueError("Grid indexing needs vectorLength = numTilings * numTiles^" + str(dimensions) + ", got " + str(vectorLength))
+        return numTiles
+
     @staticmethod
     def getIndexes(numTilings, vectorLength, value):
-        indexes = tiles(numTilings, vectorLength, value)
+        if TileCoder.indexingMode == 'grid':
+            indexes = gridtiles(numTilings, TileCoder.tilesPerDimension(numTilings, vectorLength, len(value)), value)
+        else:
+            indexes = tiles(numTilings, vectorLength, value)
         return indexes, vectorLength
 
     @staticmethod
@@ -35,6 +50,32 @@ class TileCoder(object):
         indexes, l = TileCoder.getIndexes(numTilings, vectorLength, value)
         featureVector = TileCoder.getVectorFromIndexes(indexes, vectorLength)
         return featureVector
+
+    @staticmethod
+    def getIndexesBatch(numTilings, vectorLength, values):
+        #values is an (N, d) array of observations. Returns an (N, numTilings) index matrix
+        values = numpy.asarray(values, dtype=float)
+        if TileCoder.indexingMode == 'grid':
+            indexes = batchgridtiles(numTilings, TileCoder.tilesPerDimension(numTilings, vectorLength, values.shape[1]), values)
+        else:
+            indexes = batchtiles(numTilings, vectorLength, values)
+        return indexes, vectorLength
+
+    @staticmethod
+    def getFeatureMatrixFromValues(values, numTilings = numberOfTilings, numTiles = numberOfTiles):
+        #Dense (N, vectorLength) feature matrix with one row per observation, matching getFeatureVectorFromValues
+        values = numpy.asarray(values, dtype=float)
+        vectorLength = numTilings * numpy.power(numTiles, values.shape[1])
+        indexes, l = TileCoder.getIndexesBatch(numTilings, vectorLength, values)
+        featureMatrix = numpy.zeros((len(indexes), vectorLength))
+        featureMatrix[numpy.arange(len(indexes))[:, None], indexes] = 1
+        return featureMatrix
+
+    @staticmethod
+    def getSparseFeatureVectorFromValues(value, numTilings = numberOfTilings, numTiles = numberOfTiles):
+        vectorLength = numTilings * numpy.power(numTiles, len(value))
+        indexes, l = TileCoder.getIndexes(numTilings, vectorLength, value)
+        return SparseVector.fromIndexes(indexes, vectorLength)
     """
     @staticmethod
     def getFeatureActionVectorFromValuesAndAction(value, action, numTilings = numberOfTilings, numTiles = numberOfTiles, numActions = numberOfActions):
@@ -0,0 +1,93 @@
+"""
+Description:
+A bounded, least recently used cache in front of TileCoder. Tile coding only depends on each input quantized to
+floor(value * numTilings), and our inputs (integer encoder positions and servo speeds) only take a small set of values
+that repeat constantly while the servo oscillates, so once warm, feature construction is a dictionary lookup.
+
+The cache is keyed on the quantized inputs and the tiling parameters (including TileCoder.indexingMode). hits, misses
+and evictions count how well it is doing and precompute() can fill it with a whole grid of inputs up front (for example
+every encoder x speed pair).
+"""
+
+import numpy
+import threading
+from collections import OrderedDict
+
+from TileCoder import *
+
+
+class TileCodingCache:
+    def __init__(self, capacity = 8192):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, value, numTilings, vectorLength):
+        quantized = tuple(int(q) for q in numpy.floor(numpy.asarray(value, dtype=float) * numTilings))
+        return (quantized, numTilings, vectorLength, TileCoder.indexingMode)
+
+    def _lookup(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            #Re-insert to mark it most recently used
+            self.entries[key] = entry
+            self.hits += 1
+            return entry
+
+    def _store(self, key, indexes, vectorLength):
+        featureVector = TileCoder.getVectorFromIndexes(indexes, vectorLength)
+        entry = (tuple(int(i) for i in indexes), featureVector)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def _entry(self, numTilings, vectorLength, value):
+        key = self.key(value, numTilings, vectorLength)
+        entry = self._lookup(key)
+        if entry is None:
+            indexes, l = TileCoder.getIndexes(numTilings, vectorLength, value)
+            entry = self._store(key, indexes, vectorLength)
+        return entry
+
+    def getIndexes(self, numTilings, vectorLength, value):
+        indexes, featureVector = self._entry(numTilings, vectorLength, value)
+        return list(indexes), vectorLength
+
+    def getFeatureVectorFromValues(self, value, numTilings = TileCoder.numberOfTilings, numTiles = TileCoder.numberOfTiles):
+        vectorLength = numTilings * numpy.power(numTiles, len(value))
+        indexes, featureVector = self._entry(numTilings, vectorLength, value)
+        #Callers own the returned vector, so hand out a copy of the cached one
+        return featureVector.copy()
+
+    def precompute(self, values, numTilings = TileCoder.numberOfTilings, numTiles = TileCoder.numberOfTiles):
+        #values is an (N, d) array of inputs. Each distinct quantized input is tile coded once, in a single batch
+        values = numpy.asarray(values, dtype=float)
+        quantized = numpy.floor(values * numTilings)
+        unique, first = numpy.unique(quantized, axis=0, return_index=True)
+        vectorLength = numTilings * numpy.power(numTiles, values.shape[1])
+        indexes, l = TileCoder.getIndexesBatch(numTilings, vectorLength, values[first])
+        for q, rowIndexes in zip(unique, indexes):
+            key = (tuple(int(v) for v in q), numTilings, vectorLength, TileCoder.indexingMode)
+            self._store(key, rowIndexes, vectorLength)
+        return len(unique)
+
+    def stats(self):
+        return self.hits, self.misses, self.evictions, len(self.entries)
+
+    def __str__(self):
+        return "Tile coding cache: " + \
+               " Size : " + str(len(self.entries)) + \
+               " Capacity : " + str(self.capacity) + \
+               " Hits : " + str(self.hits) + \
+               " Misses : " + str(self.misses) + \
+               " Evictions : " + str(self.evictions)
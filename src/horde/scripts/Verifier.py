@@ -1,18 +1,25 @@
+import numpy
 import rospy
 
 from std_msgs.msg import Float64
 from std_msgs.msg import Int16
 from std_msgs.msg import String
 from horde.msg import StateRepresentation
+from PublisherRegistry import *
+from ReturnWindow import *
 
 class Verifier:
+    """
+    Compares a demon's predictions with the discounted return that actually followed, bufferLength steps later.
+    The last bufferLength steps are kept in ring buffers and the return is maintained incrementally (see ReturnWindow),
+    so a step costs the same however long the buffer is.
+    """
     def __init__(self, bufferLength, name):
         self.bufferLength = bufferLength
         self.name = name
-        self.gammas = []
-        self.cumulants = []
-        self.predictions = []
-        self.observations = []
+        self.returns = ReturnWindow(bufferLength)
+        self.predictions = numpy.zeros(bufferLength)
+        self.observations = numpy.zeros(bufferLength)
 
     def append(self, gamma, cumulant, prediction, newState):
         encoder_position = newState.encoder
@@ -21,47 +28,26 @@ class Verifier:
 
 
         print("Verify append with observation: " + str(encoder_position) + ", speed: " + str(speed) + ", load: " + str(load) + ", gamma: " + str(gamma) + ", cumulant: " + str(cumulant) + ", prediction: " + str(prediction))
-        if (len(self.gammas) == self.bufferLength):
-            #Remove the first item from the arrays
-            self.gammas.pop(0)
-            self.cumulants.pop(0)
-            self.predictions.pop(0)
-            self.observations.pop(0)
+        #Drops the oldest step once the buffer is full
+        p = self.returns.append(gamma, cumulant)
+        self.predictions[p] = prediction
+        self.observations[p] = encoder_position
 
-        self.gammas.append(gamma)
-        self.cumulants.append(cumulant)
-        self.predictions.append(prediction)
-        self.observations.append(encoder_position)
-        #First gamma has to be 1 since the return of first is always just the unweighted cumulant
-
-        runningGamma = 1
-        runningCumulant = 0
-        self.gammas[0] = 1
-        for i in range(0, len(self.gammas)):
-            runningGamma = runningGamma * self.gammas[i]
-            runningCumulant = runningCumulant + self.cumulants[i] * runningGamma
-
-
-            #TODO jump out of for loop if runningGamma = 0 since no point
-
-
-        predict = self.predictions[0]
-        #print("Observation " + str(self.observations[0]) +  ":")
-        #print("--- Prediction: " + str(self.predictions[0]))
-
-        #print("--- Actual: " + str(runningCumulant))
+        #Return of the oldest step in the buffer. Its own gamma is not used since its cumulant is undiscounted
+        oldest = self.returns.start
+        runningCumulant = self.returns.oldestReturn()
+        predict = self.predictions[oldest]
 
         #Publish the values
 
-        pubPrediction = rospy.Publisher('horde_verifier/' + self.name + '/predicted', Float64, queue_size=10)
-        pubPrediction.publish(self.predictions[0])
+        pubPrediction = publishers.get('horde_verifier/' + self.name + '/predicted', Float64, queue_size=10)
+        pubPrediction.publish(predict)
 
-        pubActual = rospy.Publisher('horde_verifier/' + self.name + '/actual', Float64, queue_size=10)
+        pubActual = publishers.get('horde_verifier/' + self.name + '/actual', Float64, queue_size=10)
         pubActual.publish(runningCumulant)
 
-        pubError = rospy.Publisher('horde_verifier/' + self.name + '/error', Float64, queue_size=10)
-        pubError.publish(self.predictions[0] - runningCumulant)
-
-        pubObs = rospy.Publisher('horde_verifier/' + self.name + '/encoder_position', Int16, queue_size=10)
-        pubObs.publish(self.observations[0] / 100)
+        pubError = publishers.get('horde_verifier/' + self.name + '/error', Float64, queue_size=10)
+        pubError.publish(predict - runningCumulant)
 
+        pubObs = publishers.get('horde_verifier/' + self.name + '/encoder_position', Int16, queue_size=10)
+        pubObs.publish(int(self.observations[oldest] / 100))
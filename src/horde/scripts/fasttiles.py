@@ -0,0 +1,223 @@
+"""
+Vectorized tile coding
+
+numpy implementation of the tiles.py routines. Every tiling (and, for the batch routines, every observation) is
+computed at once as an array instead of one at a time in python loops. The routines keep no module state, so unlike
+tiles.py they are reentrant and can be called from several threads at once (for example a threading.Timer callback)
+as long as memctable is an integer memory size. The single observation routines (tiles, loadtiles, tileswrap and
+loadtileswrap) with an integer memory size run a plain python loop instead, as numpy's per call overhead is more than
+the work for one observation. A collision table is itself mutable state and must not be shared
+between threads. memctable may be a tiles.CollisionTable or an ArrayCollisionTable, which hashes whole batches at once.
+
+The indexes are identical to tiles.py for the same inputs: this module owns _randomTable (tiles.py imports it from
+here) and quantizes, displaces and hashes the coordinates exactly as startTiles, fixcoord, fixcoordwrap and hashUNH do.
+It runs on python 2 and 3.
+
+Useful routines:
+       tiles(numtilings, memctable, floats, ints)
+       loadtiles(tiles, startelement, numtilings, memctable, floats, ints)
+       tileswrap(numtilings, memctable, floats, wrapwidths, ints)
+       loadtileswrap(tiles, startelement, numtilings, memctable, floats, wrapwidths, ints)
+           drop in replacements for the tiles.py routines of the same name
+       batchtiles(numtilings, memctable, floats, ints)
+       batchtileswrap(numtilings, memctable, floats, wrapwidths, ints)
+           floats is an (N, numfloats) array of observations (a single observation may be given as a flat list)
+           ints is an optional list of integers shared by every observation, or an (N, numints) array
+           return an (N, numtilings) array of tile indexes
+       tilecoordinates(numtilings, floats, ints, wrapwidths)
+           the (N, numtilings, numcoord) coordinates that get hashed for each observation and tiling
+       gridtiles(numtilings, numtiles, floats)
+       batchgridtiles(numtilings, numtiles, floats)
+           hash free alternative for low dimensional inputs. Each tiling is a numtiles^numfloats grid over
+           [0, numtiles) in every float, displaced as in tiles(), and its cell is mapped to an index arithmetically.
+           Indexes lie in [0, numtilings * numtiles^numfloats) and distinct cells never collide. Cells cut short by
+           a tiling's displacement at the edges of the range are merged into their neighbour, and inputs outside the
+           range fall into the edge cells
+"""
+
+import math
+import random
+import numpy
+
+_maxLongint = 2147483647                # maximum integer
+_maxLongintBy4 = _maxLongint // 4       # maximum integer divided by 4
+_randomTable = [random.randrange(_maxLongintBy4) for i in range(2048)]   #table of random numbers
+_randomTableArray = numpy.array(_randomTable, dtype=numpy.int64)
+
+
+def _asobservations(floats):
+    floats = numpy.asarray(floats, dtype=float)
+    if floats.ndim == 1:
+        floats = floats[None, :]
+    return floats
+
+
+_tilingConstants = {}
+
+def _tilingconstants(numtilings, numfloats):
+    "Per tiling displacements and the hash of the tiling index coordinate. Read only once built"
+    key = (numtilings, numfloats)
+    constants = _tilingConstants.get(key)
+    if constants is None:
+        tilings = numpy.arange(numtilings, dtype=numpy.int64)
+        #fixcoord moves the base of float i by 1 + 2i after every tiling
+        base = tilings[:, None] * (1 + 2 * numpy.arange(numfloats, dtype=numpy.int64))[None, :]
+        floatOffsets = numpy.arange(numfloats, dtype=numpy.int64) * 449
+        tilingHash = _randomTableArray[numpy.mod(tilings + numfloats * 449, 2048)]
+        constants = (tilings, base, floatOffsets, tilingHash)
+        _tilingConstants[key] = constants
+    return constants
+
+
+def _floatcoordinates(numtilings, floats, wrapwidths=None):
+    "(N, numtilings, numfloats) coordinates of the float variables, as computed by startTiles and fixcoord(wrap)"
+    numfloats = floats.shape[1]
+    tilings, base, floatOffsets, tilingHash = _tilingconstants(numtilings, numfloats)
+    qstate = numpy.floor(floats * numtilings).astype(numpy.int64)[:, None, :]
+    floatcoords = qstate - numpy.mod(qstate - base, numtilings)
+    if wrapwidths is not None:
+        widthxnumtilings = numpy.asarray(wrapwidths, dtype=numpy.int64) * numtilings
+        wraps = widthxnumtilings != 0
+        floatcoords[:, :, wraps] = numpy.mod(floatcoords[:, :, wraps], widthxnumtilings[wraps])
+    return floatcoords
+
+
+def tilecoordinates(numtilings, floats, ints=[], wrapwidths=None):
+    "Coordinates of the active tile in every tiling for each observation, as computed by startTiles and fixcoord(wrap)"
+    floats = _asobservations(floats)
+    numobs, numfloats = floats.shape
+    floatcoords = _floatcoordinates(numtilings, floats, wrapwidths)
+
+    ints = numpy.asarray(ints, dtype=numpy.int64)
+    if ints.ndim == 1:
+        ints = numpy.tile(ints, (numobs, 1))
+    numints = ints.shape[1]
+
+    coordinates = numpy.empty((numobs, numtilings, numfloats + 1 + numints), dtype=numpy.int64)
+    coordinates[:, :, :numfloats] = floatcoords
+    coordinates[:, :, numfloats] = numpy.arange(numtilings)[None, :]
+    coordinates[:, :, numfloats + 1:] = ints[:, None, :]
+    return coordinates
+
+
+def batchhashUNH(coordinates, m, increment=449):
+    "hashUNH of every coordinate list along the last axis"
+    offsets = numpy.arange(coordinates.shape[-1], dtype=numpy.int64) * increment
+    res = numpy.sum(_randomTableArray[numpy.mod(coordinates + offsets, 2048)], axis=-1)
+    return numpy.mod(res, m)
+
+
+def _hashtiles(numtilings, m, floats, ints, wrapwidths):
+    "batchhashUNH(tilecoordinates(...), m) without building the coordinate array. hashUNH is a sum over coordinates"
+    numfloats = floats.shape[1]
+    tilings, base, floatOffsets, tilingHash = _tilingconstants(numtilings, numfloats)
+    floatcoords = _floatcoordinates(numtilings, floats, wrapwidths)
+    res = numpy.sum(_randomTableArray[numpy.mod(floatcoords + floatOffsets, 2048)], axis=-1) + tilingHash
+    if len(ints) > 0:
+        ints = numpy.asarray(ints, dtype=numpy.int64)
+        intOffsets = (numfloats + 1 + numpy.arange(ints.shape[-1], dtype=numpy.int64)) * 449
+        intHash = numpy.sum(_randomTableArray[numpy.mod(ints + intOffsets, 2048)], axis=-1)
+        res += numpy.reshape(intHash, (-1, 1))
+    return numpy.mod(res, m)
+
+
+def _tiles(numtilings, memctable, floats, ints, wrapwidths):
+    floats = _asobservations(floats)
+    if isinstance(memctable, (int, numpy.integer)):
+        return _hashtiles(numtilings, memctable, floats, ints, wrapwidths)
+
+    coordinates = tilecoordinates(numtilings, floats, ints, wrapwidths)
+    if hasattr(memctable, 'hashcoordinates'):
+        return memctable.hashcoordinates(coordinates)
+
+    #A tiles.CollisionTable. Hash one coordinate list at a time so collisions are handled exactly as tiles.py does
+    import tiles as _tiles
+    numobs, numtilings, numcoord = coordinates.shape
+    indexes = numpy.empty((numobs, numtilings), dtype=numpy.int64)
+    for n in range(numobs):
+        for j in range(numtilings):
+            indexes[n, j] = _tiles.hash([int(c) for c in coordinates[n, j]], numcoord, memctable)
+    return indexes
+
+
+def _singletiles(numtilings, memctable, floats, ints, wrapwidths):
+    "Tiles for one observation as a list. tiles.py's loop, with its module state kept in locals"
+    if not isinstance(memctable, (int, numpy.integer)):
+        return _tiles(numtilings, memctable, [floats], ints, wrapwidths)[0].tolist()
+    numfloats = len(floats)
+    qstate = [int(math.floor(value * numtilings)) for value in floats]
+    if wrapwidths is not None:
+        widthxnumtilings = [width * numtilings for width in wrapwidths]
+    intHash = 0
+    for k in range(len(ints)):
+        intHash += _randomTable[(ints[k] + (numfloats + 1 + k) * 449) % 2048]
+    tlist = [0] * numtilings
+    for j in range(numtilings):
+        res = intHash + _randomTable[(j + numfloats * 449) % 2048]
+        for i in range(numfloats):
+            #fixcoord: the base of float i has moved by 1 + 2i for every tiling before this one
+            coordinate = qstate[i] - ((qstate[i] - j * (1 + 2 * i)) % numtilings)
+            if wrapwidths is not None and wrapwidths[i] != 0:
+                coordinate = coordinate % widthxnumtilings[i]
+            res += _randomTable[(coordinate + i * 449) % 2048]
+        tlist[j] = res % memctable
+    return tlist
+
+
+def batchtiles(numtilings, memctable, floats, ints=[]):
+    """Returns an (N, numtilings) array of tiles for N observations (rows of floats),
+        hashed down to mem, using ctable to check for collisions"""
+    return _tiles(numtilings, memctable, floats, ints, None)
+
+
+def batchtileswrap(numtilings, memctable, floats, wrapwidths, ints=[]):
+    """Returns an (N, numtilings) array of tiles for N observations (rows of floats),
+        hashed down to mem, using ctable to check for collisions - wrap version"""
+    return _tiles(numtilings, memctable, floats, ints, wrapwidths)
+
+
+def tiles(numtilings, memctable, floats, ints=[]):
+    """Returns list of numtilings tiles corresponding to variables (floats and ints),
+        hashed down to mem, using ctable to check for collisions"""
+    return _singletiles(numtilings, memctable, floats, ints, None)
+
+
+def loadtiles(tiles, startelement, numtilings, memctable, floats, ints=[]):
+    """Loads numtilings tiles into array tiles, starting at startelement, corresponding
+       to variables (floats and ints), hashed down to mem, using ctable to check for collisions"""
+    tiles[startelement:startelement + numtilings] = _singletiles(numtilings, memctable, floats, ints, None)
+
+
+def tileswrap(numtilings, memctable, floats, wrapwidths, ints=[]):
+    """Returns list of numtilings tiles corresponding to variables (floats and ints),
+        hashed down to mem, using ctable to check for collisions - wrap version"""
+    return _singletiles(numtilings, memctable, floats, ints, wrapwidths)
+
+
+def loadtileswrap(tiles, startelement, numtilings, memctable, floats, wrapwidths, ints=[]):
+    """Loads numtilings tiles into array tiles, starting at startelement, corresponding
+       to variables (floats and ints), hashed down to mem, using ctable to check for collisions - wrap version"""
+    tiles[startelement:startelement + numtilings] = _singletiles(numtilings, memctable, floats, ints, wrapwidths)
+
+
+def batchgridtiles(numtilings, numtiles, floats):
+    """Returns an (N, numtilings) array of grid cell indexes for N observations (rows of floats).
+        Tiling j occupies indexes [j * numtiles^numfloats, (j + 1) * numtiles^numfloats)"""
+    floats = _asobservations(floats)
+    numfloats = floats.shape[1]
+    tilings, base, floatOffsets, tilingHash = _tilingconstants(numtilings, numfloats)
+    qstate = numpy.floor(floats * numtilings).astype(numpy.int64)[:, None, :]
+    #Same displacement as fixcoord, within one tile width
+    cells = numpy.floor_divide(qstate - numpy.mod(base, numtilings), numtilings)
+    cells = numpy.clip(cells, 0, numtiles - 1)
+    strides = numpy.power(numtiles, numpy.arange(numfloats, dtype=numpy.int64))
+    return tilings * numpy.power(numtiles, numfloats) + numpy.sum(cells * strides, axis=-1)
+
+
+def gridtiles(numtilings, numtiles, floats):
+    """Returns list of numtilings grid cell indexes corresponding to floats"""
+    return batchgridtiles(numtilings, numtiles, [floats])[0].tolist()
+
+
+getTiles = tiles
+loadTiles = loadtiles
@@ -0,0 +1,88 @@
+"""
+ArrayCollisionTable hands out the same indexes, and keeps the same counters, as a tiles.CollisionTable given the same
+coordinates in the same order. tiles.py is python 2 only, so those comparisons are skipped where it cannot be imported.
+
+python -m unittest test_ArrayCollisionTable
+"""
+
+import pickle
+import random
+import unittest
+import numpy
+
+import fasttiles
+from ArrayCollisionTable import *
+
+try:
+    import tiles
+except SyntaxError:
+    tiles = None
+
+
+def randomFloats(count, seed = 4):
+    rng = random.Random(seed)
+    return [[rng.uniform(-20.0, 20.0), rng.uniform(-20.0, 20.0)] for n in range(count)]
+
+
+class ArrayCollisionTableTest(unittest.TestCase):
+    @unittest.skipIf(tiles is None, "tiles.py does not import on this python")
+    def testMatchesCollisionTable(self):
+        #Small tables fill most of their slots, so probing and collisions are exercised
+        for size, safety, count in [(64, 'safe', 14), (64, 'unsafe', 40), (1024, 'safe', 200)]:
+            expected = tiles.CollisionTable(size, safety)
+            table = ArrayCollisionTable(size, safety)
+            for floats in randomFloats(count):
+                self.assertEqual(fasttiles.tiles(4, table, floats), tiles.tiles(4, expected, floats))
+            self.assertEqual(table.data.tolist(), expected.data)
+            self.assertEqual((table.calls, table.clearhits, table.collisions), (expected.calls, expected.clearhits, expected.collisions))
+            self.assertEqual(table.usage(), expected.usage())
+
+    @unittest.skipIf(tiles is None, "tiles.py does not import on this python")
+    def testBatchMatchesOneAtATime(self):
+        floats = randomFloats(14)
+        expected = tiles.CollisionTable(64, 'safe')
+        table = ArrayCollisionTable(64, 'safe')
+        indexes = fasttiles.batchtiles(4, table, floats)
+        self.assertEqual(indexes.tolist(), [tiles.tiles(4, expected, observation) for observation in floats])
+        self.assertEqual(table.data.tolist(), expected.data)
+
+    @unittest.skipIf(tiles is None, "tiles.py does not import on this python")
+    def testCollidingBatch(self):
+        #Probes that claim the home slots of coordinate lists later in the same batch
+        expected = tiles.CollisionTable(1024, 'safe')
+        table = ArrayCollisionTable(1024, 'safe')
+        floats = randomFloats(100)
+        indexes = fasttiles.batchtiles(8, table, floats)
+        self.assertEqual(indexes.tolist(), [tiles.tiles(8, expected, observation) for observation in floats])
+        self.assertEqual(table.data.tolist(), expected.data)
+        self.assertEqual(table.stats(), expected.stats()[:3] + (expected.usage(),))
+        self.assertTrue(table.collisions > 0)
+
+    def testOutOfMemory(self):
+        #A full table is reported once for the batch
+        table = ArrayCollisionTable(16, 'safe')
+        indexes = fasttiles.batchtiles(4, table, randomFloats(30))
+        self.assertEqual(table.usage(), 16)
+        self.assertTrue(table.outOfMemory > 0)
+        self.assertEqual(int(numpy.count_nonzero(indexes < 0)), table.outOfMemory)
+
+    def testUsageCounter(self):
+        table = ArrayCollisionTable(256, 'safe')
+        fasttiles.batchtiles(8, table, randomFloats(20))
+        self.assertEqual(table.usage(), int(numpy.count_nonzero(table.data >= 0)))
+        self.assertEqual(table.recount(), table.usage())
+
+    def testPickle(self):
+        table = ArrayCollisionTable(512, 'safe')
+        fasttiles.batchtiles(4, table, randomFloats(20))
+        copy = pickle.loads(pickle.dumps(table))
+        floats = randomFloats(20, seed = 5)
+        self.assertEqual(fasttiles.batchtiles(4, copy, floats).tolist(), fasttiles.batchtiles(4, table, floats).tolist())
+
+    def testSizes(self):
+        self.assertRaises(ValueError, ArrayCollisionTable, 100)
+        self.assertRaises(ValueError, ArrayCollisionTable, 64, 'super safe')
+
+
+if __name__ == '__main__':
+    unittest.main()
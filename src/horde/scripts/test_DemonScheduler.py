@@ -0,0 +1,101 @@
+"""
+DemonScheduler updates the most urgent demons within its budget, reaches stale ones in time, freezes only demons it has
+updated, and without a budget learns exactly what Horde.learn does.
+
+A budget of 0 updates exactly one chunk per step, which keeps these tests independent of timing.
+
+python -m unittest test_DemonScheduler
+"""
+
+import unittest
+import numpy
+
+from test_Horde import seededStates
+
+from DemonScheduler import *
+from SyntheticHorde import *
+from Horde import *
+from TileCoder import *
+
+
+vectorLength = TileCoder.numberOfTilings * TileCoder.numberOfTiles * TileCoder.numberOfTiles
+
+
+class DemonSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.states = seededStates(80)
+
+    def trainedHorde(self, steps = 20):
+        #A horde whose demons have some RUPEE / UDE to be ordered by
+        horde = Horde(makeDemons(6, vectorLength))
+        for t in range(steps):
+            horde.learn(self.states[t], 1 + t % 2, self.states[t + 1])
+        return horde
+
+    def schedule(self, scheduler, first, steps):
+        for t in range(first, first + steps):
+            scheduler.learn(self.states[t], 1 + t % 2, self.states[t + 1])
+
+    def testHighestPriorityFirst(self):
+        horde = self.trainedHorde()
+        scheduler = DemonScheduler(horde, budget = 0.0, chunkSize = 2)
+        scores = horde.rupees() + horde.udes()
+        counts = horde.updateCounts.copy()
+        self.schedule(scheduler, 20, 1)
+        expected = numpy.argsort(-scores, kind='mergesort')[:2]
+        self.assertEqual(sorted(numpy.flatnonzero(scheduler.lastUpdated == 1)), sorted(expected))
+        self.assertEqual(sorted(numpy.flatnonzero(horde.updateCounts > counts)), sorted(expected))
+
+    def testExplicitPriority(self):
+        horde = self.trainedHorde()
+        scheduler = DemonScheduler(horde, budget = 0.0, chunkSize = 2)
+        scheduler.setPriority(horde.demons[4], 1e6)
+        scheduler.setPriority(horde.demons[5], 1e6)
+        self.schedule(scheduler, 20, 1)
+        self.assertEqual(numpy.flatnonzero(scheduler.lastUpdated == 1).tolist(), [4, 5])
+
+    def testStaleDemonsReached(self):
+        #One demon a step, with demon 0 far ahead on priority. The others' staleness catches up with it
+        horde = self.trainedHorde()
+        scheduler = DemonScheduler(horde, budget = 0.0, chunkSize = 1)
+        scheduler.stalenessWeight = 1.0
+        scheduler.setPriority(horde.demons[0], 10.0 / max(horde.rupee(0) + horde.ude(0), 1e-12))
+        self.schedule(scheduler, 20, 20)
+        self.assertTrue(numpy.all(scheduler.lastUpdated > 0))
+        self.assertTrue(horde.updateCounts[0] > numpy.max(horde.updateCounts[1:]))
+
+    def testOnlyUpdatedDemonsFreeze(self):
+        horde = self.trainedHorde()
+        scheduler = DemonScheduler(horde, budget = 0.0, chunkSize = 2, priorityInterval = 1)
+        scheduler.stalenessWeight = 0.0
+        scheduler.plateauTolerance = 1e9 #Every checked demon is on a plateau
+        scheduler.plateauChecks = 2
+        scheduler.minUpdates = 0
+        scheduler.setPriority(horde.demons[0], 1e6)
+        scheduler.setPriority(horde.demons[1], 1e6)
+        self.schedule(scheduler, 20, 4)
+        #Demons 2 to 5 were never updated, so they were never checked, though their RUPEE did not move
+        self.assertEqual(scheduler.frozen.tolist(), [True, True, False, False, False, False])
+        self.assertEqual(scheduler.flatChecks[2:].tolist(), [0, 0, 0, 0])
+
+        #Frozen demons are still updated every frozenInterval steps, and thaw once their RUPEE moves
+        scheduler.plateauTolerance = -1.0
+        scheduler.frozenInterval = 2
+        self.schedule(scheduler, 24, 4)
+        self.assertFalse(scheduler.frozen[0] or scheduler.frozen[1])
+
+    def testNoBudget(self):
+        horde = Horde(makeDemons(6, vectorLength))
+        scheduled = Horde(makeDemons(6, vectorLength))
+        scheduler = DemonScheduler(scheduled)
+        for t in range(40):
+            horde.learn(self.states[t], 1 + t % 2, self.states[t + 1])
+            scheduler.learn(self.states[t], 1 + t % 2, self.states[t + 1])
+        for name in ['weights', 'hWeights', 'hHatWeights', 'movingtdEligErrorAverage', 'updateCounts']:
+            numpy.testing.assert_array_equal(getattr(scheduled, name), getattr(horde, name))
+        numpy.testing.assert_array_equal(scheduled.rupees(), horde.rupees())
+        self.assertEqual(scheduler.lastUpdated.tolist(), [40] * 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+Horde learns exactly what its demons would learn one GVF at a time with tdLearn / gtdLearn, and its cached predictions
+are the ones for its current weights.
+
+python -m unittest test_Horde
+"""
+
+import sys
+import random
+import unittest
+import numpy
+
+from RosStandIn import *
+install()
+
+from GVF import *
+from Horde import *
+from SparseVector import *
+from SyntheticHorde import *
+from StageProfiler import *
+
+
+class NullWriter:
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+def seededStates(count, sparse = True):
+    #The same states on every run
+    return makeStates(TileCoder.numberOfTilings, TileCoder.numberOfTiles, count, sparse, random.Random(3))
+
+
+class HordeTest(unittest.TestCase):
+    def learnBoth(self, sparse, steps = 60, profileGroups = False):
+        vectorLength = TileCoder.numberOfTilings * TileCoder.numberOfTiles * TileCoder.numberOfTiles
+        gvfs = makeDemons(6, vectorLength, gammas = 4)
+        horde = Horde(makeDemons(6, vectorLength, gammas = 4))
+        if profileGroups:
+            horde.profiler = StageProfiler()
+            horde.profileGroups = True
+        states = seededStates(steps, sparse)
+        actions = [random.Random(5).choice([1, 2]) for i in range(steps)]
+        stdout = sys.stdout
+        sys.stdout = NullWriter()
+        try:
+            for t in range(steps - 1):
+                for gvf in gvfs:
+                    gvf.learn(states[t], actions[t], states[t + 1])
+                horde.learn(states[t], actions[t], states[t + 1])
+        finally:
+            sys.stdout = stdout
+        return dict((gvf.name, gvf) for gvf in gvfs), horde
+
+    def assertSameLearning(self, gvfs, horde):
+        for i, demon in enumerate(horde.demons):
+            gvf = gvfs[demon.name]
+            numpy.testing.assert_allclose(horde.weights[i], gvf.weights, rtol = 1e-12, atol = 1e-15)
+            numpy.testing.assert_allclose(horde.hWeights[i], gvf.hWeights, rtol = 1e-12, atol = 1e-15)
+            numpy.testing.assert_allclose(horde.rupee(i), gvf.rupee(), rtol = 1e-10, atol = 1e-15)
+            numpy.testing.assert_allclose(horde.ude(i), gvf.ude(), rtol = 1e-10, atol = 1e-15)
+
+    def testDenseFeatures(self):
+        gvfs, horde = self.learnBoth(sparse = False)
+        self.assertSameLearning(gvfs, horde)
+
+    def testSparseFeatures(self):
+        gvfs, horde = self.learnBoth(sparse = True)
+        self.assertSameLearning(gvfs, horde)
+
+    def testSharedTraces(self):
+        #Demons with the same gamma and policy share a trace row
+        gvfs, horde = self.learnBoth(sparse = True)
+        self.assertLess(len(horde.traceRepresentatives), horde.numberOfDemons)
+        self.assertSameLearning(gvfs, horde)
+
+    def testProfileGroups(self):
+        #Updated one trace group at a time, each timed as its own stage
+        gvfs, horde = self.learnBoth(sparse = True, profileGroups = True)
+        self.assertSameLearning(gvfs, horde)
+        summary = horde.profiler.summary()
+        groups = ['horde/group/' + demon.name for demon in horde.traceRepresentatives]
+        self.assertEqual(sorted(name for name in summary if name.startswith('horde/group/')), sorted(groups))
+        for name in groups + ['horde/updates']:
+            self.assertEqual(summary[name]['count'], 59)
+
+    def testSyncDemons(self):
+        gvfs, horde = self.learnBoth(sparse = True)
+        horde.syncDemons()
+        for demon in horde.demons:
+            numpy.testing.assert_allclose(demon.weights, gvfs[demon.name].weights, rtol = 1e-12, atol = 1e-15)
+
+
+class PredictionCacheTest(unittest.TestCase):
+    def setUp(self):
+        vectorLength = TileCoder.numberOfTilings * TileCoder.numberOfTiles * TileCoder.numberOfTiles
+        self.horde = Horde(makeDemons(4, vectorLength))
+        self.states = seededStates(10)
+        for t in range(5):
+            self.horde.learn(self.states[t], 1, self.states[t + 1])
+        #learn() predicts too
+        self.horde.predictionHits = 0
+        self.horde.predictionMisses = 0
+        self.horde.weightsChanged()
+
+    def assertFresh(self, values, state):
+        numpy.testing.assert_allclose(values, numpy.dot(self.horde.weights, state.X.toDense()), rtol = 1e-12, atol = 1e-15)
+
+    def testHitsWhileWeightsUnchanged(self):
+        state = self.states[6]
+        values = self.horde.predictions(state)
+        self.assertFresh(values, state)
+        self.assertTrue(self.horde.predictions(state) is values)
+        self.assertEqual(self.horde.prediction(2, state), values[2])
+        self.assertEqual((self.horde.predictionHits, self.horde.predictionMisses), (2, 1))
+
+    def testInvalidatedWhenWeightsChange(self):
+        state = self.states[6]
+        self.horde.predictions(state)
+        self.horde.learn(self.states[5], 1, state)
+        self.assertFresh(self.horde.predictions(state), state)
+        #Any other change to the weights has to say so
+        self.horde.weights *= 2.0
+        self.horde.weightsChanged()
+        misses = self.horde.predictionMisses
+        self.assertFresh(self.horde.predictions(state), state)
+        self.assertEqual(self.horde.predictionMisses, misses + 1)
+
+    def testKeyedOnTheState(self):
+        #A new state object is a new entry, even with the same features
+        state = self.states[6]
+        copy = seededStates(10)[6]
+        self.horde.predictions(state)
+        self.horde.predictions(copy)
+        self.assertEqual(self.horde.predictionMisses, 2)
+        for state in self.states:
+            self.horde.predictions(state)
+        self.assertTrue(len(self.horde.predictionCache) <= self.horde.predictionCacheSize)
+
+    def testWithoutCache(self):
+        state = self.states[6]
+        self.assertFresh(self.horde.predictions(state, cache = False), state)
+        self.assertEqual((self.horde.predictionHits, self.horde.predictionMisses, len(self.horde.predictionCache)), (0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+LearningWorker runs the queued steps in order, and a step that raises does not stop the ones after it.
+
+python -m unittest test_LearningWorker
+"""
+
+import unittest
+
+from RosStandIn import *
+install()
+
+from LearningWorker import *
+
+
+class LearningWorkerTest(unittest.TestCase):
+    def testStepsInOrder(self):
+        steps = []
+        worker = LearningWorker(steps.append)
+        worker.start()
+        for n in range(50):
+            worker.submit(n)
+        worker.stop()
+        self.assertEqual(steps, list(range(50)))
+        self.assertEqual((worker.submitted, worker.completed, worker.dropped, worker.failed), (50, 50, 0, 0))
+
+    def testFailedStep(self):
+        steps = []
+        def step(n):
+            if n == 3:
+                raise ValueError("step " + str(n))
+            steps.append(n)
+        worker = LearningWorker(step)
+        worker.start()
+        for n in range(6):
+            worker.submit(n)
+        self.assertTrue(worker.wait(5.0))
+        self.assertTrue(worker.thread.is_alive())
+        worker.submit(6)
+        worker.stop()
+        self.assertEqual(steps, [0, 1, 2, 4, 5, 6])
+        self.assertEqual((worker.completed, worker.failed), (7, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
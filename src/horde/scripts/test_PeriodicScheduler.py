@@ -0,0 +1,39 @@
+"""
+PeriodicScheduler keeps ticking on its grid of deadlines when its task raises.
+
+python -m unittest test_PeriodicScheduler
+"""
+
+import threading
+import unittest
+
+from RosStandIn import *
+install()
+
+from PeriodicScheduler import *
+
+
+class PeriodicSchedulerTest(unittest.TestCase):
+    def testFailingTask(self):
+        ticks = []
+        done = threading.Event()
+        def task():
+            ticks.append(clock())
+            if len(ticks) >= 6:
+                done.set()
+            if len(ticks) % 2 == 0:
+                raise IOError("publish failed")
+        scheduler = PeriodicScheduler(0.05, task, 'FailingTask')
+        scheduler.start()
+        self.assertTrue(done.wait(5.0))
+        scheduler.stop()
+        stats = scheduler.stats()
+        self.assertEqual(stats['ticks'], len(ticks))
+        self.assertEqual(stats['errors'], len(ticks) // 2)
+        self.assertFalse(scheduler.isRunning())
+        #Each tick or skipped tick takes one deadline of the grid start + k * period
+        self.assertEqual(int(round((ticks[-1] - ticks[0]) / 0.05)) + 1, stats['ticks'] + stats['skipped'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+ReturnWindow's running return matches the discounted return summed from scratch over the same window.
+
+python -m unittest test_ReturnWindow
+"""
+
+import random
+import unittest
+import numpy
+
+from ReturnWindow import *
+
+
+def bruteForceReturn(gammas, cumulants):
+    #c_a + g_a+1 * c_a+1 + g_a+1 * g_a+2 * c_a+2 + ...
+    total = cumulants[0]
+    discount = 1.0
+    for gamma, cumulant in zip(gammas[1:], cumulants[1:]):
+        discount = discount * gamma
+        total = total + discount * cumulant
+    return total
+
+
+class ReturnWindowTest(unittest.TestCase):
+    def assertWindowMatches(self, length, steps, gammaChoices, seed = 6):
+        rng = random.Random(seed)
+        window = ReturnWindow(length)
+        gammas = []
+        cumulants = []
+        for t in range(steps):
+            gamma = rng.choice(gammaChoices)
+            cumulant = rng.uniform(-1.0, 1.0)
+            window.append(gamma, cumulant)
+            gammas = (gammas + [gamma])[-length:]
+            cumulants = (cumulants + [cumulant])[-length:]
+            self.assertEqual(len(window), len(gammas))
+            self.assertAlmostEqual(window.oldestReturn(), bruteForceReturn(gammas, cumulants), places = 10)
+
+    def testReturns(self):
+        self.assertWindowMatches(10, 200, [0.9, 0.5, 0.99])
+
+    def testZeroGammas(self):
+        #Terminations cut the return short
+        self.assertWindowMatches(10, 200, [0.0, 0.9, 0.9, 1.0])
+
+    def testShortWindows(self):
+        self.assertWindowMatches(1, 20, [0.9])
+        self.assertWindowMatches(2, 50, [0.0, 0.8])
+
+    def testPopOldest(self):
+        window = ReturnWindow(5)
+        values = [(0.9, 1.0), (0.8, 2.0), (0.7, 3.0), (0.6, 4.0)]
+        for gamma, cumulant in values:
+            window.append(gamma, cumulant)
+        window.popOldest()
+        self.assertAlmostEqual(window.oldestReturn(), bruteForceReturn([g for g, c in values[1:]], [c for g, c in values[1:]]))
+        window.clear()
+        self.assertRaises(IndexError, window.oldestReturn)
+        self.assertRaises(IndexError, window.popOldest)
+
+    def testArrays(self):
+        #One return per demon, all updated together
+        rng = numpy.random.RandomState(7)
+        window = ReturnWindow(8, (3,))
+        gammas = []
+        cumulants = []
+        for t in range(40):
+            gamma = rng.choice([0.0, 0.5, 0.9], 3)
+            cumulant = rng.uniform(-1.0, 1.0, 3)
+            window.append(gamma, cumulant)
+            gammas = (gammas + [gamma])[-8:]
+            cumulants = (cumulants + [cumulant])[-8:]
+            numpy.testing.assert_allclose(window.oldestReturn(), bruteForceReturn(gammas, cumulants), rtol = 1e-10, atol = 1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+A horde sharded over worker processes learns what the same Horde learns in one process.
+
+python -m unittest test_ShardedHorde
+"""
+
+import os
+import signal
+import unittest
+import numpy
+
+from test_Horde import seededStates
+
+from ShardedHorde import *
+from SyntheticHorde import *
+from TileCoder import *
+
+
+class ShardedHordeTest(unittest.TestCase):
+    def learnBoth(self, traceEpsilon, processes, steps = 40):
+        vectorLength = TileCoder.numberOfTilings * TileCoder.numberOfTiles * TileCoder.numberOfTiles
+        horde = Horde(makeDemons(7, vectorLength), traceEpsilon)
+        sharded = ShardedHorde(makeDemons(7, vectorLength), traceEpsilon, processes)
+        self.addCleanup(sharded.stop)
+        states = seededStates(steps)
+        for t in range(steps - 1):
+            horde.learn(states[t], 1 + t % 2, states[t + 1])
+            sharded.learn(states[t], 1 + t % 2, states[t + 1])
+        return horde, sharded, states
+
+    def assertSameLearning(self, horde, sharded, state):
+        self.assertEqual([demon.name for demon in sharded.demons], [demon.name for demon in horde.demons])
+        for name in ['weights', 'hWeights', 'hHatWeights', 'movingtdEligErrorAverage', 'averageTD', 'tdVariance']:
+            numpy.testing.assert_allclose(getattr(sharded, name), getattr(horde, name), rtol = 1e-10, atol = 1e-14)
+        numpy.testing.assert_allclose(sharded.predictions(state), horde.predictions(state), rtol = 1e-10, atol = 1e-14)
+        numpy.testing.assert_allclose(sharded.lastCumulants, horde.lastCumulants)
+
+    def testExactTraces(self):
+        horde, sharded, states = self.learnBoth(None, 2)
+        self.assertSameLearning(horde, sharded, states[-1])
+        numpy.testing.assert_allclose(sharded.demonTraces()[0], horde.demonTraces()[0], rtol = 1e-10, atol = 1e-14)
+
+    def testTraceCutoff(self):
+        #The shards agree on the trace columns the whole horde keeps
+        horde, sharded, states = self.learnBoth(0.0001, 3)
+        self.assertSameLearning(horde, sharded, states[-1])
+
+    def testAddDemons(self):
+        horde, sharded, states = self.learnBoth(None, 2)
+        vectorLength = horde.numberOfFeatures
+        #What LearningForeground.addDemons does with a horde in one process
+        horde.syncDemons()
+        horde = Horde(horde.demons + makeDemons(2, vectorLength), horde.traceEpsilon)
+        sharded.addDemons(makeDemons(2, vectorLength))
+        for t in range(5):
+            horde.learn(states[t], 1, states[t + 1])
+            sharded.learn(states[t], 1, states[t + 1])
+        self.assertSameLearning(horde, sharded, states[5])
+
+    def testDeadWorker(self):
+        #A shard killed outright fails the next step instead of hanging it
+        horde, sharded, states = self.learnBoth(None, 2, steps = 3)
+        sharded.checkInterval = 0.1
+        os.kill(sharded.workers[1].pid, signal.SIGKILL)
+        sharded.workers[1].join()
+        self.assertRaises(RuntimeError, sharded.learn, states[0], 1, states[1])
+        self.assertEqual(sharded.workers, [])
+        self.assertRaises(ValueError, sharded.learn, states[0], 1, states[1])
+
+    def testStop(self):
+        horde, sharded, states = self.learnBoth(None, 2, steps = 3)
+        sharded.stop()
+        self.assertEqual(sharded.workers, [])
+        self.assertRaises(ValueError, sharded.learn, states[0], 1, states[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+A SparseTrace follows the dense trace it stands in for: exactly with an epsilon of 0, and otherwise to within what
+the entries dropped below epsilon could have added up to.
+
+python -m unittest test_SparseTrace
+"""
+
+import random
+import unittest
+import numpy
+
+from SparseTrace import *
+from SparseVector import *
+
+
+length = 256
+
+
+def randomSteps(count, factors = [0.0, 0.5, 0.9, 0.95], seed = 8):
+    #(decay factor, features) per step. A few active features at a time, as tile coding gives
+    rng = random.Random(seed)
+    steps = []
+    for n in range(count):
+        indexes = sorted(rng.sample(range(length), 8))
+        steps.append((rng.choice(factors), SparseVector.fromIndexes(indexes, length)))
+    return steps
+
+
+class SparseTraceTest(unittest.TestCase):
+    def followDense(self, epsilon, steps):
+        dense = makeTrace(length)
+        sparse = makeTrace(length, epsilon)
+        for factor, features in steps:
+            dense = decayTrace(dense, factor)
+            addScaled(dense, 1.0, features)
+            sparse = decayTrace(sparse, factor)
+            addScaled(sparse, 1.0, features)
+        return dense, sparse
+
+    def testNoCutoff(self):
+        dense, sparse = self.followDense(0.0, randomSteps(200))
+        numpy.testing.assert_array_equal(sparse.toDense(), dense)
+
+    def testCutoff(self):
+        epsilon = 1e-3
+        steps = randomSteps(200, [0.5, 0.9, 0.95])
+        dense, sparse = self.followDense(epsilon, steps)
+        #Only the entries still above epsilon are kept, and they are the only non zero ones
+        self.assertEqual(sparse.indexes.tolist(), numpy.flatnonzero(sparse.toDense()).tolist())
+        self.assertTrue(numpy.all(numpy.absolute(sparse.values) >= epsilon))
+        self.assertLess(len(sparse.indexes), numpy.count_nonzero(dense))
+        #Each dropped entry was below epsilon and decays at least as fast as the slowest decay after it
+        numpy.testing.assert_allclose(sparse.toDense(), dense, rtol = 0, atol = epsilon / (1 - 0.95))
+
+    def testReads(self):
+        #Read as a SparseVector, by dot and by addScaled into a dense vector
+        dense, sparse = self.followDense(1e-3, randomSteps(50))
+        weights = numpy.random.RandomState(9).uniform(-1, 1, length)
+        self.assertAlmostEqual(dot(weights, sparse), numpy.dot(weights, sparse.toDense()), places = 12)
+        updated = weights.copy()
+        addScaled(updated, 0.1, sparse)
+        numpy.testing.assert_allclose(updated, weights + 0.1 * sparse.toDense(), rtol = 1e-12)
+
+    def testZeroDecayClears(self):
+        dense, sparse = self.followDense(1e-3, randomSteps(20))
+        sparse = decayTrace(sparse, 0.0)
+        self.assertEqual(len(sparse.indexes), 0)
+        self.assertFalse(numpy.any(sparse.toDense()))
+
+
+if __name__ == '__main__':
+    unittest.main()
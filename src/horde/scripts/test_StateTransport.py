@@ -0,0 +1,162 @@
+"""
+A StateRing hands its readers every state in order, counts what a lapped or overwritten reader missed, and the shared
+memory transport carries on when its ring file is replaced.
+
+python -m unittest test_StateTransport
+"""
+
+import os
+import mmap
+import time
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from RosStandIn import *
+install()
+
+from horde.msg import StateRepresentation
+
+from StateTransport import *
+
+
+featureLength = 8
+
+
+def makeState(n):
+    X = numpy.zeros(featureLength)
+    X[n % featureLength] = 1.0
+    return StateRepresentation(timestamp = float(n), encoder = float(n), X = X, lastX = numpy.roll(X, 1))
+
+
+class StateRingTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def makeRing(self, slots):
+        #A ring in a file, as SharedMemoryStateTransport maps it
+        size = StateRing.size(slots, featureLength)
+        ringFile = open(os.path.join(self.directory, 'ring'), 'w+b')
+        self.addCleanup(ringFile.close)
+        ringFile.truncate(size)
+        ring = StateRing(mmap.mmap(ringFile.fileno(), size), slots, featureLength)
+        ring.initialize()
+        return ring
+
+    def testInOrder(self):
+        ring = self.makeRing(8)
+        received = []
+        reader = StateRingReader(ring, lambda state: received.append((state.timestamp, state.X.copy(), state.lastX.copy())))
+        for n in range(1, 20):
+            ring.write(makeState(n))
+            if n % 3 == 0:
+                reader.poll()
+        reader.poll()
+        self.assertEqual([timestamp for timestamp, X, lastX in received], [float(n) for n in range(1, 20)])
+        for n, (timestamp, X, lastX) in zip(range(1, 20), received):
+            numpy.testing.assert_array_equal(X, makeState(n).X)
+            numpy.testing.assert_array_equal(lastX, makeState(n).lastX)
+        self.assertEqual((reader.delivered, reader.dropped, reader.overwritten), (19, 0, 0))
+
+    def testLapped(self):
+        #A reader more than slots - 1 states behind skips to the oldest state the writer cannot be writing over
+        ring = self.makeRing(4)
+        received = []
+        reader = StateRingReader(ring, lambda state: received.append(state.timestamp))
+        for n in range(1, 11):
+            ring.write(makeState(n))
+        self.assertEqual(reader.poll(), 3)
+        self.assertEqual(received, [8.0, 9.0, 10.0])
+        self.assertEqual((reader.delivered, reader.dropped), (3, 7))
+
+    def testSlotBeingWritten(self):
+        ring = self.makeRing(4)
+        received = []
+        reader = StateRingReader(ring, lambda state: received.append(state.timestamp))
+        for n in range(1, 4):
+            ring.write(makeState(n))
+        #State 2's slot as the writer leaves it half way through overwriting it
+        ring.sequences[2] = -1
+        self.assertEqual(ring.read(2), None)
+        reader.poll()
+        self.assertEqual(received, [1.0, 3.0])
+        self.assertEqual(reader.dropped, 1)
+
+    def testOverwritten(self):
+        #The writer laps the reader while the callback still has the state
+        ring = self.makeRing(4)
+        def callback(state):
+            if state.timestamp == 1.0:
+                for n in range(2, 7):
+                    ring.write(makeState(n))
+        reader = StateRingReader(ring, callback)
+        ring.write(makeState(1))
+        reader.poll()
+        self.assertEqual(reader.overwritten, 1)
+
+    def testReset(self):
+        ring = self.makeRing(8)
+        received = []
+        reader = StateRingReader(ring, lambda state: received.append(state.timestamp))
+        for n in range(1, 6):
+            ring.write(makeState(n))
+        reader.poll()
+        ring.initialize()
+        for n in range(1, 3):
+            ring.write(makeState(100 + n))
+        reader.poll()
+        self.assertEqual(received, [1.0, 2.0, 3.0, 4.0, 5.0, 101.0, 102.0])
+        self.assertEqual(reader.resets, 1)
+
+
+class SharedMemoryStateTransportTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'ring')
+
+    def makeTransport(self):
+        transport = SharedMemoryStateTransport(featureLength, self.path, slots = 8, pollInterval = 0.0005, checkInterval = 0.01)
+        self.addCleanup(transport.close)
+        return transport
+
+    def waitFor(self, received, count):
+        endTime = time.time() + 5.0
+        while len(received) < count and time.time() < endTime:
+            time.sleep(0.005)
+
+    def testWriterRestart(self):
+        received = []
+        reader = self.makeTransport()
+        #The learner starts before there is any ring
+        reader.subscribe(lambda state: received.append(state.timestamp))
+        writer = self.makeTransport()
+        for n in range(1, 4):
+            writer.publish(makeState(n))
+        self.waitFor(received, 3)
+        self.assertEqual(received, [1.0, 2.0, 3.0])
+
+        #A restarted writer that finds no ring makes a new file, which the reader moves to and reads from the start
+        writer.close()
+        os.remove(self.path)
+        writer = self.makeTransport()
+        for n in range(1, 3):
+            writer.publish(makeState(200 + n))
+        self.waitFor(received, 5)
+        self.assertEqual(received, [1.0, 2.0, 3.0, 201.0, 202.0])
+
+    def testWriterResumes(self):
+        #A restarted writer that finds its ring carries on its write count
+        writer = self.makeTransport()
+        for n in range(1, 4):
+            writer.publish(makeState(n))
+        writer.close()
+        writer = self.makeTransport()
+        writer.publish(makeState(4))
+        self.assertEqual(writer.ring.writeCount(), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
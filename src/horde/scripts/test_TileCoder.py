@@ -0,0 +1,81 @@
+"""
+Tile coding a batch of observations in one call gives the same features as coding them one at a time, and grid
+indexing gives every cell of a tiling its own index.
+
+python -m unittest test_TileCoder
+"""
+
+import random
+import unittest
+import numpy
+
+from TileCoder import *
+
+
+def randomValues(count, numTiles, seed = 1):
+    rng = random.Random(seed)
+    #Include the edges of the range and values outside it
+    values = [[rng.uniform(-1, numTiles + 1), rng.uniform(-1, numTiles + 1)] for i in range(count)]
+    return values + [[0.0, 0.0], [numTiles, numTiles], [numTiles - 1e-9, 0.5]]
+
+
+class TileCoderBatchTest(unittest.TestCase):
+    def tearDown(self):
+        TileCoder.indexingMode = 'hash'
+
+    def assertBatchMatches(self, numTilings, numTiles):
+        values = randomValues(200, numTiles)
+        featureMatrix = TileCoder.getFeatureMatrixFromValues(values, numTilings, numTiles)
+        self.assertEqual(featureMatrix.shape[0], len(values))
+        for row, value in zip(featureMatrix, values):
+            numpy.testing.assert_array_equal(row, TileCoder.getFeatureVectorFromValues(value, numTilings, numTiles))
+
+    def testHashedBatch(self):
+        self.assertBatchMatches(8, 8)
+        self.assertBatchMatches(4, 16)
+
+    def testGridBatch(self):
+        TileCoder.indexingMode = 'grid'
+        self.assertBatchMatches(8, 8)
+        self.assertBatchMatches(4, 16)
+
+    def testBatchTiles(self):
+        values = randomValues(100, 8)
+        indexes = batchtiles(8, 512, values, [3])
+        for row, value in zip(indexes, values):
+            self.assertEqual(row.tolist(), tiles(8, 512, value, [3]))
+
+    def testGridCellsDoNotCollide(self):
+        #Within the range, two inputs share a grid cell in a tiling exactly when tiles.py's unhashed coordinates agree
+        numTilings, numTiles = 8, 8
+        values = numpy.array([value for value in randomValues(300, numTiles) if min(value) >= 1 and max(value) < numTiles - 1])
+        cells = batchgridtiles(numTilings, numTiles, values)
+        coordinates = tilecoordinates(numTilings, values)
+        for j in range(numTilings):
+            self.assertTrue(numpy.all(cells[:, j] // numTiles ** 2 == j))
+            cellOf = {}
+            for cell, coordinate in zip(cells[:, j].tolist(), coordinates[:, j].tolist()):
+                self.assertEqual(cellOf.setdefault(tuple(coordinate), cell), cell)
+            self.assertEqual(len(set(cellOf.values())), len(cellOf))
+
+    def testGridEdges(self):
+        #Inputs outside [0, numTiles) and cells cut short at the edges fall into the edge cells
+        numTiles = 8
+        self.assertEqual(gridtiles(8, numTiles, [-3.0, 2.5]), gridtiles(8, numTiles, [0.0, 2.5]))
+        self.assertEqual(gridtiles(8, numTiles, [2.5, numTiles + 3.0]), gridtiles(8, numTiles, [2.5, numTiles - 1e-9]))
+        indexes = batchgridtiles(8, numTiles, randomValues(200, numTiles))
+        self.assertTrue(numpy.all((indexes >= 0) & (indexes < 8 * numTiles ** 2)))
+
+    def testGridFeatures(self):
+        #Every tiling sets its own feature
+        TileCoder.indexingMode = 'grid'
+        for value in randomValues(100, 8):
+            self.assertEqual(numpy.count_nonzero(TileCoder.getFeatureVectorFromValues(value)), TileCoder.numberOfTilings)
+
+    def testSparseFeatures(self):
+        for value in randomValues(50, 8):
+            numpy.testing.assert_array_equal(TileCoder.getSparseFeatureVectorFromValues(value).toDense(), TileCoder.getFeatureVectorFromValues(value))
+
+
+if __name__ == '__main__':
+    unittest.main()
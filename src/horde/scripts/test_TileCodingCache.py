@@ -0,0 +1,77 @@
+"""
+TileCodingCache hands out the features TileCoder computes, looks them up by quantized input and evicts the least
+recently used coding when it is full.
+
+python -m unittest test_TileCodingCache
+"""
+
+import unittest
+import numpy
+
+from test_TileCoder import randomValues
+
+from TileCodingCache import *
+
+
+class TileCodingCacheTest(unittest.TestCase):
+    def tearDown(self):
+        TileCoder.indexingMode = 'hash'
+
+    def testSameAsTileCoder(self):
+        for mode in ['hash', 'grid']:
+            TileCoder.indexingMode = mode
+            cache = TileCodingCache()
+            for value in randomValues(100, TileCoder.numberOfTiles) * 2:
+                numpy.testing.assert_array_equal(cache.getFeatureVectorFromValues(value), TileCoder.getFeatureVectorFromValues(value))
+            self.assertTrue(cache.hits > 0)
+
+    def testQuantizedKey(self):
+        #Inputs with the same floor(value * numTilings) share a coding
+        cache = TileCodingCache()
+        numTilings = TileCoder.numberOfTilings
+        cache.getFeatureVectorFromValues([1.0, 2.0])
+        cache.getFeatureVectorFromValues([1.0 + 0.9 / numTilings, 2.0 + 0.5 / numTilings])
+        self.assertEqual(cache.stats(), (1, 1, 0, 1))
+        cache.getFeatureVectorFromValues([1.0 + 1.0 / numTilings, 2.0])
+        self.assertEqual(cache.stats(), (1, 2, 0, 2))
+
+    def testModeInKey(self):
+        cache = TileCodingCache()
+        hashed = cache.getFeatureVectorFromValues([3.3, 4.4])
+        TileCoder.indexingMode = 'grid'
+        grid = cache.getFeatureVectorFromValues([3.3, 4.4])
+        numpy.testing.assert_array_equal(grid, TileCoder.getFeatureVectorFromValues([3.3, 4.4]))
+        self.assertEqual(cache.misses, 2)
+
+    def testLeastRecentlyUsed(self):
+        cache = TileCodingCache(capacity = 2)
+        a, b, c = [1.0, 1.0], [2.0, 2.0], [3.0, 3.0]
+        cache.getFeatureVectorFromValues(a)
+        cache.getFeatureVectorFromValues(b)
+        cache.getFeatureVectorFromValues(a)
+        cache.getFeatureVectorFromValues(c)
+        #b was the least recently used
+        self.assertEqual(cache.stats(), (1, 3, 1, 2))
+        cache.getFeatureVectorFromValues(a)
+        cache.getFeatureVectorFromValues(c)
+        self.assertEqual(cache.hits, 3)
+        cache.getFeatureVectorFromValues(b)
+        self.assertEqual((cache.misses, cache.evictions), (4, 2))
+
+    def testReturnsCopies(self):
+        cache = TileCodingCache()
+        features = cache.getFeatureVectorFromValues([5.5, 6.5])
+        features[:] = -1
+        numpy.testing.assert_array_equal(cache.getFeatureVectorFromValues([5.5, 6.5]), TileCoder.getFeatureVectorFromValues([5.5, 6.5]))
+
+    def testPrecompute(self):
+        cache = TileCodingCache()
+        values = randomValues(50, TileCoder.numberOfTiles)
+        self.assertEqual(cache.precompute(values), len(set(tuple(numpy.floor(numpy.asarray(value) * TileCoder.numberOfTilings)) for value in values)))
+        for value in values:
+            numpy.testing.assert_array_equal(cache.getFeatureVectorFromValues(value), TileCoder.getFeatureVectorFromValues(value))
+        self.assertEqual(cache.misses, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+fasttiles gives the same tile indexes (and collision table contents) as tiles.py, and can be called from several
+threads at once. tiles.py is python 2 only, so the comparisons are skipped where it cannot be imported.
+
+python -m unittest test_fasttiles
+"""
+
+import random
+import threading
+import unittest
+
+import fasttiles
+
+try:
+    import tiles
+except SyntaxError:
+    tiles = None
+
+
+def randomFloats(count, numfloats = 2, seed = 2):
+    rng = random.Random(seed)
+    return [[rng.uniform(-20.0, 20.0) for i in range(numfloats)] for n in range(count)]
+
+
+@unittest.skipIf(tiles is None, "tiles.py does not import on this python")
+class FasttilesTest(unittest.TestCase):
+    def testTiles(self):
+        for numtilings, memory in [(8, 512), (4, 2048), (16, 4096)]:
+            for floats in randomFloats(100) + randomFloats(20, 3) + [[0.0, 0.0], [0.5, -0.5]]:
+                self.assertEqual(fasttiles.tiles(numtilings, memory, floats), tiles.tiles(numtilings, memory, floats))
+                self.assertEqual(fasttiles.tiles(numtilings, memory, floats, [1, 7]), tiles.tiles(numtilings, memory, floats, [1, 7]))
+
+    def testTilesWrap(self):
+        for floats in randomFloats(100):
+            self.assertEqual(fasttiles.tileswrap(8, 1024, floats, [10, 0]), tiles.tileswrap(8, 1024, floats, [10, 0]))
+            self.assertEqual(fasttiles.tileswrap(4, 1024, floats, [0, 3], [2]), tiles.tileswrap(4, 1024, floats, [0, 3], [2]))
+
+    def testLoadTiles(self):
+        floats = [1.3, 4.2]
+        expected = [0] * 10
+        loaded = [0] * 10
+        tiles.loadtiles(expected, 2, 8, 512, floats)
+        fasttiles.loadtiles(loaded, 2, 8, 512, floats)
+        self.assertEqual(loaded, expected)
+
+    def testBatchTiles(self):
+        floats = randomFloats(50)
+        expected = [tiles.tiles(8, 512, observation) for observation in floats]
+        self.assertEqual(fasttiles.batchtiles(8, 512, floats).tolist(), expected)
+
+    def testCollisionTable(self):
+        #A small table so that the probing for collisions is exercised
+        for safety in ['unsafe', 'safe']:
+            expectedTable = tiles.CollisionTable(64, safety)
+            table = tiles.CollisionTable(64, safety)
+            for floats in randomFloats(40):
+                self.assertEqual(fasttiles.tiles(4, table, floats), tiles.tiles(4, expectedTable, floats))
+            self.assertEqual(table.data, expectedTable.data)
+            #tiles.CollisionTable.stats() returns the usage method rather than calling it
+            self.assertEqual(table.stats()[:3], expectedTable.stats()[:3])
+            self.assertEqual(table.usage(), expectedTable.usage())
+
+
+class FasttilesSingleTest(unittest.TestCase):
+    def testSingleMatchesBatch(self):
+        #One observation is tiled by a python loop rather than the numpy batch code
+        floats = randomFloats(100) + [[0.0, 0.0], [-0.5, 0.5]]
+        for ints in [[], [3, 1500]]:
+            expected = fasttiles.batchtiles(8, 512, floats, ints).tolist()
+            self.assertEqual([fasttiles.tiles(8, 512, observation, ints) for observation in floats], expected)
+            expected = fasttiles.batchtileswrap(8, 512, floats, [10, 0], ints).tolist()
+            self.assertEqual([fasttiles.tileswrap(8, 512, observation, [10, 0], ints) for observation in floats], expected)
+        loaded = [0] * 10
+        fasttiles.loadtileswrap(loaded, 2, 8, 512, floats[0], [10, 0], [3, 1500])
+        self.assertEqual(loaded[2:], expected[0])
+
+
+class FasttilesThreadTest(unittest.TestCase):
+    def testThreads(self):
+        floats = randomFloats(200)
+        expected = [fasttiles.tiles(8, 512, observation) for observation in floats]
+        results = {}
+        def code(k):
+            results[k] = [fasttiles.tiles(8, 512, observation) for observation in floats]
+        threads = [threading.Thread(target = code, args = (k,)) for k in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for k in range(4):
+            self.assertEqual(results[k], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
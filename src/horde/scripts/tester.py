@@ -5,10 +5,12 @@ from std_msgs.msg import Float64
 
 from dynamixel_driver.dynamixel_const import *
 
+from PublisherRegistry import *
+
 
 def performAction(action):
     # Take the action and issue the actual dynamixel command
-    pub = rospy.Publisher('tilt_controller/command', Float64, queue_size=10)
+    pub = publishers.get('tilt_controller/command', Float64, queue_size=10)
     print("Performning action: " + str(action))
     if (action == 1):
         # Move left
@@ -16,7 +18,7 @@ def performAction(action):
     elif (action == 2):
         pub.publish(3.0)
     elif (action == 0):
-        pubSpeed = rospy.Publisher('tilt_controller/set_speed', Float64, queue_size=10)
+        pubSpeed = publishers.get('tilt_controller/set_speed', Float64, queue_size=10)
         pubSpeed.publish(0.0)
 
 def test():
@@ -55,7 +55,7 @@ import operator
 _maxnumfloats = 20                      # maximum number of variables used in one grid
 _maxLongint = 2147483647                # maximum integer
 _maxLongintBy4 = _maxLongint // 4       # maximum integer divided by 4   
-_randomTable = [random.randrange(_maxLongintBy4) for i in xrange(2048)]   #table of random numbers
+from fasttiles import _randomTable     #table of random numbers, shared with the numpy implementation in fasttiles
 #_randomTable = [random.randrange(65536) for i in xrange(2048)]   #table of random numbers
             
 # The following are temporary variables used by tiles.